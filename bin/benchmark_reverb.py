@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+"""
+Tool for benchmarking the reverb augmentation against its former windowed implementation
+"""
+import argparse
+import math
+import sys
+import time
+
+import numpy as np
+from coqui_stt_training.util.audio import (
+    AUDIO_TYPE_NP,
+    AudioFormat,
+    Sample,
+    gain_db_to_ratio,
+    max_dbfs,
+    normalize_audio,
+)
+from coqui_stt_training.util.augmentations import Reverb
+
+
+def windowed_reverb(audio, rate, delay, decay):
+    """Former reverb implementation with one slice operation per delay window - also the reference of the reverb tests"""
+    audio = np.array(audio, dtype=np.float64)
+    orig_dbfs = max_dbfs(audio)
+    decay = gain_db_to_ratio(-decay)
+    result = np.copy(audio)
+    primes = [17, 19, 23, 29, 31]
+    for delay_prime in primes:
+        layer = np.copy(audio)
+        n_delay = max(16, math.floor(delay * (delay_prime / primes[0]) * rate / 1000.0))
+        for w_index in range(0, math.floor(len(audio) / n_delay)):
+            w1 = w_index * n_delay
+            w2 = (w_index + 1) * n_delay
+            width = min(len(audio) - w2, n_delay)
+            layer[w2 : w2 + width] += decay * layer[w1 : w1 + width]
+        result += layer
+    return np.array(normalize_audio(result, dbfs=orig_dbfs), dtype=np.float32)
+
+
+def best_of(runs, fun):
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fun()
+        durations.append(time.perf_counter() - start)
+    return min(durations), result
+
+
+def benchmark():
+    audio_format = AudioFormat(CLI_ARGS.rate, 1, 2)
+    rng = np.random.RandomState(CLI_ARGS.seed)
+    # Column vector - like decoded samples
+    audio = rng.uniform(-0.5, 0.5, (int(CLI_ARGS.duration * CLI_ARGS.rate), 1))
+    audio = audio.astype(np.float32)
+    reverb = Reverb(delay=CLI_ARGS.delay, decay=CLI_ARGS.decay)
+    reverb.start()
+
+    def compiled():
+        sample = Sample(AUDIO_TYPE_NP, np.copy(audio), audio_format=audio_format)
+        reverb.apply(sample)
+        return sample.audio
+
+    old_time, old_audio = best_of(
+        CLI_ARGS.runs,
+        lambda: windowed_reverb(
+            audio, audio_format.rate, CLI_ARGS.delay, CLI_ARGS.decay
+        ),
+    )
+    new_time, new_audio = best_of(CLI_ARGS.runs, compiled)
+    max_diff = float(np.max(np.abs(old_audio - new_audio))) if len(audio) else 0.0
+    print(
+        "{:.1f} s of audio - windowed: {:.2f} ms, compiled: {:.2f} ms, "
+        "speed-up: {:.1f}x, max. difference: {:.2e}".format(
+            CLI_ARGS.duration,
+            old_time * 1000,
+            new_time * 1000,
+            old_time / new_time,
+            max_diff,
+        )
+    )
+    if max_diff > CLI_ARGS.tolerance:
+        print("Implementations differ beyond tolerance", file=sys.stderr, flush=True)
+        sys.exit(1)
+
+
+def handle_args():
+    parser = argparse.ArgumentParser(
+        description="Tool for benchmarking the reverb augmentation against its former windowed implementation"
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=20.0,
+        help="Duration of the test signal in seconds",
+    )
+    parser.add_argument(
+        "--rate", type=int, default=16000, help="Sample rate of the test signal"
+    )
+    parser.add_argument(
+        "--delay", type=float, default=20.0, help="Reverb delay in milliseconds"
+    )
+    parser.add_argument("--decay", type=float, default=10.0, help="Reverb decay in dB")
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=5,
+        help="Number of runs per implementation (best one counts)",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=1234, help="Seed of the test signal"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=1e-5,
+        help="Maximum absolute difference of both outputs to consider them equivalent",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    CLI_ARGS = handle_args()
+    benchmark()
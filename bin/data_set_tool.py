@@ -28,6 +28,7 @@ from coqui_stt_training.util.downloader import SIMPLE_BAR
 from coqui_stt_training.util.sample_collections import (
     CSVWriter,
     DirectSDBWriter,
+    ShardedSDBWriter,
     TarWriter,
     samples_from_sources,
 )
@@ -51,7 +52,20 @@ def build_data_set():
             Config.target, absolute_paths=Config.absolute_paths, labeled=labeled
         )
     elif extension == ".sdb":
-        writer = DirectSDBWriter(Config.target, audio_type=audio_type, labeled=labeled)
+        writer = DirectSDBWriter(
+            Config.target,
+            audio_type=audio_type,
+            bitrate=Config.bitrate,
+            labeled=labeled,
+        )
+    elif extension == ".sdbs":
+        writer = ShardedSDBWriter(
+            Config.target,
+            shard_size=Config.shard_size,
+            audio_type=audio_type,
+            bitrate=Config.bitrate,
+            labeled=labeled,
+        )
     elif extension == ".tar":
         writer = TarWriter(
             Config.target, labeled=labeled, gz=False, include=Config.include
@@ -62,7 +76,7 @@ def build_data_set():
         )
     else:
         raise RuntimeError(
-            "Unknown extension of target file - has to be either .csv, .sdb, .tar, .tar.gz or .tgz"
+            "Unknown extension of target file - has to be either .csv, .sdb, .sdbs, .tar, .tar.gz or .tgz"
         )
     with writer:
         samples = samples_from_sources(Config.sources, labeled=not Config.unlabeled)
@@ -72,15 +86,21 @@ def build_data_set():
                 samples, audio_type=AUDIO_TYPE_PCM, augmentations=augmentations
             )
         bar = progressbar.ProgressBar(max_value=num_samples, widgets=SIMPLE_BAR)
-        for sample in bar(
-            change_audio_types(
-                samples,
-                audio_type=audio_type,
-                bitrate=Config.bitrate,
-                processes=Config.workers,
+        if isinstance(writer, DirectSDBWriter):
+            # Encoding and serialization happen on the workers, only writing is left to this process
+            sample_ids = writer.add_all(samples, processes=Config.workers)
+        else:
+            sample_ids = map(
+                writer.add,
+                change_audio_types(
+                    samples,
+                    audio_type=audio_type,
+                    bitrate=Config.bitrate,
+                    processes=Config.workers,
+                ),
             )
-        ):
-            writer.add(sample)
+        for _ in bar(sample_ids):
+            pass
 
 
 @dataclass
@@ -88,7 +108,7 @@ class DatasetToolConfig(BaseSttConfig):
     sources: List[str] = field(
         default_factory=list,
         metadata=dict(
-            help="Source CSV and/or SDB files - "
+            help="Source CSV, SDB and/or sharded SDB (.sdbs) files - "
             "Note: For getting a correctly ordered target set, source SDBs have to have their samples "
             "already ordered from shortest to longest.",
         ),
@@ -96,7 +116,7 @@ class DatasetToolConfig(BaseSttConfig):
     target: str = field(
         default="",
         metadata=dict(
-            help="SDB, CSV or TAR(.gz) file to create",
+            help="SDB, sharded SDB manifest (.sdbs), CSV or TAR(.gz) file to create",
         ),
     )
     audio_type: str = field(
@@ -111,6 +131,12 @@ class DatasetToolConfig(BaseSttConfig):
             help="Bitrate for lossy compressed SDB samples like in case of --audio-type opus",
         ),
     )
+    shard_size: int = field(
+        default=10000,
+        metadata=dict(
+            help="Number of samples per shard when writing a sharded SDB (.sdbs target)",
+        ),
+    )
     workers: Optional[int] = field(
         default=None,
         metadata=dict(
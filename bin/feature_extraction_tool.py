@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+"""
+Tool for pre-computing the MFCC features of sample-sets into a feature store (see --feature_store),
+from which training, validation and testing then read them instead of decoding audio and computing features
+Use 'python3 feature_extraction_tool.py -h' for help
+"""
+import csv
+from dataclasses import dataclass, field
+from typing import List
+
+import numpy as np
+import progressbar
+import tensorflow.compat.v1 as tfv1
+from coqui_stt_training.util.augmentations import (
+    NormalizeSampleRate,
+    apply_sample_augmentations,
+)
+from coqui_stt_training.util.config import (
+    BaseSttConfig,
+    Config,
+    initialize_globals_from_instance,
+)
+from coqui_stt_training.util.downloader import SIMPLE_BAR
+from coqui_stt_training.util.feature_store import FeatureStore
+from coqui_stt_training.util.feeding import audio_to_features
+from coqui_stt_training.util.helpers import parse_file_size
+from coqui_stt_training.util.sample_collections import samples_from_sources
+
+import tensorflow as tf
+
+DTYPE_LOOKUP = {"float16": np.float16, "float32": np.float32}
+INDEX_COLUMNS = ["sample_id", "feature_key", "frames", "transcript"]
+
+
+def extract_features():
+    store = FeatureStore(Config.feature_store, dtype=DTYPE_LOOKUP[Config.dtype])
+    samples = samples_from_sources(
+        Config.sources, buffering=Config.read_buffer, sdb_access=Config.sdb_access
+    )
+    num_samples = len(samples)
+    # Decoding and resampling happen on pool workers - samples with stored features are only hashed
+    prepared = apply_sample_augmentations(
+        samples,
+        [NormalizeSampleRate(Config.audio_sample_rate)],
+        buffering=Config.read_buffer,
+        process_ahead=Config.process_ahead,
+        feature_store=store,
+    )
+
+    def generate_values():
+        for sample, feature_key, stored in prepared:
+            yield (
+                sample.sample_id,
+                getattr(sample, "transcript", ""),
+                feature_key,
+                stored,
+                sample.audio,
+                sample.audio_format.rate,
+            )
+
+    def compute_features(sample_id, transcript, feature_key, stored, audio, rate):
+        features = tf.cond(
+            stored,
+            lambda: tf.zeros([0, Config.n_input]),
+            lambda: audio_to_features(audio, rate)[0],
+        )
+        return sample_id, transcript, feature_key, stored, features
+
+    # Feature computation happens in parallel on all cores of the TensorFlow runtime
+    dataset = (
+        tf.data.Dataset.from_generator(
+            generate_values,
+            output_types=(
+                tf.string,
+                tf.string,
+                tf.string,
+                tf.bool,
+                tf.float32,
+                tf.int32,
+            ),
+        )
+        .map(compute_features, num_parallel_calls=tf.data.experimental.AUTOTUNE)
+        .prefetch(Config.process_ahead)
+    )
+    next_element = tfv1.data.make_one_shot_iterator(dataset).get_next()
+
+    index_file = (
+        open(Config.index, "w", encoding="utf-8", newline="") if Config.index else None
+    )
+    # New entries get packed into few large files instead of one file per sample
+    pack_writer = store.pack_writer(pack_size=Config.pack_size)
+    try:
+        index_writer = None
+        if index_file is not None:
+            index_writer = csv.writer(index_file)
+            index_writer.writerow(INDEX_COLUMNS)
+        bar = progressbar.ProgressBar(max_value=num_samples, widgets=SIMPLE_BAR)
+        with tfv1.Session(config=Config.session_config) as session:
+            for _ in bar(range(num_samples)):
+                sample_id, transcript, feature_key, stored, features = session.run(
+                    next_element
+                )
+                feature_key = feature_key.decode()
+                if stored:
+                    frames = len(store.get(feature_key))
+                else:
+                    pack_writer.add(feature_key, features)
+                    frames = len(features)
+                if index_writer is not None:
+                    index_writer.writerow(
+                        [sample_id.decode(), feature_key, frames, transcript.decode()]
+                    )
+    finally:
+        pack_writer.close()
+        if index_file is not None:
+            index_file.close()
+
+
+@dataclass
+class FeatureExtractionToolConfig(BaseSttConfig):
+    sources: List[str] = field(
+        default_factory=list,
+        metadata=dict(
+            help="Source CSV, SDB, sharded SDB (.sdbs) and/or WebDataset files to extract the features of",
+        ),
+    )
+    dtype: str = field(
+        default="float16",
+        metadata=dict(
+            help="Data type of the stored features - float16 halves the size of the store",
+        ),
+    )
+    index: str = field(
+        default="",
+        metadata=dict(
+            help="Optional CSV file to write with sample ID, feature key, number of frames and transcript per sample. Informational only - training, validation and testing find stored features through --feature_store by audio content, not through this file.",
+        ),
+    )
+    pack_size: str = field(
+        default="1G",
+        metadata=dict(
+            help="Maximum size of the pack files the features get written to - supports suffixes like K, M and G",
+        ),
+    )
+    process_ahead: int = field(
+        default=256,
+        metadata=dict(
+            help="Number of samples to load and compute features of ahead of time",
+        ),
+    )
+
+    def __post_init__(self):
+        if self.dtype not in DTYPE_LOOKUP.keys():
+            raise RuntimeError(f"--dtype must be one of {tuple(DTYPE_LOOKUP.keys())}")
+
+        if not self.sources:
+            raise RuntimeError("No source specified with --sources")
+
+        if not self.feature_store:
+            raise RuntimeError(
+                "No feature store directory specified with --feature_store"
+            )
+
+        # Only the sample reading and feature computation related parts of BaseSttConfig.__post_init__
+        self.read_buffer = parse_file_size(self.read_buffer)
+        self.pack_size = parse_file_size(self.pack_size)
+        self.init_feature_geometry()
+        self.session_config = tfv1.ConfigProto(
+            inter_op_parallelism_threads=self.inter_op_parallelism_threads,
+            intra_op_parallelism_threads=self.intra_op_parallelism_threads,
+        )
+
+
+def main():
+    config = FeatureExtractionToolConfig.init_from_argparse(arg_prefix="")
+    initialize_globals_from_instance(config)
+
+    extract_features()
+
+
+if __name__ == "__main__":
+    main()
@@ -31,6 +31,7 @@ def main():
         "sox",
         "soundfile",
         "tqdm",
+        "braceexpand",
         "webdataset==0.1.103",
         "miniaudio",
         "clearml",
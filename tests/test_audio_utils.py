@@ -2,6 +2,8 @@ import unittest
 from argparse import Namespace
 from pathlib import Path
 
+import numpy as np
+
 from coqui_stt_training.util import audio
 
 
@@ -50,5 +52,54 @@ class TestValidateReadDuration(unittest.TestCase):
         self.assertIsInstance(result, float)
 
 
+class TestLazySample(unittest.TestCase):
+    def test_wav(self):
+        audio_path = from_here("../data/smoke_test/LDC93S1.wav")
+        with open(audio_path, "rb") as audio_file:
+            sample = audio.Sample(audio.AUDIO_TYPE_WAV, audio_file.read())
+        self.assertIsNone(sample._duration)
+        self.assertIsNone(sample._audio_format)
+        expected_duration = audio.read_duration(audio.AUDIO_TYPE_WAV, str(audio_path))
+        self.assertEqual(sample.duration, expected_duration)
+        self.assertIsInstance(sample.audio_format, audio.AudioFormat)
+        sample.change_audio_type(audio.AUDIO_TYPE_NP)
+        self.assertEqual(sample.duration, expected_duration)
+
+    def test_slots(self):
+        sample = audio.Sample(
+            audio.AUDIO_TYPE_PCM, b"\0" * 3200, audio_format=audio.DEFAULT_FORMAT
+        )
+        self.assertEqual(sample.duration, 0.1)
+        with self.assertRaises(AttributeError):
+            sample.unknown_attribute = None
+
+
+class TestResample(unittest.TestCase):
+    def test_band_limited_signal(self):
+        def signal(rate):
+            t = np.arange(rate) / rate
+            return (
+                0.5 * np.sin(2 * np.pi * 440 * t) + 0.2 * np.sin(2 * np.pi * 3000 * t)
+            ).astype(np.float32)
+
+        for src_rate in [8000, 22050, 44100, 48000]:
+            result = audio.resample(
+                np.expand_dims(signal(src_rate), axis=1), src_rate, 16000
+            )
+            self.assertEqual(result.dtype, np.float32)
+            self.assertEqual(result.shape, (16000, 1))
+            # Skipping filter warm-up at the edges
+            np.testing.assert_allclose(
+                result[100:-100, 0], signal(16000)[100:-100], atol=1e-3
+            )
+
+    def test_filter_bank_cache(self):
+        audio.get_polyphase_filter_bank.cache_clear()
+        for _ in range(3):
+            audio.resample(np.zeros(441, dtype=np.float32), 44100, 16000)
+        info = audio.get_polyphase_filter_bank.cache_info()
+        self.assertEqual((info.misses, info.hits), (1, 2))
+
+
 if __name__ == "__main__":
     unittest.main()
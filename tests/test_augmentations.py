@@ -0,0 +1,251 @@
+import errno
+import importlib.util
+import io
+import os
+import tempfile
+import time
+import unittest
+from multiprocessing import Pool, Process
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+from coqui_stt_training.util.audio import (
+    AUDIO_TYPE_NP,
+    AUDIO_TYPE_WAV,
+    DEFAULT_FORMAT,
+    Sample,
+    np_to_pcm,
+    write_wav,
+)
+from coqui_stt_training.util.augmentation_cache import (
+    AugmentationCache,
+    _CacheTier,
+    quantize_value,
+)
+from coqui_stt_training.util.augmentations import (
+    AugmentationContext,
+    AugmentationStats,
+    Overlay,
+    Reverb,
+    Volume,
+    _init_augmentation_worker,
+    apply_sample_augmentations,
+)
+from coqui_stt_training.util.helpers import SharedArray
+
+
+def load_benchmark_reverb():
+    spec = importlib.util.spec_from_file_location(
+        "benchmark_reverb", Path(__file__).parent / "../bin/benchmark_reverb.py"
+    )
+    benchmark = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(benchmark)
+    return benchmark
+
+
+# Reference implementation - shared with the benchmark, so both test the same thing
+windowed_reverb = load_benchmark_reverb().windowed_reverb
+
+
+class TestReverb(unittest.TestCase):
+    def test_matches_windowed_reverb(self):
+        rng = np.random.RandomState(42)
+        for n_samples, delay, decay in [
+            (16000, 20.0, 10.0),
+            (12345, 1.0, 3.0),
+            (500, 50.0, 10.0),
+            (17, 0.5, 1.0),
+        ]:
+            # Column vectors - like decoded samples
+            audio = rng.uniform(-0.5, 0.5, (n_samples, 1)).astype(np.float32)
+            sample = Sample(AUDIO_TYPE_NP, np.copy(audio), audio_format=DEFAULT_FORMAT)
+            Reverb(delay=delay, decay=decay).apply(sample)
+            expected = windowed_reverb(audio, DEFAULT_FORMAT.rate, delay, decay)
+            self.assertEqual(sample.audio.dtype, np.float32)
+            self.assertEqual(sample.audio.shape, expected.shape)
+            np.testing.assert_allclose(sample.audio, expected, rtol=1e-5, atol=1e-6)
+
+
+def draw_bank_position(_):
+    from coqui_stt_training.util import augmentations
+
+    time.sleep(0.01)  # lets both workers get tasks
+    overlay = augmentations.AUGMENTATION_CONTEXT.augmentations[0]
+    overlay_data = np.zeros((1, 1), dtype=np.float32)
+    overlay._overlay_from_bank(overlay_data, 1)
+    noise = overlay.noise.array
+    # The bank is a ramp - so the overlaid value is the drawn position
+    return os.getpid(), float(noise.sum()), int(overlay_data[0, 0])
+
+
+class TestOverlayBank(unittest.TestCase):
+    def test_workers_draw_different_positions(self):
+        overlay = Overlay("unused", bank=1)
+        overlay.noise = SharedArray(
+            [np.arange(0, 5000, dtype=np.float32).reshape(-1, 1)] * 2
+        )
+        overlay.noise_offsets = np.array([0, 5000])
+        context = AugmentationContext(AUDIO_TYPE_NP, [overlay])
+        with Pool(
+            2, initializer=_init_augmentation_worker, initargs=(context,)
+        ) as pool:
+            results = pool.map(draw_bank_position, range(40), chunksize=1)
+        draws = {}
+        for pid, noise_sum, position in results:
+            # Every worker sees the full bank
+            self.assertEqual(noise_sum, 2 * sum(range(5000)))
+            draws.setdefault(pid, []).append(position)
+        self.assertEqual(len(draws), 2)
+        first, second = draws.values()
+        n = min(len(first), len(second))
+        self.assertNotEqual(first[:n], second[:n])
+
+
+class TestAugmentationStats(unittest.TestCase):
+    def test_aggregates_workers(self):
+        augmentations = [Volume(p=0.5, dbfs=-10.0), Reverb(p=1.0)]
+        stats = AugmentationStats(augmentations)
+        samples = [
+            Sample(
+                AUDIO_TYPE_NP,
+                np.full((1600, 1), 0.1, dtype=np.float32),
+                audio_format=DEFAULT_FORMAT,
+            )
+            for _ in range(40)
+        ]
+        augmented = list(
+            apply_sample_augmentations(
+                samples,
+                augmentations,
+                process_ahead=4,
+                processes=2,
+                augmentation_stats=stats,
+            )
+        )
+        self.assertEqual(len(augmented), 40)
+        volume, reverb = stats.report()
+        self.assertEqual(volume["name"], "0_volume")
+        self.assertEqual(volume["invocations"], 40)
+        self.assertTrue(0 < volume["applications"] < 40)
+        self.assertAlmostEqual(
+            volume["realized_probability"], volume["applications"] / 40
+        )
+        self.assertEqual((reverb["invocations"], reverb["applications"]), (40, 40))
+        self.assertGreater(reverb["seconds"], 0.0)
+        # Reported counters got reset
+        self.assertEqual(stats.report()[1]["invocations"], 0)
+
+
+def put_entries(tier, worker):
+    for index in range(20):
+        tier.put(
+            "{:02x}{:02d}".format(index, worker),
+            AUDIO_TYPE_NP,
+            np.zeros(200, dtype=np.float32),
+        )
+
+
+class TestAugmentationCache(unittest.TestCase):
+    def sample(self, seed, n_samples=4000):
+        audio = np.random.RandomState(seed).uniform(-0.5, 0.5, (n_samples, 1))
+        return Sample(
+            AUDIO_TYPE_NP, audio.astype(np.float32), audio_format=DEFAULT_FORMAT
+        )
+
+    def test_reuses_results(self):
+        cache = AugmentationCache(ram_budget=10 * 1024 * 1024)
+        reverb = Reverb(delay=10.0, decay=5.0)
+        expected = self.sample(1)
+        reverb.apply(expected)
+        for _ in range(3):
+            sample = self.sample(1)
+            cache.apply(reverb, sample)
+            np.testing.assert_array_equal(sample.audio, expected.audio)
+        cache.apply(reverb, self.sample(2))
+        self.assertEqual(cache.stats(), dict(hits=2, misses=2))
+        self.assertEqual(cache.stats(), dict(hits=0, misses=0))
+
+    def test_keeps_header_format(self):
+        cache = AugmentationCache(ram_budget=10 * 1024 * 1024)
+        reverb = Reverb(delay=10.0, decay=5.0)
+        wav_file = io.BytesIO()
+        write_wav(wav_file, np_to_pcm(self.sample(1).audio, DEFAULT_FORMAT))
+        for cached in [False, True]:
+            sample = Sample(AUDIO_TYPE_WAV, wav_file.getvalue())
+            self.assertEqual(cache.apply(reverb, sample), cached)
+            self.assertEqual(sample.audio_type, AUDIO_TYPE_NP)
+            self.assertEqual(sample.audio_format, DEFAULT_FORMAT)
+
+    def test_evicts_concurrently(self):
+        with tempfile.TemporaryDirectory() as tier_dir:
+            tier = _CacheTier(tier_dir, 5 * 1000)
+            workers = [
+                Process(target=put_entries, args=(tier, worker)) for worker in range(4)
+            ]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+                self.assertEqual(worker.exitcode, 0)
+            sizes = [size for _, _, size in tier._entries()]
+            # The shared counter matches the tier's content
+            self.assertEqual(tier.size.value, sum(sizes))
+            self.assertLessEqual(tier.size.value, tier.budget)
+            self.assertGreater(len(sizes), 0)
+
+    def test_survives_full_ram_tier(self):
+        cache = AugmentationCache(ram_budget=1024 * 1024, disk_budget=1024 * 1024)
+        ram_tier, disk_tier = cache.tiers
+        savez = np.savez
+
+        def failing_savez(file, **arrays):
+            if file.name.startswith(ram_tier.path):
+                file.write(b"partial")
+                raise OSError(errno.ENOSPC, "No space left on device")
+            savez(file, **arrays)
+
+        reverb = Reverb(delay=10.0, decay=5.0)
+        with mock.patch("numpy.savez", failing_savez):
+            self.assertFalse(cache.apply(reverb, self.sample(1)))
+        # No leftovers in the RAM tier - the result got cached on disk
+        self.assertEqual([files for _, _, files in os.walk(ram_tier.path) if files], [])
+        self.assertEqual(ram_tier.size.value, 0)
+        self.assertGreater(disk_tier.size.value, 0)
+        self.assertTrue(cache.apply(reverb, self.sample(1)))
+
+    def test_caps_ram_budget(self):
+        cache = AugmentationCache(ram_budget=1 << 60)
+        self.assertLess(cache.tiers[0].budget, 1 << 60)
+
+    def test_evicts_least_recently_used(self):
+        # Room for about three entries per tier
+        cache = AugmentationCache(
+            ram_budget=3 * 17000, disk_budget=3 * 17000, buckets=4
+        )
+        reverb = Reverb(delay=10.0, decay=5.0)
+        for seed in range(4):
+            cache.apply(reverb, self.sample(seed))
+            if seed == 2:
+                cache.apply(reverb, self.sample(0))  # refreshes the first entry
+        for tier in cache.tiers:
+            self.assertLessEqual(tier.size.value, tier.budget)
+        cache.stats()
+        cache.apply(reverb, self.sample(0))
+        cache.apply(reverb, self.sample(1))
+        self.assertEqual(cache.stats(), dict(hits=1, misses=1))
+
+    def test_quantize_value(self):
+        reverb = Reverb(delay="10.0:20.0~5.0", decay=5.0)
+        delay_range, decay_range = reverb.parameter_ranges()
+        # Range 5.0 to 25.0 in steps of 5.0
+        self.assertAlmostEqual(quantize_value(12.4, delay_range, 4), 10.0)
+        self.assertAlmostEqual(quantize_value(13.0, delay_range, 4), 15.0)
+        self.assertAlmostEqual(quantize_value(30.0, delay_range, 4), 25.0)
+        self.assertEqual(quantize_value(12.4, delay_range, 0), 12.4)
+        self.assertEqual(quantize_value(5.0, decay_range, 4), 5.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,183 @@
+import unittest
+
+import numpy as np
+from coqui_stt_training.util.augmentations import (
+    Add,
+    AugmentationStats,
+    Dropout,
+    FrequencyMask,
+    Multiply,
+    TimeMask,
+    Warp,
+    apply_graph_augmentations,
+    apply_graph_batch_augmentations,
+)
+
+import tensorflow as tf
+
+BATCH_SIZE, TIME_STEPS, CHANNELS = 4, 50, 16
+# Mixed lengths - the longest row has no padding
+LENGTHS = [50, 31, 12, 5]
+
+
+class TestBatchAugmentations(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(42)
+        # Strictly positive, so that masked values are the only zeros
+        self.batch = rng.uniform(1.0, 2.0, (BATCH_SIZE, TIME_STEPS, CHANNELS)).astype(
+            np.float32
+        )
+        for row, length in enumerate(LENGTHS):
+            self.batch[row, length:] = 3.0  # padding
+        self.session = tf.Session()
+        self.tensor = tf.constant(self.batch)
+        self.lengths = tf.constant(LENGTHS, dtype=tf.int32)
+        self.clocks = tf.constant([0.1, 0.4, 0.6, 0.9], dtype=tf.float64)
+        self.seed = tf.constant([7, 0], dtype=tf.int64)
+
+    def tearDown(self):
+        self.session.close()
+
+    def apply(self, augmentation):
+        augmented = augmentation.apply_to_batch(
+            self.tensor, self.lengths, self.clocks, self.seed
+        )
+        self.assertEqual(augmented.dtype, tf.float32)
+        result = self.session.run(augmented)
+        self.assertEqual(result.shape, self.batch.shape)
+        self.assertEqual(result.dtype, np.float32)
+        self.assertTrue(np.all(np.isfinite(result)))
+        return result
+
+    def test_time_mask(self):
+        time_mask = TimeMask(domain="spectrogram", n=2, size=40.0)
+        time_mask.units_per_ms = lambda: 0.1  # 4 time steps per mask
+        result = self.apply(time_mask)
+        for row, length in enumerate(LENGTHS):
+            masked_steps = np.where(np.all(result[row] == 0.0, axis=1))[0]
+            self.assertGreater(len(masked_steps), 0)
+            # Masks only land within the valid part of every row - never in its padding
+            self.assertTrue(np.all(masked_steps < length))
+            unmasked = np.ones(TIME_STEPS, dtype=bool)
+            unmasked[masked_steps] = False
+            np.testing.assert_array_equal(
+                result[row, unmasked], self.batch[row, unmasked]
+            )
+
+    def test_frequency_mask(self):
+        result = self.apply(FrequencyMask(n=2, size=3))
+        for row, length in enumerate(LENGTHS):
+            masked_channels = np.where(result[row, 0] == 0.0)[0]
+            self.assertTrue(0 < len(masked_channels) <= 6)
+            # Same channels over all valid time steps of a row
+            self.assertTrue(np.all(result[row, :length, masked_channels] == 0.0))
+            unmasked = np.ones(CHANNELS, dtype=bool)
+            unmasked[masked_channels] = False
+            np.testing.assert_array_equal(
+                result[row, :, unmasked], self.batch[row, :, unmasked]
+            )
+
+    def test_dropout(self):
+        result = self.apply(Dropout(rate=0.5))
+        dropped = result == 0.0
+        self.assertTrue(0.2 < np.mean(dropped) < 0.8)
+        np.testing.assert_array_equal(result[~dropped], self.batch[~dropped])
+
+    def test_add(self):
+        result = self.apply(Add(stddev=1.0))
+        self.assertAlmostEqual(float(np.std(result - self.batch)), 1.0, delta=0.1)
+        np.testing.assert_array_equal(self.apply(Add(stddev=0.0)), self.batch)
+
+    def test_multiply(self):
+        result = self.apply(Multiply(stddev=0.5))
+        self.assertAlmostEqual(float(np.std(result / self.batch)), 0.5, delta=0.05)
+        np.testing.assert_array_equal(self.apply(Multiply(stddev=0.0)), self.batch)
+
+    def test_warp(self):
+        result = self.apply(Warp(num_t=2, num_f=2, warp_t=0.3, warp_f=0.1))
+        self.assertGreater(float(np.mean(np.abs(result - self.batch))), 0.0)
+        # Without any flow the batch stays as it is
+        np.testing.assert_allclose(
+            self.apply(Warp(warp_t=0.0, warp_f=0.0)), self.batch, rtol=1e-5
+        )
+
+    def test_probability(self):
+        augmented = Dropout(p=0.0, rate=1.0).apply_to_batch_with_probability(
+            self.tensor, self.lengths, self.clocks, self.seed
+        )
+        np.testing.assert_array_equal(self.session.run(augmented), self.batch)
+
+
+class TestGraphAugmentationStats(unittest.TestCase):
+    def setUp(self):
+        # Dropout with a rate of 0.0 zeros complete rows - so applications can be counted from the results
+        self.augmentations = [
+            Dropout(p=0.5, rate=0.0),
+            FrequencyMask(p=1.0, n=1, size=2),
+            Add(p=1.0, domain="features", stddev=1.0),
+        ]
+        self.stats = AugmentationStats(self.augmentations)
+        self.session = tf.Session()
+
+    def tearDown(self):
+        self.session.close()
+
+    def test_batch_counters(self):
+        runs = 10
+        clocks = tf.placeholder(tf.float64, [BATCH_SIZE])
+        augmented = apply_graph_batch_augmentations(
+            "spectrogram",
+            tf.ones([BATCH_SIZE, TIME_STEPS, CHANNELS]),
+            tf.constant(LENGTHS, dtype=tf.int32),
+            clocks,
+            self.augmentations,
+            augmentation_stats=self.stats,
+        )
+        dropped_rows = 0
+        for run in range(runs):
+            result = self.session.run(
+                augmented,
+                {clocks: np.linspace(0.0, 1.0, BATCH_SIZE) * (run + 1) / runs},
+            )
+            dropped_rows += int(np.sum(np.all(result == 0.0, axis=(1, 2))))
+        dropout, frequency_mask, add = self.stats.report()
+        self.assertEqual(dropout["invocations"], runs * BATCH_SIZE)
+        self.assertEqual(dropout["applications"], dropped_rows)
+        self.assertTrue(0 < dropped_rows < runs * BATCH_SIZE)
+        self.assertEqual(
+            (frequency_mask["invocations"], frequency_mask["applications"]),
+            (runs * BATCH_SIZE, runs * BATCH_SIZE),
+        )
+        self.assertGreater(frequency_mask["seconds"], 0.0)
+        # Augmentations of other domains are neither applied nor counted
+        self.assertEqual((add["invocations"], add["applications"]), (0, 0))
+
+    def test_sample_counters(self):
+        runs = 40
+        clock = tf.placeholder(tf.float64, [])
+        augmented = apply_graph_augmentations(
+            "spectrogram",
+            tf.ones([1, TIME_STEPS, CHANNELS]),
+            self.augmentations,
+            clock=clock,
+            augmentation_stats=self.stats,
+        )
+        dropped = 0
+        for run in range(runs):
+            result = self.session.run(augmented, {clock: (run + 1) / runs})
+            dropped += int(np.all(result == 0.0))
+        dropout, frequency_mask, add = self.stats.report()
+        self.assertEqual(dropout["invocations"], runs)
+        self.assertEqual(dropout["applications"], dropped)
+        self.assertTrue(0 < dropped < runs)
+        self.assertEqual(
+            (frequency_mask["invocations"], frequency_mask["applications"]),
+            (runs, runs),
+        )
+        self.assertEqual((add["invocations"], add["applications"]), (0, 0))
+        # Reported counters got reset
+        self.assertEqual(self.stats.report()[0]["invocations"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import csv
+import importlib.util
+import tempfile
+import unittest
+from pathlib import Path
+
+from coqui_stt_training.util.config import initialize_globals_from_instance
+from coqui_stt_training.util.feature_store import FeatureStore
+
+
+def from_here(path):
+    here = Path(__file__)
+    return here.parent / path
+
+
+def load_tool():
+    spec = importlib.util.spec_from_file_location(
+        "feature_extraction_tool", from_here("../bin/feature_extraction_tool.py")
+    )
+    tool = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(tool)
+    return tool
+
+
+class TestFeatureExtractionTool(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.tool = load_tool()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def extract(self, index_name):
+        index_path = Path(self.tmp_dir.name) / index_name
+        config = self.tool.FeatureExtractionToolConfig(
+            sources=[str(from_here("../data/smoke_test/ldc93s1.csv"))],
+            feature_store=str(Path(self.tmp_dir.name) / "store"),
+            index=str(index_path),
+            process_ahead=2,
+        )
+        initialize_globals_from_instance(config)
+        self.tool.extract_features()
+        with open(index_path, encoding="utf-8", newline="") as index_file:
+            return list(csv.DictReader(index_file))
+
+    def test_index_matches_store(self):
+        rows = self.extract("index.csv")
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(
+            rows[0]["transcript"],
+            "she had your dark suit in greasy wash water all year",
+        )
+        store = FeatureStore(str(Path(self.tmp_dir.name) / "store"))
+        self.assertEqual(len(store.packs), 1)
+        for row in rows:
+            features = store.get(row["feature_key"])
+            self.assertIsNotNone(features)
+            self.assertGreater(int(row["frames"]), 0)
+            self.assertEqual(
+                features.shape, (int(row["frames"]), store.params["n_input"])
+            )
+        # A second run finds all features in the store
+        self.assertEqual(self.extract("index2.csv"), rows)
+        self.assertEqual(len(FeatureStore(store.path).packs), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from coqui_stt_training.util.audio import AUDIO_TYPE_WAV, Sample
+from coqui_stt_training.util.feature_store import FeatureStore
+
+PARAMS = dict(feature_win_len=32, feature_win_step=20, n_input=26)
+
+
+def load_wav_sample():
+    wav_path = Path(__file__).parent / "../data/smoke_test/LDC93S1_pcms16le_1_16000.wav"
+    with open(wav_path, "rb") as wav_file:
+        return Sample(AUDIO_TYPE_WAV, wav_file.read())
+
+
+class TestFeatureStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_put_get(self):
+        store = FeatureStore(self.tmp_dir.name, params=PARAMS)
+        key = store.key(load_wav_sample())
+        self.assertNotIn(key, store)
+        self.assertIsNone(store.get(key))
+        features = np.random.rand(10, 26).astype(np.float32)
+        store.put(key, features)
+        self.assertIn(key, store)
+        np.testing.assert_array_equal(store.get(key), features)
+        # Same content, new sample
+        self.assertEqual(key, store.key(load_wav_sample()))
+
+    def test_params_in_key(self):
+        sample = load_wav_sample()
+        store = FeatureStore(self.tmp_dir.name, params=PARAMS)
+        other_store = FeatureStore(self.tmp_dir.name, params=dict(PARAMS, n_input=13))
+        self.assertNotEqual(store.key(sample), other_store.key(sample))
+
+    def test_packs(self):
+        store = FeatureStore(self.tmp_dir.name, params=PARAMS, dtype=np.float16)
+        entries = {
+            "{:040x}".format(i): np.random.rand(i, 26).astype(np.float32)
+            for i in range(20)
+        }
+        # Small packs - so entries spread across several of them
+        with store.pack_writer(pack_size=2000) as pack_writer:
+            for key, features in entries.items():
+                pack_writer.add(key, features)
+            pack_writer.add("{:040x}".format(5), np.zeros((3, 26)))  # skipped
+        self.assertEqual(store.packs, [])  # packs are visible to stores opened later
+        store = FeatureStore(self.tmp_dir.name, params=PARAMS)
+        self.assertGreater(len(store.packs), 1)
+        for key, features in entries.items():
+            self.assertIn(key, store)
+            np.testing.assert_allclose(store.get(key), features, rtol=1e-3, atol=1e-3)
+            self.assertEqual(store.get(key).dtype, np.float16)
+        self.assertNotIn("f" * 40, store)
+        self.assertIsNone(store.get("f" * 40))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import threading
+import unittest
+
+import numpy as np
+
+from coqui_stt_training.util.helpers import LimitingPool, SharedMemoryRing
+
+RING = None
+
+
+def init_ring(ring):
+    global RING  # pylint: disable=global-statement
+    RING = ring
+
+
+def square(value):
+    return value * value
+
+
+def ring_put(index):
+    return RING.put(index, np.full((index, 2), index, dtype=np.float32))
+
+
+class ObservedSemaphore(threading.Semaphore):
+    """Semaphore that reports every caller that has to wait for it"""
+
+    def __init__(self, value, on_wait):
+        super().__init__(value)
+        self.on_wait = on_wait
+
+    def acquire(self, blocking=True, timeout=None):
+        if blocking:
+            self.on_wait()
+        return super().acquire(blocking, timeout)
+
+
+class TestLimitingPool(unittest.TestCase):
+    def test_imap(self):
+        for chunksize in [1, 3]:
+            with LimitingPool(
+                processes=2, process_ahead=4, chunksize=chunksize
+            ) as pool:
+                results = list(pool.imap(square, range(20)))
+                stats = pool.stats()
+            self.assertEqual(results, [value * value for value in range(20)])
+            self.assertEqual(stats["consumed"], 20)
+            self.assertEqual(stats["queue_depth"], 0)
+            self.assertLessEqual(stats["max_queue_depth"], 4)
+
+    def test_backpressure(self):
+        fed = []
+        feeder_blocked = threading.Event()
+
+        def feed():
+            for value in range(100):
+                fed.append(value)
+                yield value
+
+        def on_wait():
+            # Process-ahead limit of 5 plus the one consumed result
+            if len(fed) == 6:
+                feeder_blocked.set()
+
+        with LimitingPool(processes=2, process_ahead=5) as pool:
+            pool.slots = ObservedSemaphore(pool.process_ahead, on_wait)
+            results = pool.imap(square, feed())
+            self.assertEqual(next(results), 0)
+            self.assertTrue(feeder_blocked.wait(timeout=30))
+            self.assertEqual(len(fed), 6)
+            # Blocked time gets accounted once the feeder resumes
+            self.assertEqual(len(list(results)), 99)
+            self.assertGreater(pool.stats()["feeder_idle"], 0.0)
+
+
+class TestSharedMemoryRing(unittest.TestCase):
+    def test_transport(self):
+        ring = SharedMemoryRing(4, slot_size=8 * 20)
+        try:
+            with LimitingPool(
+                processes=2, process_ahead=3, initializer=init_ring, initargs=(ring,)
+            ) as pool:
+                for index, descriptor in enumerate(pool.imap(ring_put, range(30))):
+                    if index * 8 > ring.slot_size:
+                        self.assertIsNone(descriptor)
+                    else:
+                        np.testing.assert_array_equal(
+                            ring.get(descriptor),
+                            np.full((index, 2), index, dtype=np.float32),
+                        )
+        finally:
+            ring.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import random
+import unittest
+from collections import OrderedDict
+
+from coqui_stt_training.util.helpers import BATCH_KEY_RANGE, pack_batches
+
+
+def group_by_batch_key(packed):
+    """Groups packed entries like the tf.data group_by_window stage of create_dataset:
+    windows are keyed by batch key and get flushed once they reach the size encoded in the key"""
+    windows = OrderedDict()
+    batches = []
+    for entry in packed:
+        batch_key = entry[-1]
+        window = windows.setdefault(batch_key, [])
+        window.append(entry[:-1])
+        if len(window) == batch_key % BATCH_KEY_RANGE:
+            batches.append(windows.pop(batch_key))
+    # Incomplete windows would only get flushed at the end of the data set
+    return batches, list(windows.values())
+
+
+class TestPackBatches(unittest.TestCase):
+    def test_frame_budget(self):
+        rng = random.Random(42)
+        max_frames = 1000
+        frames = [rng.randint(10, 600) for _ in range(500)] + [1500, 20]
+        entries = [(n, ("sample-{}".format(i), n)) for i, n in enumerate(frames)]
+        batches, incomplete = group_by_batch_key(pack_batches(entries, max_frames))
+        self.assertEqual(incomplete, [])
+        # No sample got dropped, duplicated or reordered
+        self.assertEqual(
+            [e for batch in batches for e in batch], [e for _, e in entries]
+        )
+        for batch in batches:
+            padded_frames = len(batch) * max(n for _, n in batch)
+            # Only samples that exceed the budget on their own get a batch of their own
+            self.assertTrue(padded_frames <= max_frames or len(batch) == 1)
+        self.assertIn([("sample-500", 1500)], batches)
+
+    def test_batch_keys(self):
+        entries = [(100, (i,)) for i in range(25)]
+        packed = list(pack_batches(entries, 1000))
+        keys = [entry[-1] for entry in packed]
+        self.assertEqual(
+            keys,
+            [10] * 10 + [BATCH_KEY_RANGE + 10] * 10 + [2 * BATCH_KEY_RANGE + 5] * 5,
+        )
+        self.assertEqual(list(pack_batches([], 1000)), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,448 @@
+import io
+import json
+import os
+import tarfile
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from coqui_stt_training.util.audio import AUDIO_TYPE_WAV
+from coqui_stt_training.util.sample_collections import (
+    BucketedSamples,
+    CSV,
+    MAGIC,
+    SDB,
+    SDB_ACCESS_BUFFERED,
+    SDB_ACCESS_MMAP,
+    SDB_ACCESS_PREAD,
+    CSVIndex,
+    DirectSDBWriter,
+    LabeledSample,
+    ShardedSDB,
+    ShardedSDBWriter,
+    ShuffledSamples,
+    WebDatasetSource,
+    load_sample,
+    samples_from_source,
+    sample_durations,
+    samples_from_sources,
+    skip_samples,
+    unpack_maybe,
+)
+
+
+def from_here(path):
+    here = Path(__file__)
+    return here.parent / path
+
+
+# Ordered from shortest to longest
+SMOKE_TEST_WAVS = [
+    "../data/smoke_test/LDC93S1_pcms16le_1_16000.wav",
+    "../data/smoke_test/LDC93S1_pcms16le_2_44100.wav",
+    "../data/smoke_test/LDC93S1_pcms16le_1_8000.wav",
+]
+
+
+def write_v1_sdb(sdb_path, wav_paths):
+    """Writes an SDB of format version 1 - without version key and per-sample metadata index"""
+
+    def int_bytes(n, size=4):
+        return n.to_bytes(size, "big")
+
+    meta_data = json.dumps(
+        {
+            "schema": [
+                {"content": "speech", "mime-type": AUDIO_TYPE_WAV},
+                {"content": "transcript", "mime-type": "text/plain"},
+            ]
+        }
+    ).encode()
+    header = MAGIC + int_bytes(len(meta_data), 8) + meta_data
+    entries = []
+    for index, wav_path in enumerate(wav_paths):
+        with open(from_here(wav_path), "rb") as wav_file:
+            audio = wav_file.read()
+        transcript = "sample {}".format(index).encode()
+        entry = int_bytes(len(audio)) + audio + int_bytes(len(transcript)) + transcript
+        entries.append(int_bytes(len(entry)) + entry)
+    offset = len(header) + 2 * 8
+    offsets = []
+    for entry in entries:
+        offsets.append(offset)
+        offset += len(entry)
+    with open(sdb_path, "wb") as sdb_file:
+        sdb_file.write(header)
+        sdb_file.write(int_bytes(8 + sum(map(len, entries)), 8))
+        sdb_file.write(int_bytes(len(entries), 8))
+        sdb_file.write(b"".join(entries))
+        sdb_file.write(int_bytes(8 + 8 * len(offsets), 8))
+        sdb_file.write(int_bytes(len(offsets), 8))
+        sdb_file.write(b"".join(int_bytes(o, 8) for o in offsets))
+
+
+class TestSDB(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.sdb_path = os.path.join(self.tmp_dir.name, "test.sdb")
+        with DirectSDBWriter(self.sdb_path, audio_type=AUDIO_TYPE_WAV) as writer:
+            for index, wav_path in enumerate(SMOKE_TEST_WAVS):
+                with open(from_here(wav_path), "rb") as wav_file:
+                    writer.add(
+                        LabeledSample(
+                            AUDIO_TYPE_WAV, wav_file.read(), "sample {}".format(index)
+                        )
+                    )
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _assert_same_samples(self, expected, actual):
+        self.assertEqual(len(expected), len(actual))
+        for index in range(len(expected)):
+            expected_sample = unpack_maybe(expected[index])
+            actual_sample = unpack_maybe(actual[index])
+            self.assertEqual(expected_sample.sample_id, actual_sample.sample_id)
+            self.assertEqual(expected_sample.transcript, actual_sample.transcript)
+            self.assertEqual(
+                expected_sample.audio.getvalue(), actual_sample.audio.getvalue()
+            )
+
+    def test_mmap(self):
+        self._assert_same_samples(
+            SDB(self.sdb_path), SDB(self.sdb_path, access=SDB_ACCESS_MMAP)
+        )
+
+    def test_packed_attributes(self):
+        for labeled in [None, False]:
+            for reverse in [False, True]:
+                sdb = SDB(
+                    self.sdb_path,
+                    access=SDB_ACCESS_MMAP,
+                    labeled=labeled,
+                    reverse=reverse,
+                )
+                for index in range(len(sdb)):
+                    packed = sdb[index]
+                    sample = unpack_maybe(packed)
+                    self.assertEqual(packed.sample_id, sample.sample_id)
+                    self.assertEqual(
+                        packed.transcript, getattr(sample, "transcript", None)
+                    )
+                    if labeled is False:
+                        self.assertIsNone(packed.transcript)
+
+    def test_mmap_reverse(self):
+        self._assert_same_samples(
+            SDB(self.sdb_path, reverse=True),
+            SDB(self.sdb_path, reverse=True, access=SDB_ACCESS_MMAP),
+        )
+
+    def test_pread(self):
+        self._assert_same_samples(
+            SDB(self.sdb_path), SDB(self.sdb_path, access=SDB_ACCESS_PREAD)
+        )
+
+    def test_pread_threaded(self):
+        sdb = SDB(self.sdb_path, access=SDB_ACCESS_PREAD)
+        indices = [2, 0, 1] * 10
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            samples = list(executor.map(sdb.__getitem__, indices))
+        self._assert_same_samples(SDB(self.sdb_path).load_samples(indices), samples)
+
+    def test_read_rows(self):
+        indices = [2, 0, 2, 1]
+        for access in [SDB_ACCESS_BUFFERED, SDB_ACCESS_MMAP, SDB_ACCESS_PREAD]:
+            for reverse in [False, True]:
+                sdb = SDB(self.sdb_path, access=access, reverse=reverse)
+                columns = sdb.row_columns()
+                expected = [sdb.read_row(i, *columns) for i in indices]
+                rows = sdb.read_rows(indices, *columns)
+                self.assertEqual(
+                    [tuple(map(bytes, row)) for row in expected],
+                    [tuple(map(bytes, row)) for row in rows],
+                )
+
+    def test_sample_meta(self):
+        for access in [SDB_ACCESS_BUFFERED, SDB_ACCESS_MMAP]:
+            sdb = SDB(self.sdb_path, access=access, reverse=True)
+            self.assertEqual(len(sdb.sample_meta), len(sdb))
+            for index in range(len(sdb)):
+                sample = unpack_maybe(sdb[index])
+                meta = sdb.sample_meta[index]
+                self.assertAlmostEqual(meta["duration"], sample.duration)
+                self.assertEqual(meta["rate"], sample.audio_format.rate)
+                self.assertEqual(meta["channels"], sample.audio_format.channels)
+                self.assertEqual(meta["transcript_len"], len(sample.transcript))
+
+    def test_format_version_1(self):
+        v1_sdb_path = os.path.join(self.tmp_dir.name, "v1.sdb")
+        write_v1_sdb(v1_sdb_path, SMOKE_TEST_WAVS)
+        for access in [SDB_ACCESS_BUFFERED, SDB_ACCESS_MMAP, SDB_ACCESS_PREAD]:
+            v1_sdb = SDB(v1_sdb_path, access=access)
+            self.assertEqual(v1_sdb.version, 1)
+            self.assertIsNone(v1_sdb.sample_meta)
+            self.assertIsNone(sample_durations(v1_sdb))
+            sdb = SDB(self.sdb_path)
+            self.assertEqual(len(v1_sdb), len(sdb))
+            for index in range(len(sdb)):
+                expected_sample = sdb[index]
+                sample = unpack_maybe(v1_sdb[index])
+                self.assertEqual(sample.transcript, expected_sample.transcript)
+                self.assertEqual(
+                    sample.audio.getvalue(), expected_sample.audio.getvalue()
+                )
+                self.assertAlmostEqual(sample.duration, expected_sample.duration)
+        # Multiple version 1 SDBs still get interleaved - by unpacking their samples
+        samples = samples_from_sources([v1_sdb_path, self.sdb_path])
+        durations = [unpack_maybe(sample).duration for sample in samples]
+        self.assertEqual(len(durations), 2 * len(SMOKE_TEST_WAVS))
+        self.assertEqual(durations, sorted(durations))
+
+    def test_interleave_by_sample_meta(self):
+        samples = samples_from_sources([self.sdb_path, self.sdb_path])
+        durations = [unpack_maybe(sample).duration for sample in samples]
+        self.assertEqual(len(durations), 2 * len(SMOKE_TEST_WAVS))
+        self.assertEqual(durations, sorted(durations))
+
+    def test_skip_samples(self):
+        for sources in [[self.sdb_path], [self.sdb_path, self.sdb_path]]:
+            samples = samples_from_sources(sources)
+            transcripts = [unpack_maybe(s).transcript for s in samples]
+            for count in range(len(transcripts) + 1):
+                skipped = skip_samples(samples_from_sources(sources), count)
+                self.assertEqual(len(skipped), len(transcripts) - count)
+                self.assertEqual(
+                    [unpack_maybe(s).transcript for s in skipped], transcripts[count:]
+                )
+
+    def test_add_all(self):
+        parallel_sdb_path = os.path.join(self.tmp_dir.name, "parallel.sdb")
+        wav_paths = [str(from_here(wav_path)) for wav_path in SMOKE_TEST_WAVS] * 3
+        with DirectSDBWriter(parallel_sdb_path, audio_type=AUDIO_TYPE_WAV) as writer:
+            packed_samples = [
+                load_sample(wav_path, label="sample {}".format(index % 3))
+                for index, wav_path in enumerate(wav_paths)
+            ]
+            sample_ids = list(
+                writer.add_all(packed_samples, processes=2, process_ahead=2)
+            )
+        self.assertEqual(
+            sample_ids,
+            ["{}:{}".format(parallel_sdb_path, i) for i in range(len(wav_paths))],
+        )
+        sdb = SDB(self.sdb_path)
+        parallel_sdb = SDB(parallel_sdb_path)
+        self.assertEqual(len(parallel_sdb), len(wav_paths))
+        for index in range(len(parallel_sdb)):
+            self.assertEqual(
+                parallel_sdb.read_row(index, 0, 1),
+                sdb.read_row(index % len(sdb), 0, 1),
+            )
+
+    def test_sharded(self):
+        manifest_path = os.path.join(self.tmp_dir.name, "sharded.sdbs")
+        sdb = SDB(self.sdb_path)
+        with ShardedSDBWriter(
+            manifest_path, shard_size=2, audio_type=AUDIO_TYPE_WAV
+        ) as writer:
+            for index in range(len(sdb)):
+                writer.add(sdb[index])
+        sharded_sdb = samples_from_source(manifest_path)
+        self.assertIsInstance(sharded_sdb, ShardedSDB)
+        self.assertEqual(len(sharded_sdb.shards), 2)
+        self.assertEqual(
+            [sample.transcript for sample in sdb],
+            [sample.transcript for sample in sharded_sdb],
+        )
+        for index in range(len(sdb)):
+            self.assertEqual(sdb[index].transcript, sharded_sdb[index].transcript)
+
+
+class TestCSV(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.csv_path = os.path.join(self.tmp_dir.name, "test.csv")
+        with open(self.csv_path, "w", encoding="utf8") as csv_file:
+            csv_file.write("wav_filename,wav_filesize,transcript\n")
+            for index, size in enumerate([30, 10, 20, 10]):
+                csv_file.write("{}.wav,{},sample {}\n".format(index, size, index))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_index_cache(self):
+        for reverse in [False, True]:
+            expected = CSV(self.csv_path, reverse=reverse).samples
+            built = CSV(self.csv_path, reverse=reverse, index_cache=True)
+            self.assertIsInstance(built.samples, CSVIndex)
+            self.assertTrue(os.path.isfile(self.csv_path + ".idx"))
+            cached = CSV(self.csv_path, reverse=reverse, index_cache=True)
+            self.assertEqual(expected, list(built.samples))
+            self.assertEqual(expected, list(cached.samples))
+            self.assertEqual(
+                [(path, transcript) for path, _, transcript in expected],
+                list(cached.transcripts()),
+            )
+            self.assertEqual(
+                [(s.filename, s.label) for s in CSV(self.csv_path, reverse=reverse)],
+                [(s.filename, s.label) for s in cached],
+            )
+
+    def test_index_cache_invalidation(self):
+        CSV(self.csv_path, index_cache=True)
+        with open(self.csv_path, "a", encoding="utf8") as csv_file:
+            csv_file.write("4.wav,5,sample 4\n")
+        csv = CSV(self.csv_path, index_cache=True)
+        self.assertEqual(len(csv), 5)
+        self.assertEqual(csv.samples[0][2], "sample 4")
+
+    def test_order_by_duration(self):
+        wavs_csv_path = os.path.join(self.tmp_dir.name, "wavs.csv")
+        with open(wavs_csv_path, "w", encoding="utf8") as csv_file:
+            csv_file.write("wav_filename,wav_filesize,transcript\n")
+            for wav_path in reversed(SMOKE_TEST_WAVS):
+                csv_file.write("{},0,sample\n".format(from_here(wav_path).resolve()))
+        expected = [str(from_here(wav_path).resolve()) for wav_path in SMOKE_TEST_WAVS]
+        for index_cache in [False, True, True]:
+            csv = CSV(wavs_csv_path, order_by_duration=True, index_cache=index_cache)
+            self.assertEqual([sample[0] for sample in csv.samples], expected)
+            self.assertEqual(list(csv.durations), sorted(csv.durations))
+            with open(wavs_csv_path + ".durations", encoding="utf8") as cache_file:
+                self.assertEqual(len(cache_file.readlines()), len(SMOKE_TEST_WAVS))
+
+
+class TestWebDataset(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        for shard in range(3):
+            shard_path = os.path.join(self.tmp_dir.name, "shard-{}.tar".format(shard))
+            with tarfile.open(shard_path, "w") as shard_tar:
+                for index, wav_path in enumerate(SMOKE_TEST_WAVS[: shard + 1]):
+                    with open(from_here(wav_path), "rb") as wav_file:
+                        wav_data = wav_file.read()
+                    transcript = "sample {} {}".format(shard, index).encode()
+                    for ext, data in [("wav", wav_data), ("txt", transcript)]:
+                        info = tarfile.TarInfo("{}-{}.{}".format(shard, index, ext))
+                        info.size = len(data)
+                        shard_tar.addfile(info, io.BytesIO(data))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_shards(self):
+        url = os.path.join(self.tmp_dir.name, "shard-{0..2}.tar")
+        count_index = os.path.join(self.tmp_dir.name, "counts.json")
+        source = samples_from_source(url, webdataset_count_index=count_index)
+        self.assertIsInstance(source, WebDatasetSource)
+        self.assertEqual(len(source), 6)
+        self.assertTrue(os.path.isfile(count_index))
+        transcripts = [unpack_maybe(sample).transcript for sample in source]
+        self.assertEqual(
+            sorted(transcripts),
+            sorted(
+                "sample {} {}".format(shard, index)
+                for shard in range(3)
+                for index in range(shard + 1)
+            ),
+        )
+        with self.assertRaises(TypeError):
+            len(WebDatasetSource(url))
+
+    def test_packed_attributes(self):
+        url = os.path.join(self.tmp_dir.name, "shard-{0..2}.tar")
+        for sample in WebDatasetSource(url):
+            unpacked = unpack_maybe(sample)
+            self.assertEqual(sample.sample_id, unpacked.sample_id)
+            self.assertEqual(sample.transcript, unpacked.transcript)
+        for sample in WebDatasetSource(url, labeled=False):
+            self.assertIsNone(sample.transcript)
+
+    def test_worker_split(self):
+        url = os.path.join(self.tmp_dir.name, "shard-{0..2}.tar")
+        count_index = os.path.join(self.tmp_dir.name, "counts.json")
+        workers = [
+            WebDatasetSource(
+                url, count_index=count_index, worker_index=index, num_workers=2
+            )
+            for index in range(2)
+        ]
+        self.assertEqual([len(worker) for worker in workers], [1 + 3, 2])
+        sample_ids = [[sample.sample_id for sample in worker] for worker in workers]
+        self.assertEqual(
+            sorted(sample_ids[0] + sample_ids[1]),
+            sorted(sample.sample_id for sample in WebDatasetSource(url)),
+        )
+        self.assertFalse(set(sample_ids[0]) & set(sample_ids[1]))
+        with self.assertRaises(ValueError):
+            WebDatasetSource(url, worker_index=2, num_workers=2)
+
+
+class DurationList(list):
+    def __init__(self, durations):
+        super().__init__(durations)
+        self.durations = durations
+
+
+class TestBucketedSamples(unittest.TestCase):
+    def test_buckets(self):
+        cols = [DurationList([3.0, 1.0, 7.0, 5.0]), DurationList([2.0, 4.0, 6.0])]
+        for seed in range(5):
+            samples = BucketedSamples(cols, batch_size=2, bucket_size=1, seed=seed)
+            durations = list(samples)
+            self.assertEqual(sorted(durations), sorted(cols[0] + cols[1]))
+            self.assertEqual(durations[-1], 7.0)  # incomplete last batch
+            batches = sorted(sorted(durations[i : i + 2]) for i in range(0, 6, 2))
+            self.assertEqual(batches, [[1.0, 2.0], [3.0, 4.0], [5.0, 6.0]])
+
+    def test_reverse(self):
+        cols = [DurationList([3.0, 1.0, 7.0, 5.0]), DurationList([2.0, 4.0, 6.0])]
+        for seed in range(5):
+            samples = BucketedSamples(
+                cols, batch_size=2, bucket_size=1, seed=seed, reverse=True
+            )
+            durations = list(samples)
+            # Longest batches first - the incomplete last batch has the shortest sample
+            batches = [sorted(durations[i : i + 2]) for i in range(0, 6, 2)]
+            self.assertEqual(batches, [[6.0, 7.0], [4.0, 5.0], [2.0, 3.0]])
+            self.assertEqual(durations[-1], 1.0)
+        # A source without durations is already reversed by itself
+        samples = BucketedSamples(
+            [[3, 2, 1]], batch_size=1, bucket_size=1, reverse=True
+        )
+        self.assertEqual(list(samples), [3, 2, 1])
+
+    def test_unknown_durations(self):
+        samples = BucketedSamples([[1, 2, 3]], batch_size=3, bucket_size=1)
+        self.assertEqual(sorted(samples), [1, 2, 3])
+        with self.assertRaises(RuntimeError):
+            BucketedSamples([[1], [2]], batch_size=1, bucket_size=1)
+
+
+class TestShuffledSamples(unittest.TestCase):
+    def test_permutation(self):
+        cols = [list(range(0, 50)), list(range(50, 100))]
+        orders = [list(ShuffledSamples(cols, seed=seed)) for seed in range(3)]
+        for order in orders:
+            self.assertEqual(sorted(order), list(range(100)))
+        self.assertNotEqual(orders[0], orders[1])
+        self.assertEqual(orders[0], list(ShuffledSamples(cols, seed=0)))
+
+    def test_window(self):
+        cols = [DurationList([5.0, 1.0, 3.0, 7.0]), DurationList([2.0, 6.0, 4.0, 8.0])]
+        for seed in range(5):
+            samples = list(ShuffledSamples(cols, seed=seed, window=2))
+            windows = [sorted(samples[i : i + 2]) for i in range(0, 8, 2)]
+            self.assertEqual(windows, [[1.0, 2.0], [3.0, 4.0], [5.0, 6.0], [7.0, 8.0]])
+        samples = list(ShuffledSamples(cols, window=2, reverse=True))
+        windows = [sorted(samples[i : i + 2]) for i in range(0, 8, 2)]
+        self.assertEqual(windows, [[7.0, 8.0], [5.0, 6.0], [3.0, 4.0], [1.0, 2.0]])
+        with self.assertRaises(RuntimeError):
+            ShuffledSamples([[1], [2]], window=1)
+        with self.assertRaises(ValueError):
+            ShuffledSamples([iter([1])])
+
+
+if __name__ == "__main__":
+    unittest.main()
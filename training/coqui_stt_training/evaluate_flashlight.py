@@ -68,6 +68,7 @@ def evaluate(test_csvs, create_model):
             augmentations=[NormalizeSampleRate(Config.audio_sample_rate)],
             reverse=Config.reverse_test,
             limit=Config.limit_test,
+            max_frames=Config.max_batch_frames,
         )
         for csv in test_csvs
     ]
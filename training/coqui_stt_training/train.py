@@ -2,8 +2,10 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, division, print_function
 
+import json
 import os
 import sys
+import tempfile
 
 LOG_LEVEL_INDEX = sys.argv.index("--log_level") + 1 if "--log_level" in sys.argv else 0
 DESIRED_LOG_LEVEL = (
@@ -40,11 +42,13 @@ from .deepspeech_model import (
     rnn_impl_cudnn_rnn,
     reset_default_graph,
 )
-from .util.augmentations import NormalizeSampleRate
+from .util.augmentations import AugmentationStats, NormalizeSampleRate
 from .util.checkpoints import (
+    load_data_position,
     load_graph_for_evaluation,
     load_or_init_graph_for_training,
     reload_best_checkpoint,
+    save_data_position,
 )
 from .util.config import (
     Config,
@@ -58,7 +62,12 @@ from .util.config import (
 )
 from .util.feeding import create_dataset
 from .util.helpers import check_ctcdecoder_version
-from .util.io import remove_remote
+from .util.io import (
+    is_remote_path,
+    open_remote,
+    path_exists_remote,
+    remove_remote,
+)
 
 
 # Accuracy and Loss
@@ -104,8 +113,8 @@ def calculate_mean_edit_distance_and_loss(iterator, dropout, reuse):
     # Calculate the average loss across the batch
     avg_loss = tf.reduce_mean(input_tensor=total_loss)
 
-    # Finally we return the average loss
-    return avg_loss, non_finite_files
+    # Finally we return the average loss and the number of samples it averages
+    return avg_loss, non_finite_files, tf.shape(input=batch_filenames)[0]
 
 
 # Adam Optimization
@@ -159,6 +168,9 @@ def get_tower_results(iterator, optimizer, dropout_rates):
     # Aggregate any non finite files in the batches
     tower_non_finite_files = []
 
+    # Batch sizes of the towers - they can differ (e.g. with --max_batch_frames)
+    tower_batch_sizes = []
+
     with tfv1.variable_scope(tfv1.get_variable_scope()):
         # Loop over available_devices
         for i in range(len(Config.available_devices)):
@@ -169,7 +181,11 @@ def get_tower_results(iterator, optimizer, dropout_rates):
                 with tf.name_scope("tower_%d" % i):
                     # Calculate the avg_loss and mean_edit_distance and retrieve the decoded
                     # batch along with the original batch's labels (Y) of this tower
-                    avg_loss, non_finite_files = calculate_mean_edit_distance_and_loss(
+                    (
+                        avg_loss,
+                        non_finite_files,
+                        batch_size,
+                    ) = calculate_mean_edit_distance_and_loss(
                         iterator, dropout_rates, reuse=i > 0
                     )
 
@@ -187,20 +203,36 @@ def get_tower_results(iterator, optimizer, dropout_rates):
 
                     tower_non_finite_files.append(non_finite_files)
 
-    avg_loss_across_towers = tf.reduce_mean(input_tensor=tower_avg_losses, axis=0)
+                    tower_batch_sizes.append(batch_size)
+
+    # Weighting tower losses (and gradients) by their batch sizes averages them over all samples of the step
+    tower_batch_sizes = tf.cast(tf.stack(tower_batch_sizes), tf.float32)
+    num_samples = tf.reduce_sum(input_tensor=tower_batch_sizes)
+    tower_weights = tower_batch_sizes / num_samples
+    avg_loss_across_towers = tf.reduce_sum(
+        input_tensor=tf.stack(tower_avg_losses) * tower_weights
+    )
     tfv1.summary.scalar(
         name="step_loss", tensor=avg_loss_across_towers, collections=["step_summaries"]
     )
 
     all_non_finite_files = tf.concat(tower_non_finite_files, axis=0)
 
-    # Return gradients and the average loss
-    return tower_gradients, avg_loss_across_towers, all_non_finite_files
+    # Return gradients and their weights, the average loss and the number of samples of the step
+    return (
+        tower_gradients,
+        tower_weights,
+        avg_loss_across_towers,
+        all_non_finite_files,
+        num_samples,
+    )
 
 
-def average_gradients(tower_gradients):
+def average_gradients(tower_gradients, tower_weights=None):
     r"""
     A routine for computing each variable's average of the gradients obtained from the GPUs.
+    If tower_weights (a tensor of one weight per tower, summing up to 1) are provided,
+    the average is weighted by them - e.g. by the towers' shares of the samples of a step.
     Note also that this code acts as a synchronization point as it requires all
     GPUs to be finished with their mini-batch before it can run to completion.
     """
@@ -223,7 +255,14 @@ def average_gradients(tower_gradients):
 
             # Average over the 'tower' dimension
             grad = tf.concat(grads, 0)
-            grad = tf.reduce_mean(input_tensor=grad, axis=0)
+            if tower_weights is None:
+                grad = tf.reduce_mean(input_tensor=grad, axis=0)
+            else:
+                weights = tf.reshape(
+                    tf.cast(tower_weights, grad.dtype),
+                    [-1] + [1] * (len(grad.shape) - 1),
+                )
+                grad = tf.reduce_sum(input_tensor=grad * weights, axis=0)
 
             # Create a gradient/variable tuple for the current variable with its average gradient
             grad_and_var = (grad, grad_and_vars[0][1])
@@ -263,15 +302,77 @@ def early_training_checks():
         Config.test_files = []
 
 
+DEV_BATCH_CACHE_DIRNAME = "dev_batch_cache"
+
+
+def dev_batch_cache(set_name, index):
+    """
+    Batch cache file prefix (see create_dataset) of a dev or metrics set - None, if --cache_dev_batches is disabled.
+    Defaults to a directory in the (local) summary directory or, if that is remote, in the temporary directory.
+    """
+    if not Config.cache_dev_batches:
+        return None
+    cache_dir = Config.dev_batch_cache_dir
+    if not cache_dir:
+        cache_dir = os.path.join(
+            tempfile.gettempdir()
+            if is_remote_path(Config.summary_dir)
+            else Config.summary_dir,
+            DEV_BATCH_CACHE_DIRNAME,
+        )
+    os.makedirs(cache_dir, exist_ok=True)
+    return os.path.join(cache_dir, "{}_{}".format(set_name, index))
+
+
+AUGMENTATION_STATS_FILENAME = "augmentation_stats.json"
+
+
+def report_augmentation_stats(augmentation_stats, epoch, step, summary_writer):
+    """
+    Writes the augmentation counters of a training epoch (see --augmentation_stats) as TensorBoard summaries
+    and appends them to the JSON report in Config.summary_dir. Resets the counters for the next epoch.
+    """
+    entries = augmentation_stats.report()
+    summary_values = []
+    for entry in entries:
+        log_info(
+            "Augmentation {augmentation}: applied {applications} of {invocations} times "
+            "(p={realized_probability:.3f}) in {seconds:.1f}s "
+            "({ms_per_application:.2f} ms per application)".format(**entry)
+        )
+        for key in ["realized_probability", "seconds", "ms_per_application"]:
+            summary_values.append(
+                tfv1.Summary.Value(
+                    tag="augmentations/{}/{}".format(entry["name"], key),
+                    simple_value=entry[key],
+                )
+            )
+    summary_writer.add_summary(tfv1.Summary(value=summary_values), step)
+    summary_writer.flush()
+
+    report_path = os.path.join(Config.summary_dir, AUGMENTATION_STATS_FILENAME)
+    report = []
+    if path_exists_remote(report_path):
+        with open_remote(report_path, "r") as report_file:
+            report = json.load(report_file)
+    report.append(dict(epoch=int(epoch), step=int(step), augmentations=entries))
+    with open_remote(report_path, "w") as report_file:
+        json.dump(report, report_file, indent=1)
+
+
 def create_training_datasets(
     epoch_ph: tf.Tensor = None,
     reverse: bool = False,
     limit: int = 0,
+    data_position: dict = None,
+    augmentation_stats: AugmentationStats = None,
 ) -> (tf.data.Dataset, [tf.data.Dataset], [tf.data.Dataset],):
     """Creates training datasets from input flags.
 
     Returns a single training dataset and two lists of datasets for validation
-    and metrics tracking.
+    and metrics tracking. The optional data_position dict gets shared with the
+    training dataset for resuming and tracking its position (see create_dataset).
+    The optional augmentation_stats record the augmentations of the training dataset.
     """
     # Create training and validation datasets
     train_set = create_dataset(
@@ -286,6 +387,13 @@ def create_training_datasets(
         limit=limit,
         buffering=Config.read_buffer,
         epoch_ph=epoch_ph,
+        bucket_size=Config.bucket_size,
+        max_frames=Config.max_batch_frames,
+        data_position=data_position,
+        shuffle_samples=Config.shuffle_samples,
+        shuffle_window=Config.shuffle_window,
+        batch_augmentations=Config.batch_augmentations,
+        augmentation_stats=augmentation_stats,
     )
 
     dev_sets = []
@@ -300,8 +408,11 @@ def create_training_datasets(
                 reverse=reverse,
                 limit=limit,
                 buffering=Config.read_buffer,
+                bucket_size=Config.bucket_size,
+                max_frames=Config.max_batch_frames,
+                batch_cache=dev_batch_cache("dev", index),
             )
-            for source in Config.dev_files
+            for index, source in enumerate(Config.dev_files)
         ]
 
     metrics_sets = []
@@ -316,8 +427,10 @@ def create_training_datasets(
                 reverse=reverse,
                 limit=limit,
                 buffering=Config.read_buffer,
+                max_frames=Config.max_batch_frames,
+                batch_cache=dev_batch_cache("metrics", index),
             )
-            for source in Config.metrics_files
+            for index, source in enumerate(Config.metrics_files)
         ]
 
     return train_set, dev_sets, metrics_sets
@@ -347,8 +460,18 @@ def train_impl(epochs=0, reverse=False, limit=0, write=True, silent_load=False):
     tfv1.set_random_seed(Config.random_seed)
 
     epoch_ph = tf.placeholder(tf.int64, name="epoch_ph")
+    data_position = {}
+    augmentation_stats = (
+        AugmentationStats(Config.augmentations)
+        if write and Config.augmentation_stats and Config.augmentations
+        else None
+    )
     train_set, dev_sets, metrics_sets = create_training_datasets(
-        epoch_ph, reverse=reverse, limit=limit
+        epoch_ph,
+        reverse=reverse,
+        limit=limit,
+        data_position=data_position,
+        augmentation_stats=augmentation_stats,
     )
 
     iterator = tfv1.data.Iterator.from_structure(
@@ -394,12 +517,12 @@ def train_impl(epochs=0, reverse=False, limit=0, write=True, silent_load=False):
             optimizer
         )
 
-    gradients, loss, non_finite_files = get_tower_results(
+    gradients, tower_weights, loss, non_finite_files, num_samples = get_tower_results(
         iterator, optimizer, dropout_rates
     )
 
-    # Average tower gradients across GPUs
-    avg_tower_gradients = average_gradients(gradients)
+    # Average tower gradients across GPUs - weighted by the towers' numbers of samples
+    avg_tower_gradients = average_gradients(gradients, tower_weights)
 
     # global_step is automagically incremented by the optimizer
     global_step = tfv1.train.get_or_create_global_step()
@@ -451,6 +574,48 @@ def train_impl(epochs=0, reverse=False, limit=0, write=True, silent_load=False):
         # Load checkpoint or initialize variables
         load_or_init_graph_for_training(session, silent=silent_load)
 
+        start_epoch = 0
+        if write and Config.resume_data_position:
+            resume = load_data_position(session.run(global_step))
+            if resume is None:
+                log_warn(
+                    "No data position recorded for the loaded checkpoint - "
+                    "starting with epoch 0."
+                )
+            else:
+                start_epoch = resume["epoch"]
+                if Config.feature_cache and resume["sample_index"] > 0:
+                    log_warn(
+                        "Restarting epoch %d from its first sample, as it would otherwise "
+                        "leave an incomplete feature cache behind." % start_epoch
+                    )
+                    resume["sample_index"] = 0
+                if (
+                    Config.shuffle_batches
+                    and start_epoch >= Config.shuffle_start
+                    and resume["sample_index"] > 0
+                ):
+                    log_warn(
+                        "Batches are shuffled - the skipped samples of epoch %d "
+                        "are not exactly the ones that got trained on." % start_epoch
+                    )
+                log_info(
+                    "Resuming training at epoch %d, sample %d."
+                    % (start_epoch, resume["sample_index"])
+                )
+                data_position["resume"] = resume
+
+        def save_position(epoch, sample_index, seed):
+            # Keyed by the step as stored in the checkpoint, which is what gets loaded on resume
+            current_step = session.run(global_step)
+            num_samples = data_position.get("num_samples", 0)
+            clock = (
+                (epoch * num_samples + sample_index) / (epochs * num_samples)
+                if 0 < num_samples < float("inf")
+                else 0.0
+            )
+            save_data_position(current_step, epoch, sample_index, seed, clock)
+
         def run_set(set_name, epoch, init_op, dataset=None):
             is_train = set_name == "train"
             train_op = apply_gradient_op if is_train else []
@@ -458,6 +623,7 @@ def train_impl(epochs=0, reverse=False, limit=0, write=True, silent_load=False):
 
             total_loss = 0.0
             step_count = 0
+            sample_count = 0
 
             checkpoint_time = time.time()
 
@@ -484,7 +650,21 @@ def train_impl(epochs=0, reverse=False, limit=0, write=True, silent_load=False):
                     )
 
                 def __call__(self, progress, data, **kwargs):
-                    data["mean_loss"] = total_loss / step_count if step_count else 0.0
+                    data["mean_loss"] = (
+                        total_loss / sample_count if sample_count else 0.0
+                    )
+                    return progressbar.widgets.FormatLabel.__call__(
+                        self, progress, data, **kwargs
+                    )
+
+            class SamplesWidget(progressbar.widgets.FormatLabel):
+                def __init__(self):
+                    progressbar.widgets.FormatLabel.__init__(
+                        self, format="Samples: %(samples)d"
+                    )
+
+                def __call__(self, progress, data, **kwargs):
+                    data["samples"] = sample_count
                     return progressbar.widgets.FormatLabel.__call__(
                         self, progress, data, **kwargs
                     )
@@ -498,6 +678,8 @@ def train_impl(epochs=0, reverse=False, limit=0, write=True, silent_load=False):
                 " | Steps: ",
                 progressbar.widgets.Counter(),
                 " | ",
+                SamplesWidget(),
+                " | ",
                 LossWidget(),
             ]
             suffix = " | Dataset: {}".format(dataset) if dataset else None
@@ -517,6 +699,7 @@ def train_impl(epochs=0, reverse=False, limit=0, write=True, silent_load=False):
                         batch_loss,
                         problem_files,
                         step_summary,
+                        batch_samples,
                     ) = session.run(
                         [
                             train_op,
@@ -524,6 +707,7 @@ def train_impl(epochs=0, reverse=False, limit=0, write=True, silent_load=False):
                             loss,
                             non_finite_files,
                             step_summaries_op,
+                            num_samples,
                         ],
                         feed_dict={**feed_dict, **{epoch_ph: epoch}},
                     )
@@ -537,7 +721,9 @@ def train_impl(epochs=0, reverse=False, limit=0, write=True, silent_load=False):
                         "loss: {}".format(",".join(problem_files))
                     )
 
-                total_loss += batch_loss
+                # Batch sizes can vary - weighting by them averages the loss over all samples of the epoch
+                total_loss += batch_loss * batch_samples
+                sample_count += int(batch_samples)
                 step_count += 1
 
                 pbar.update(step_count)
@@ -556,11 +742,16 @@ def train_impl(epochs=0, reverse=False, limit=0, write=True, silent_load=False):
                     checkpoint_saver.save(
                         session, checkpoint_path, global_step=current_step
                     )
+                    save_position(
+                        epoch,
+                        data_position["start_index"] + sample_count,
+                        data_position["seed"],
+                    )
                     checkpoint_time = time.time()
 
             pbar.finish()
-            mean_loss = total_loss / step_count if step_count > 0 else 0.0
-            return mean_loss, step_count
+            mean_loss = total_loss / sample_count if sample_count > 0 else 0.0
+            return mean_loss, sample_count
 
         log_info("STARTING Optimization")
         train_start_time = datetime.utcnow()
@@ -568,33 +759,48 @@ def train_impl(epochs=0, reverse=False, limit=0, write=True, silent_load=False):
         dev_losses = []
         epochs_without_improvement = 0
         try:
-            for epoch in range(epochs):
+            for epoch in range(start_epoch, epochs):
                 # Training
                 log_progress("Training epoch %d..." % epoch)
                 train_loss, _ = run_set("train", epoch, train_init_op)
                 log_progress(
                     "Finished training epoch %d - loss: %f" % (epoch, train_loss)
                 )
+                if augmentation_stats is not None:
+                    report_augmentation_stats(
+                        augmentation_stats,
+                        epoch,
+                        session.run(global_step),
+                        step_summary_writers["train"],
+                    )
                 if write:
                     checkpoint_saver.save(
                         session, checkpoint_path, global_step=global_step
                     )
+                    save_position(
+                        epoch + 1,
+                        0,
+                        Config.random_seed + epoch + 1,
+                    )
 
                 if Config.dev_files:
                     # Validation
                     dev_loss = 0.0
-                    total_steps = 0
+                    total_samples = 0
                     for source, init_op in zip(Config.dev_files, dev_init_ops):
                         log_progress("Validating epoch %d on %s..." % (epoch, source))
-                        set_loss, steps = run_set("dev", epoch, init_op, dataset=source)
-                        dev_loss += set_loss * steps
-                        total_steps += steps
+                        set_loss, samples = run_set(
+                            "dev", epoch, init_op, dataset=source
+                        )
+                        # Set losses are means over samples - so sets get weighted by their sample counts
+                        dev_loss += set_loss * samples
+                        total_samples += samples
                         log_progress(
                             "Finished validating epoch %d on %s - loss: %f"
                             % (epoch, source, set_loss)
                         )
 
-                    dev_loss = dev_loss / total_steps
+                    dev_loss = dev_loss / total_samples if total_samples else 0.0
                     dev_losses.append(dev_loss)
 
                     # Count epochs without an improvement for early stopping and reduction of learning rate on a plateau
@@ -6,10 +6,13 @@ import os
 import tempfile
 import wave
 from collections import namedtuple
+from functools import lru_cache
 
 import numpy as np
 import pyogg
 import miniaudio
+import resampy
+from numba import jit
 
 from .helpers import LimitingPool
 from .io import copy_remote, is_remote_path, open_remote, remove_remote
@@ -29,6 +32,14 @@ AUDIO_TYPE_OGG_OPUS = "audio/ogg;codecs=opus"
 AUDIO_TYPE_OGG_VORBIS = "audio/vorbis"
 AUDIO_TYPE_FLAC = "audio/flac"
 
+# Window parameters of resampy's "kaiser_fast" filter
+RESAMPLE_NUM_ZEROS = 24
+RESAMPLE_ROLLOFF = 0.868212
+RESAMPLE_KAISER_BETA = 9.90322
+# Larger rate ratios (like 16000:7919) would require a filter bank that is more expensive to design than to
+# interpolate a filter per output sample - so these are resampled by resampy
+RESAMPLE_MAX_POLYPHASE_PERIOD = 2048
+
 SERIALIZABLE_AUDIO_TYPES = [
     AUDIO_TYPE_WAV,
     AUDIO_TYPE_OPUS,
@@ -58,8 +69,13 @@ class Sample:
         Audio data represented as indicated by `audio_type`
     duration : float
         Audio duration of the sample in seconds
+
+    Duration and audio format of serialized audio data are only read from the data on first access,
+    so that samples which just get passed through are not decoded.
     """
 
+    __slots__ = ("audio_type", "sample_id", "audio", "_audio_format", "_duration")
+
     def __init__(self, audio_type, raw_data, audio_format=None, sample_id=None):
         """
         Parameters
@@ -82,30 +98,56 @@ class Sample:
             Tracking ID - should indicate sample's origin as precisely as possible
         """
         self.audio_type = audio_type
-        self.audio_format = audio_format
+        self._audio_format = audio_format if audio_format else None
+        self._duration = None
         self.sample_id = sample_id
         if audio_type in SERIALIZABLE_AUDIO_TYPES:
             self.audio = (
                 raw_data if isinstance(raw_data, io.BytesIO) else io.BytesIO(raw_data)
             )
-            self.duration = read_duration(audio_type, self.audio)
-            if not self.audio_format:
-                self.audio_format = read_format(audio_type, self.audio)
         else:
             self.audio = raw_data
-            if self.audio_format is None:
+            if self._audio_format is None:
                 raise ValueError(
                     'For audio type "{}" parameter "audio_format" is mandatory'.format(
                         self.audio_type
                     )
                 )
-            if audio_type == AUDIO_TYPE_PCM:
-                self.duration = get_pcm_duration(len(self.audio), self.audio_format)
-            elif audio_type == AUDIO_TYPE_NP:
-                self.duration = get_np_duration(len(self.audio), self.audio_format)
-            else:
+            if audio_type not in [AUDIO_TYPE_PCM, AUDIO_TYPE_NP]:
                 raise ValueError("Unsupported audio type: {}".format(self.audio_type))
 
+    def load_audio_format(self):
+        """
+        Reads the audio format from the header of serialized audio, if it was not read yet.
+        Has to be called before the audio gets replaced by data without a header.
+        """
+        if self._audio_format is None:
+            self._audio_format = read_format(self.audio_type, self.audio)
+        return self._audio_format
+
+    @property
+    def audio_format(self):
+        return self.load_audio_format()
+
+    @audio_format.setter
+    def audio_format(self, audio_format):
+        self._audio_format = audio_format
+
+    @property
+    def duration(self):
+        if self._duration is None:
+            if self.audio_type == AUDIO_TYPE_PCM:
+                self._duration = get_pcm_duration(len(self.audio), self.audio_format)
+            elif self.audio_type == AUDIO_TYPE_NP:
+                self._duration = get_np_duration(len(self.audio), self.audio_format)
+            else:
+                self._duration = read_duration(self.audio_type, self.audio)
+        return self._duration
+
+    @duration.setter
+    def duration(self, duration):
+        self._duration = duration
+
     def change_audio_type(self, new_audio_type, bitrate=None):
         """
         In-place conversion of audio data into a different representation.
@@ -124,6 +166,9 @@ class Sample:
             and self.audio_type in SERIALIZABLE_AUDIO_TYPES
         ):
             self.audio_format, audio = read_audio(self.audio_type, self.audio)
+            if self._duration is None:
+                # Duration of the original audio data - for free, as it is decoded anyway
+                self._duration = get_pcm_duration(len(audio), self.audio_format)
             self.audio.close()
             self.audio = audio
         elif new_audio_type == AUDIO_TYPE_PCM and self.audio_type == AUDIO_TYPE_NP:
@@ -152,6 +197,15 @@ class Sample:
         self.audio_type = new_audio_type
 
 
+def sample_content(sample):
+    """Raw audio data of a util.audio.Sample in its current representation (typically still encoded, as it was loaded)"""
+    if isinstance(sample.audio, io.BytesIO):
+        return sample.audio.getbuffer()
+    if isinstance(sample.audio, np.ndarray):
+        return sample.audio.tobytes()
+    return bytes(sample.audio)
+
+
 def _unpack_and_change_audio_type(sample_and_audio_type):
     packed_sample, audio_type, bitrate = sample_and_audio_type
     if hasattr(packed_sample, "unpack"):
@@ -205,6 +259,81 @@ def get_np_duration(np_len, audio_format=DEFAULT_FORMAT):
     return np_len / audio_format.rate
 
 
+@lru_cache(maxsize=32)
+def get_polyphase_filter_bank(up, down):
+    """
+    Windowed sinc low-pass filter for resampling by a rational factor of up/down,
+    split into its up phases.
+
+    Returns
+    -------
+    tuple of numpy.ndarray and int
+        Filter bank of shape [up, taps] and the offset of the filter's center (in upsampled samples)
+    """
+    period = max(up, down)
+    half_len = RESAMPLE_NUM_ZEROS * period
+    n = np.arange(-half_len, half_len + 1, dtype=np.float64)
+    taps = -(-len(n) // up)
+    bank = np.zeros(taps * up, dtype=np.float64)
+    bank[: len(n)] = (
+        RESAMPLE_ROLLOFF
+        * up
+        / period
+        * np.sinc(RESAMPLE_ROLLOFF * n / period)
+        * np.kaiser(len(n), RESAMPLE_KAISER_BETA)
+    )
+    return np.ascontiguousarray(bank.reshape(taps, up).T), half_len
+
+
+@jit(nopython=True, nogil=True)
+def _resample_polyphase(audio, bank, up, down, offset, resampled):
+    taps = bank.shape[1]
+    for m in range(len(resampled)):
+        position = m * down + offset
+        phase = position % up
+        base = position // up
+        value = 0.0
+        for k in range(max(0, base - len(audio) + 1), min(taps, base + 1)):
+            value += bank[phase, k] * audio[base - k]
+        resampled[m] = value
+
+
+def resample(audio, src_rate, dst_rate):
+    """
+    Resamples NumPy audio data of shape [samples] or [samples, channels] from src_rate to dst_rate.
+    Integer rate ratios are resampled by a polyphase filter with a cached filter bank per ratio
+    (equivalent to resampy's "kaiser_fast" filter).
+
+    Returns
+    -------
+    numpy.ndarray
+        Resampled audio of same data type and number of dimensions as audio
+    """
+    if src_rate == dst_rate:
+        return audio
+    divisor = math.gcd(src_rate, dst_rate)
+    up, down = dst_rate // divisor, src_rate // divisor
+    if max(up, down) > RESAMPLE_MAX_POLYPHASE_PERIOD:
+        return resampy.resample(audio, src_rate, dst_rate, axis=0, filter="kaiser_fast")
+    bank, offset = get_polyphase_filter_bank(up, down)
+    channels = audio.reshape(len(audio), -1)
+    resampled = np.empty(
+        (int(math.ceil(len(audio) * up / down)), channels.shape[1]), dtype=audio.dtype
+    )
+    for channel in range(channels.shape[1]):
+        resampled_channel = np.empty(len(resampled), dtype=np.float64)
+        _resample_polyphase(
+            np.ascontiguousarray(channels[:, channel], dtype=np.float64),
+            bank,
+            up,
+            down,
+            offset,
+            resampled_channel,
+        )
+        resampled[:, channel] = resampled_channel
+    return resampled.reshape((len(resampled),) + audio.shape[1:])
+
+
 def convert_audio(
     src_audio_path, dst_audio_path, file_type=None, audio_format=DEFAULT_FORMAT
 ):
@@ -239,12 +368,35 @@ class AudioFile:
         if self.audio_path.endswith(".wav"):
             self.open_file = open_remote(self.audio_path, "rb")
             self.open_wav = wave.open(self.open_file)
-            if read_audio_format_from_wav_file(self.open_wav) == self.audio_format:
+            wav_format = read_audio_format_from_wav_file(self.open_wav)
+            if wav_format == self.audio_format:
                 if self.as_path:
                     self.open_wav.close()
                     self.open_file.close()
                     return self.audio_path
                 return self.open_wav
+            if self.audio_format.channels == 1 and wav_format.width in [2, 4]:
+                # Mono down-mixing and resampling without a round-trip through SoX
+                pcm_data = self.open_wav.readframes(self.open_wav.getnframes())
+                self.open_wav.close()
+                self.open_file.close()
+                self.open_file = None
+                audio = resample(
+                    pcm_to_np(pcm_data, wav_format),
+                    wav_format.rate,
+                    self.audio_format.rate,
+                )
+                _, self.tmp_file_path = tempfile.mkstemp(suffix=".wav")
+                with open(self.tmp_file_path, "wb") as tmp_file:
+                    write_wav(
+                        tmp_file,
+                        np_to_pcm(np.clip(audio, -1.0, 1.0), self.audio_format),
+                        self.audio_format,
+                    )
+                if self.as_path:
+                    return self.tmp_file_path
+                self.open_wav = wave.open(self.tmp_file_path, "rb")
+                return self.open_wav
             self.open_wav.close()
             self.open_file.close()
 
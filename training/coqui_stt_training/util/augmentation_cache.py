@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+import ctypes
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import uuid
+import weakref
+from multiprocessing import Array, RawValue, Value
+
+import numpy as np
+
+from .audio import (
+    AUDIO_TYPE_NP,
+    AUDIO_TYPE_PCM,
+    SERIALIZABLE_AUDIO_TYPES,
+    sample_content,
+)
+
+ENTRY_SUFFIX = ".npz"
+# Eviction frees some headroom below the budget, so that not every put has to scan a full tier
+EVICTION_TARGET = 0.9
+# Tmpfs mount for the RAM tier - falls back to the default temporary directory
+SHM_DIR = "/dev/shm"
+
+
+def quantize_value(value, value_range, buckets):
+    """
+    Snaps value to one of buckets + 1 evenly spaced values that span value_range (including its radius r),
+    so that repeated draws from the range lead to repeated results.
+    """
+    low = min(value_range.start, value_range.end) - value_range.r
+    high = max(value_range.start, value_range.end) + value_range.r
+    if buckets <= 0 or high <= low:
+        return value
+    step = (high - low) / buckets
+    value = low + round((min(max(value, low), high) - low) / step) * step
+    return round(value) if isinstance(value_range.start, int) else value
+
+
+class _CacheTier:
+    """
+    Directory of cache entries with a size budget. Entries are written atomically and evicted
+    least recently used first - reads refresh an entry's modification time.
+    The size counter lives in shared memory, so a tier can be shared by forked worker processes.
+    """
+
+    def __init__(self, path, budget):
+        self.path = path
+        self.budget = budget
+        os.makedirs(path, exist_ok=True)
+        self.size = Value(ctypes.c_int64, sum(size for _, _, size in self._entries()))
+        # Guarded by the size lock - only one process evicts at a time
+        self.evicting = RawValue(ctypes.c_bool, False)
+
+    def _entries(self):
+        for sub_dir in os.scandir(self.path):
+            if sub_dir.is_dir():
+                for entry in os.scandir(sub_dir.path):
+                    if entry.name.endswith(ENTRY_SUFFIX):
+                        try:
+                            stat = entry.stat()
+                        except FileNotFoundError:
+                            continue  # evicted meanwhile
+                        yield entry.path, stat.st_mtime, stat.st_size
+
+    def entry_path(self, key):
+        return os.path.join(self.path, key[:2], key + ENTRY_SUFFIX)
+
+    def get(self, key):
+        entry_path = self.entry_path(key)
+        try:
+            with np.load(entry_path) as entry:
+                audio_type, audio = str(entry["audio_type"]), entry["audio"]
+            os.utime(entry_path)
+        except FileNotFoundError:
+            return None
+        return audio_type, audio
+
+    def put(self, key, audio_type, audio):
+        entry_path = self.entry_path(key)
+        tmp_path = "{}.{}.tmp".format(entry_path, uuid.uuid4().hex)
+        try:
+            os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+            with open(tmp_path, "wb") as tmp_file:
+                np.savez(tmp_file, audio_type=np.array(audio_type), audio=audio)
+                entry_size = tmp_file.tell()
+        except OSError:
+            # E.g. a full tmpfs - the entry just does not get cached in this tier
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            return
+        with self.size.get_lock():
+            if entry_size > self.budget or os.path.exists(entry_path):
+                os.remove(tmp_path)
+                return
+            os.replace(tmp_path, entry_path)
+            self.size.value += entry_size
+            if self.size.value <= self.budget or self.evicting.value:
+                return
+            self.evicting.value = True
+        try:
+            self._evict()
+        finally:
+            with self.size.get_lock():
+                self.evicting.value = False
+
+    def _evict(self):
+        # The directory gets scanned without holding the size lock - so other workers can keep using the tier
+        target = EVICTION_TARGET * self.budget
+        for entry_path, _, entry_size in sorted(self._entries(), key=lambda e: e[1]):
+            with self.size.get_lock():
+                if self.size.value <= target:
+                    break
+                try:
+                    os.remove(entry_path)
+                except FileNotFoundError:
+                    continue
+                self.size.value -= entry_size
+
+
+class AugmentationCache:
+    """
+    Cache of the results of expensive, deterministic sample augmentations (see SampleAugmentation.cacheable),
+    so that they are only computed once for every combination of input audio, augmentation and parameters.
+    Entries are addressed by a hash of the augmentation's class, its (optionally quantized) parameters
+    and the input audio content - so they stay valid behind other (random) augmentations and across runs.
+    Entries are kept in two tiers: a RAM tier on tmpfs and an optional disk tier, each with its own budget
+    and least recently used eviction. Both tiers are directories, so all augmentation workers share them.
+    """
+
+    def __init__(self, ram_budget=0, disk_budget=0, disk_path=None, buckets=0):
+        """
+        Parameters
+        ----------
+        ram_budget : int
+            Size budget of the RAM tier in bytes - 0 for no RAM tier.
+            Gets capped at the free space of the tmpfs.
+        disk_budget : int
+            Size budget of the disk tier in bytes - 0 for no disk tier
+        disk_path : str or None
+            Directory of the disk tier - entries in it are kept and reused by later runs.
+            If None, a temporary directory is used, which gets removed together with the cache.
+        buckets : int
+            If > 0, augmentation parameters get quantized to this many steps across their value ranges
+            (see quantize_value), which trades parameter variety for cache hits
+        """
+        self.buckets = buckets
+        self.tiers = []
+        self.counters = Array(ctypes.c_int64, 2)  # misses, hits
+        if ram_budget > 0:
+            ram_path = tempfile.mkdtemp(
+                prefix="augmentation_cache_",
+                dir=SHM_DIR if os.path.isdir(SHM_DIR) else None,
+            )
+            # Tmpfs mounts can be a lot smaller than the RAM (e.g. 64 MB in Docker containers)
+            ram_budget = min(ram_budget, shutil.disk_usage(ram_path).free)
+            self.tiers.append(_CacheTier(ram_path, ram_budget))
+            weakref.finalize(self, shutil.rmtree, ram_path, ignore_errors=True)
+        if disk_budget > 0:
+            if disk_path is None:
+                disk_path = tempfile.mkdtemp(prefix="augmentation_cache_")
+                weakref.finalize(self, shutil.rmtree, disk_path, ignore_errors=True)
+            self.tiers.append(_CacheTier(disk_path, disk_budget))
+
+    def key(self, augmentation, sample, parameters):
+        """Cache key of applying augmentation with parameters to a util.audio.Sample in its current state"""
+        content_hash = hashlib.blake2b(digest_size=20)
+        content_hash.update(repr((type(augmentation).__name__, parameters)).encode())
+        content_hash.update(sample.audio_type.encode())
+        if not isinstance(sample.audio, io.BytesIO):
+            # Raw audio carries no header
+            content_hash.update(str(tuple(sample.audio_format)).encode())
+        content_hash.update(sample_content(sample))
+        return content_hash.hexdigest()
+
+    def get(self, key):
+        """(audio type, audio) of the entry stored under key - or None, if there is none"""
+        for tier_index, tier in enumerate(self.tiers):
+            entry = tier.get(key)
+            if entry is not None:
+                for upper_tier in self.tiers[:tier_index]:
+                    upper_tier.put(key, *entry)
+                return entry
+        return None
+
+    def put(self, key, audio_type, audio):
+        for tier in self.tiers:
+            tier.put(key, audio_type, audio)
+
+    def apply(self, augmentation, sample, clock=0.0):
+        """
+        Applies a cacheable augmentation to a util.audio.Sample - or replaces its audio by a cached result.
+
+        Returns
+        -------
+        bool : If the result came from the cache
+        """
+        parameters = tuple(
+            quantize_value(value, value_range, self.buckets)
+            for value, value_range in zip(
+                augmentation.pick_parameters(clock=clock),
+                augmentation.parameter_ranges(),
+            )
+        )
+        key = self.key(augmentation, sample, parameters)
+        entry = self.get(key)
+        with self.counters.get_lock():
+            self.counters[0 if entry is None else 1] += 1
+        if entry is not None:
+            audio_type, audio = entry
+            if audio_type in SERIALIZABLE_AUDIO_TYPES:
+                audio = io.BytesIO(audio.tobytes())
+            elif audio_type == AUDIO_TYPE_PCM:
+                audio = bytearray(audio.tobytes())
+            # Cached results have the audio format of their input - which might not be read from its header yet
+            sample.load_audio_format()
+            sample.audio_type, sample.audio = audio_type, audio
+            return True
+        augmentation.apply_parameters(sample, parameters)
+        if sample.audio_type == AUDIO_TYPE_NP:
+            audio = sample.audio
+        elif sample.audio_type in SERIALIZABLE_AUDIO_TYPES:
+            audio = np.frombuffer(sample.audio.getvalue(), dtype=np.uint8)
+        else:
+            audio = np.frombuffer(bytes(sample.audio), dtype=np.uint8)
+        self.put(key, sample.audio_type, audio)
+        return False
+
+    def stats(self, reset=True):
+        """Numbers of cache misses and hits since the last reset"""
+        with self.counters.get_lock():
+            misses, hits = self.counters[:]
+            if reset:
+                self.counters[:] = [0, 0]
+        return dict(hits=hits, misses=misses)
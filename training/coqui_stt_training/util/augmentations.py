@@ -1,27 +1,36 @@
+import ctypes
 import math
 import os
 import random
 import re
-from multiprocessing import Process, Queue
+import time
+from functools import partial
+from multiprocessing import Array, Process, Queue
 
 import numpy as np
-import resampy
+from numba import jit
 
 from .audio import (
     AUDIO_TYPE_NP,
     AUDIO_TYPE_OPUS,
     AUDIO_TYPE_PCM,
+    change_audio_types,
     gain_db_to_ratio,
     max_dbfs,
     normalize_audio,
+    resample,
 )
 from .helpers import (
     MEGABYTE,
     LimitingPool,
+    SharedArray,
+    SharedMemoryRing,
     float_range,
     int_range,
     pick_value_from_range,
+    shared_memory_supported,
     tf_pick_value_from_range,
+    tf_pick_values_from_range,
 )
 from .sample_collections import samples_from_source, unpack_maybe
 
@@ -35,17 +44,36 @@ class Augmentation:
 
 
 class SampleAugmentation(Augmentation):
+    # If the augmentation is deterministic given its parameters and implements
+    # parameter_ranges, pick_parameters and apply_parameters (see util.augmentation_cache)
+    cacheable = False
+
     def start(self, buffering=BUFFER_SIZE):
         pass
 
     def apply(self, sample, clock=0.0):
         raise NotImplementedError
 
+    def parameter_ranges(self):
+        """ValueRanges of the parameters that pick_parameters returns"""
+        raise NotImplementedError
+
+    def pick_parameters(self, clock=0.0):
+        """Tuple of parameter values for augmenting a sample at clock"""
+        raise NotImplementedError
+
+    def apply_parameters(self, sample, parameters):
+        """Applies the augmentation with parameters from pick_parameters - without changing the audio format"""
+        raise NotImplementedError
+
     def stop(self):
         pass
 
 
 class GraphAugmentation(Augmentation):
+    # If the augmentation implements apply_to_batch
+    batchable = False
+
     def __init__(self, p=1.0, domain="spectrogram"):
         super(GraphAugmentation, self).__init__(p)
         if domain not in ["signal", "spectrogram", "features"]:
@@ -55,14 +83,59 @@ class GraphAugmentation(Augmentation):
     def apply(self, tensor, transcript=None, clock=0.0):
         raise NotImplementedError
 
-    def apply_with_probability(self, tensor, transcript=None, clock=0.0):
+    def apply_to_batch(self, tensor, lengths, clocks, seed):
+        """
+        Batch-level counterpart of apply, augmenting every row of a padded batch independently.
+
+        Parameters
+        ----------
+        tensor : Tensor of type float32
+            Padded batch of spectrograms or features of shape [batch_size, time, channels]
+        lengths : Tensor of type int32
+            Number of valid (non-padding) time steps of every row
+        clocks : Tensor of type float64
+            Clock value (see apply) of every row
+        seed : Tensor of type int64
+            Stateless random seed of shape [2] - only its second element should get varied
+
+        Returns
+        -------
+        Tensor of type float32
+            The augmented batch - values of its padding are irrelevant
+        """
+        raise NotImplementedError
+
+    def draw_for_batch(self, clocks, seed):
+        """Boolean tensor of shape [batch_size] that tells which rows of a batch get augmented"""
+        import tensorflow as tf  # pylint: disable=import-outside-toplevel
+
+        rv = tf.random.stateless_uniform(tf.shape(clocks), seed=seed)
+        return tf.less(rv, self.probability)
+
+    def apply_to_batch_with_probability(
+        self, tensor, lengths, clocks, seed, applied=None
+    ):
+        import tensorflow as tf  # pylint: disable=import-outside-toplevel
+
+        applied = self.draw_for_batch(clocks, seed) if applied is None else applied
+        augmented = self.apply_to_batch(tensor, lengths, clocks, seed + [0, 1])
+        selected = tf.broadcast_to(applied[:, None, None], tf.shape(tensor))
+        return tf.where(selected, augmented, tensor)
+
+    def draw(self, clock=0.0):
+        """Boolean tensor that tells if a sample gets augmented"""
         import tensorflow as tf  # pylint: disable=import-outside-toplevel
 
         rv = tf.random.stateless_uniform(
             [], seed=(clock * tf.int32.min, clock * tf.int32.max)
         )
+        return tf.less(rv, self.probability)
+
+    def apply_with_probability(self, tensor, transcript=None, clock=0.0, applied=None):
+        import tensorflow as tf  # pylint: disable=import-outside-toplevel
+
         return tf.cond(
-            tf.less(rv, self.probability),
+            self.draw(clock=clock) if applied is None else applied,
             lambda: self.apply(tensor, transcript=transcript, clock=clock),
             lambda: tensor,
         )
@@ -141,8 +214,109 @@ def parse_augmentations(augmentation_specs):
     return list(map(parse_augmentation, augmentation_specs or []))
 
 
+def _tf_interval_mask(starts, sizes, extent):
+    """
+    Mask of shape [batch_size, extent] that is 0.0 within any of the intervals [start, start + size)
+    of shape [batch_size, n] and 1.0 elsewhere
+    """
+    import tensorflow as tf  # pylint: disable=import-outside-toplevel
+
+    positions = tf.range(extent)[None, None, :]
+    inside = tf.logical_and(
+        positions >= starts[:, :, None], positions < (starts + sizes)[:, :, None]
+    )
+    return 1.0 - tf.cast(tf.reduce_any(inside, axis=1), tf.float32)
+
+
+def _tf_random_intervals(n_range, size, clocks, limits, seed):
+    """
+    Random intervals of a number of n_range (picked per row) within [0, limits) of shape [batch_size, max(n)].
+    size is a function that maps per-interval clocks to interval sizes.
+    Intervals beyond a row's picked number get size 0.
+    """
+    import tensorflow as tf  # pylint: disable=import-outside-toplevel
+
+    n = tf_pick_values_from_range(n_range, clocks, seed)
+    max_n = tf.maximum(0, tf.reduce_max(n))
+    sizes = size(tf.tile(clocks[:, None], [1, max_n]), seed + [0, 1])
+    sizes = tf.math.maximum(1, tf.math.minimum(limits[:, None] - 1, sizes))
+    starts = tf.cast(
+        tf.math.floor(
+            tf.random.stateless_uniform(tf.shape(sizes), seed=seed + [0, 2])
+            * tf.cast(limits[:, None] - sizes, tf.float32)
+        ),
+        tf.int32,
+    )
+    sizes = tf.where(tf.range(max_n)[None, :] < n[:, None], sizes, tf.zeros_like(sizes))
+    return starts, sizes
+
+
+def is_batch_augmentation(augmentation):
+    """If an augmentation gets applied to padded batches in batch augmentation mode (see --batch_augmentations)"""
+    return (
+        isinstance(augmentation, GraphAugmentation)
+        and augmentation.batchable
+        and augmentation.domain != "signal"
+    )
+
+
+def apply_graph_batch_augmentations(
+    domain, tensor, lengths, clocks, augmentations, augmentation_stats=None
+):
+    """
+    Augments a padded batch of a certain domain with the matching batch augmentations (see is_batch_augmentation)
+    of passed list - every row independently.
+
+    Parameters
+    ----------
+    domain : str
+        Domain of the batch to apply augmentations to. One of "spectrogram" or "features"
+    tensor : Tensor of type float32
+        Padded batch of shape [batch_size, time, channels]
+    lengths : Tensor of type int32
+        Number of valid time steps of every row
+    clocks : Tensor of type float64
+        Time indicator for augmentation value-ranges of every row (see apply_graph_augmentations)
+    augmentations : list of augmentation class instances from util.augmentations.*.
+    augmentation_stats : AugmentationStats or None
+        If provided, records invocations (rows), applications and wall time of every applied augmentation
+
+    Returns
+    -------
+    Tensor of type float32
+        The augmented batch - values of its padding are undefined
+    """
+    import tensorflow as tf  # pylint: disable=import-outside-toplevel
+
+    # Unique per batch, as every sample has its own clock value
+    batch_seed = tf.cast(tf.reduce_sum(clocks) * tf.int32.max, tf.int64)
+    for index, augmentation in enumerate(augmentations or []):
+        if is_batch_augmentation(augmentation) and augmentation.domain == domain:
+            seed = tf.stack([batch_seed, tf.constant(index * 16, dtype=tf.int64)])
+            if augmentation_stats is None:
+                tensor = augmentation.apply_to_batch_with_probability(
+                    tensor, lengths, clocks, seed
+                )
+            else:
+                applied = augmentation.draw_for_batch(clocks, seed)
+                tensor = augmentation_stats.tf_record(
+                    augmentation,
+                    partial(
+                        augmentation.apply_to_batch_with_probability,
+                        tensor,
+                        lengths,
+                        clocks,
+                        seed,
+                        applied=applied,
+                    ),
+                    tf.size(applied),
+                    tf.reduce_sum(tf.cast(applied, tf.int32)),
+                )
+    return tensor
+
+
 def apply_graph_augmentations(
-    domain, tensor, augmentations, transcript=None, clock=0.0
+    domain, tensor, augmentations, transcript=None, clock=0.0, augmentation_stats=None
 ):
     """
     Augments training sample tensor of a certain domain with matching augmentations of passed list.
@@ -158,6 +332,8 @@ def apply_graph_augmentations(
     transcript : SparseTensor
     clock : Tensor of type float32
         Time indicator for augmentation value-ranges. Running from 0.0 (start of training) to 1.0 (end of training).
+    augmentation_stats : AugmentationStats or None
+        If provided, records invocations, applications and wall time of every applied augmentation
 
     Returns
     -------
@@ -166,17 +342,141 @@ def apply_graph_augmentations(
     """
     if augmentations:
         for augmentation in augmentations:
-            if isinstance(augmentation, GraphAugmentation):
+            if not isinstance(augmentation, GraphAugmentation):
+                continue
+            if augmentation_stats is None or augmentation.domain != domain:
                 tensor = augmentation.maybe_apply(
                     domain, tensor, transcript=transcript, clock=clock
                 )
+            else:
+                applied = augmentation.draw(clock=clock)
+                tensor = augmentation_stats.tf_record(
+                    augmentation,
+                    partial(
+                        augmentation.apply_with_probability,
+                        tensor,
+                        transcript=transcript,
+                        clock=clock,
+                        applied=applied,
+                    ),
+                    1,
+                    applied,
+                )
     return tensor
 
 
+class AugmentationStats:
+    """
+    Opt-in counters of the augmentations of a list (see --augmentation_stats): how often every augmentation got
+    invoked and actually applied (its realized probability) and the wall time its applications took.
+    The counters live in shared memory, so they add up across all augmentation worker processes
+    (which get them through AugmentationContext) and the threads of the TensorFlow input pipeline.
+    """
+
+    def __init__(self, augmentations):
+        self.augmentations = list(augmentations)
+        self.indices = {
+            id(augmentation): index for index, augmentation in enumerate(augmentations)
+        }
+        # Invocations, applications and seconds per augmentation
+        self.counters = Array(ctypes.c_double, 3 * len(self.augmentations))
+
+    def index(self, augmentation):
+        """Index of an augmentation (instance) of the list - only valid in the process that created the stats"""
+        return self.indices[id(augmentation)]
+
+    def record(self, counts):
+        """Adds (index, invocations, applications, seconds) tuples to the counters"""
+        with self.counters.get_lock():
+            for index, invocations, applications, seconds in counts:
+                self.counters[3 * index] += invocations
+                self.counters[3 * index + 1] += applications
+                self.counters[3 * index + 2] += seconds
+
+    def _record_tensors(self, index, invocations, applications, seconds):
+        self.record([(index, float(invocations), float(applications), float(seconds))])
+        return seconds
+
+    def tf_record(self, augmentation, build, invocations, applications):
+        """
+        Builds the graph of an augmentation through calling build() and records its invocations and applications
+        (scalar tensors or numbers) and the wall time of running it as a side effect of its result.
+        """
+        import tensorflow as tf  # pylint: disable=import-outside-toplevel
+
+        start = tf.timestamp()
+        with tf.control_dependencies([start]):
+            result = build()
+        with tf.control_dependencies([result]):
+            seconds = tf.timestamp() - start
+        recorded = tf.numpy_function(
+            partial(self._record_tensors, self.index(augmentation)),
+            [
+                tf.cast(invocations, tf.float64),
+                tf.cast(applications, tf.float64),
+                seconds,
+            ],
+            tf.float64,
+            stateful=True,
+        )
+        with tf.control_dependencies([recorded]):
+            return tf.identity(result)
+
+    def report(self, reset=True):
+        """
+        Returns
+        -------
+        list with a dict of the counters and derived values of every augmentation
+        """
+        with self.counters.get_lock():
+            counters = list(self.counters)
+            if reset:
+                self.counters[:] = [0.0] * len(counters)
+        entries = []
+        for index, augmentation in enumerate(self.augmentations):
+            invocations, applications, seconds = counters[3 * index : 3 * index + 3]
+            entries.append(
+                dict(
+                    name="{}_{}".format(index, type(augmentation).__name__.lower()),
+                    augmentation=repr(augmentation),
+                    invocations=int(invocations),
+                    applications=int(applications),
+                    realized_probability=applications / invocations
+                    if invocations
+                    else 0.0,
+                    seconds=seconds,
+                    ms_per_application=1000.0 * seconds / applications
+                    if applications
+                    else 0.0,
+                )
+            )
+        return entries
+
+
 class AugmentationContext:
-    def __init__(self, target_audio_type, augmentations):
+    def __init__(
+        self,
+        target_audio_type,
+        augmentations,
+        feature_store=None,
+        ring=None,
+        augmentation_stats=None,
+        augmentation_cache=None,
+    ):
         self.target_audio_type = target_audio_type
         self.augmentations = augmentations
+        self.feature_store = feature_store
+        self.ring = ring
+        self.augmentation_stats = augmentation_stats
+        self.augmentation_cache = augmentation_cache
+        # Base seed of the workers' random generators - forked workers would otherwise all inherit the same state
+        self.seed = random.getrandbits(32)
+        # Indices have to be resolved in the creating process
+        self.stats_indices = (
+            None
+            if augmentation_stats is None
+            else [augmentation_stats.index(aug) for aug in augmentations]
+        )
 
 
 AUGMENTATION_CONTEXT = None
@@ -185,20 +485,61 @@ AUGMENTATION_CONTEXT = None
 def _init_augmentation_worker(preparation_context):
     global AUGMENTATION_CONTEXT  # pylint: disable=global-statement
     AUGMENTATION_CONTEXT = preparation_context
+    random.seed(preparation_context.seed ^ (os.getpid() << 32))
 
 
 def _load_and_augment_sample(timed_sample, context=None):
+    context = AUGMENTATION_CONTEXT if context is None else context
     sample, clock = timed_sample
     realized_sample = unpack_maybe(sample)
-    return _augment_sample((realized_sample, clock), context)
+    if context.feature_store is None:
+        return _augment_sample((realized_sample, clock), context)
+    feature_key = context.feature_store.key(realized_sample)
+    if feature_key in context.feature_store:
+        # Features get loaded from the store - so the audio is neither decoded nor passed on
+        realized_sample.load_audio_format()  # header only
+        realized_sample.audio = np.zeros((0, 1), dtype=np.float32)
+        realized_sample.audio_type = AUDIO_TYPE_NP
+        return realized_sample, feature_key, True
+    return _augment_sample((realized_sample, clock), context), feature_key, False
+
+
+def _load_and_augment_shared_sample(indexed_timed_sample):
+    index, timed_sample = indexed_timed_sample
+    result = _load_and_augment_sample(timed_sample)
+    sample = result if AUGMENTATION_CONTEXT.feature_store is None else result[0]
+    descriptor = None
+    if sample.audio_type == AUDIO_TYPE_NP:
+        descriptor = AUGMENTATION_CONTEXT.ring.put(index, sample.audio)
+        if descriptor is not None:
+            sample.audio = None  # travels through the ring instead
+    return result, descriptor
+
+
+def _apply_sample_augmentation(augmentation, sample, clock, context):
+    if context.augmentation_cache is not None and augmentation.cacheable:
+        context.augmentation_cache.apply(augmentation, sample, clock=clock)
+    else:
+        augmentation.apply(sample, clock)
 
 
 def _augment_sample(timed_sample, context=None):
     context = AUGMENTATION_CONTEXT if context is None else context
     sample, clock = timed_sample
-    for augmentation in context.augmentations:
-        if random.random() < augmentation.probability:
-            augmentation.apply(sample, clock)
+    if context.augmentation_stats is None:
+        for augmentation in context.augmentations:
+            if random.random() < augmentation.probability:
+                _apply_sample_augmentation(augmentation, sample, clock, context)
+    else:
+        counts = []
+        for index, augmentation in zip(context.stats_indices, context.augmentations):
+            if random.random() < augmentation.probability:
+                start = time.perf_counter()
+                _apply_sample_augmentation(augmentation, sample, clock, context)
+                counts.append((index, 1, 1, time.perf_counter() - start))
+            else:
+                counts.append((index, 1, 0, 0.0))
+        context.augmentation_stats.record(counts)
     sample.change_audio_type(new_audio_type=context.target_audio_type)
     return sample
 
@@ -211,6 +552,13 @@ def apply_sample_augmentations(
     process_ahead=None,
     clock=0.0,
     final_clock=None,
+    feature_store=None,
+    processes=None,
+    chunksize=1,
+    stats=None,
+    shm_slot_size=0,
+    augmentation_stats=None,
+    augmentation_cache=None,
 ):
     """
     Prepares samples for being used during training.
@@ -233,10 +581,29 @@ def apply_sample_augmentations(
     final_clock : float
         Final clock value between 0.0 and 1.0 for the last sample. Has to be >= than clock.
         Requires samples.__len__ attribute.
+    feature_store : util.feature_store.FeatureStore or None
+        Store of already computed features. If provided, samples whose features are in the store
+        are neither decoded nor augmented, but passed on with empty audio.
+    processes : int or None
+        Number of worker processes - defaults to the number of CPUs.
+    chunksize : int
+        Number of samples handed to a worker at once.
+    stats : dict or None
+        If provided, gets updated with the feeding counters of the worker pool (see util.helpers.LimitingPool.stats)
+        once iteration ends.
+    shm_slot_size : int
+        If > 0 and audio_type is util.audio.AUDIO_TYPE_NP, workers pass the audio of samples back through
+        a ring of shared memory blocks of this size (see util.helpers.SharedMemoryRing) instead of pickling it.
+        Audio that exceeds the block size is still pickled - as is all audio before Python 3.8.
+    augmentation_stats : AugmentationStats or None
+        If provided, records invocations, applications and wall time of every sample augmentation.
+    augmentation_cache : util.augmentation_cache.AugmentationCache or None
+        If provided, results of cacheable sample augmentations are taken from and added to this cache.
 
     Returns
     -------
     iterable of util.sample_collections.LabeledSample or util.audio.Sample
+    or, if feature_store is provided, (sample, feature key, features are stored) tuples
     """
 
     def timed_samples():
@@ -263,23 +630,59 @@ def apply_sample_augmentations(
         if augmentations
         else []
     )
+    ring = None
     try:
         for augmentation in augmentations:
             augmentation.start(buffering=buffering)
-        context = AugmentationContext(audio_type, augmentations)
+        if (
+            process_ahead != 0
+            and shm_slot_size > 0
+            and audio_type == AUDIO_TYPE_NP
+            and shared_memory_supported()
+        ):
+            process_ahead = max(
+                os.cpu_count() if process_ahead is None else process_ahead, chunksize
+            )
+            # A slot is free again once its sample got consumed - the pool only starts process_ahead samples ahead
+            ring = SharedMemoryRing(process_ahead + 1, shm_slot_size)
+        context = AugmentationContext(
+            audio_type,
+            augmentations,
+            feature_store=feature_store,
+            ring=ring,
+            augmentation_stats=augmentation_stats,
+            augmentation_cache=augmentation_cache,
+        )
         if process_ahead == 0:
             for timed_sample in timed_samples():
                 yield _load_and_augment_sample(timed_sample, context=context)
         else:
             with LimitingPool(
+                processes=processes,
                 process_ahead=process_ahead,
+                chunksize=chunksize,
                 initializer=_init_augmentation_worker,
                 initargs=(context,),
             ) as pool:
-                yield from pool.imap(_load_and_augment_sample, timed_samples())
+                try:
+                    if ring is None:
+                        yield from pool.imap(_load_and_augment_sample, timed_samples())
+                    else:
+                        for result, descriptor in pool.imap(
+                            _load_and_augment_shared_sample, enumerate(timed_samples())
+                        ):
+                            if descriptor is not None:
+                                sample = result if feature_store is None else result[0]
+                                sample.audio = ring.get(descriptor)
+                            yield result
+                finally:
+                    if stats is not None:
+                        stats.update(pool.stats())
     finally:
         for augmentation in augmentations:
             augmentation.stop()
+        if ring is not None:
+            ring.close()
 
 
 def _enqueue_overlay_samples(sample_source, queue, buffering=BUFFER_SIZE):
@@ -295,22 +698,53 @@ def _enqueue_overlay_samples(sample_source, queue, buffering=BUFFER_SIZE):
             queue.put(sample)
 
 
+def _load_noise_bank(sample_source, buffering=BUFFER_SIZE):
+    """
+    Decodes all samples of a sample source (in parallel) into one shared float32 array.
+
+    Returns
+    -------
+    tuple of util.helpers.SharedArray with the concatenated audio data and numpy.ndarray with the start offsets
+    of the samples within it
+    """
+    samples = samples_from_source(sample_source, buffering=buffering, labeled=False)
+    chunks = [
+        sample.audio
+        for sample in change_audio_types(samples, audio_type=AUDIO_TYPE_NP)
+        if len(sample.audio) > 0
+    ]
+    if not chunks:
+        raise ValueError("Overlay source {} has no audio".format(sample_source))
+    offsets = np.cumsum([0] + [len(chunk) for chunk in chunks[:-1]])
+    return SharedArray(chunks), offsets
+
+
 class Overlay(SampleAugmentation):
     """See "Overlay augmentation" in training documentation"""
 
-    def __init__(self, source, p=1.0, snr=3.0, layers=1):
+    def __init__(self, source, p=1.0, snr=3.0, layers=1, bank=0):
         super(Overlay, self).__init__(p)
         self.source = source
         self.snr = float_range(snr)
         self.layers = int_range(layers)
+        self.bank = int(bank) != 0
         self.current_sample = None
         self.queue = None
         self.enqueue_process = None
+        self.noise = None
+        self.noise_offsets = None
 
     def __repr__(self):
-        return f"Overlay(source={self.source!r}, p={self.probability!r}, snr={self.snr!r}, layers={self.layers!r})"
+        return f"Overlay(source={self.source!r}, p={self.probability!r}, snr={self.snr!r}, layers={self.layers!r}, bank={self.bank!r})"
 
     def start(self, buffering=BUFFER_SIZE):
+        if self.bank:
+            # Loaded once and kept for all following epochs
+            if self.noise is None:
+                self.noise, self.noise_offsets = _load_noise_bank(
+                    self.source, buffering=buffering
+                )
+            return
         self.queue = Queue(
             max(1, math.floor(self.probability * self.layers[1] * os.cpu_count()))
         )
@@ -327,15 +761,26 @@ class Overlay(SampleAugmentation):
         n_layers = pick_value_from_range(self.layers, clock=clock)
         audio = sample.audio
         overlay_data = np.zeros_like(audio)
+        if self.bank:
+            self._overlay_from_bank(overlay_data, n_layers)
+        else:
+            self._overlay_from_queue(overlay_data, n_layers)
+        snr_db = pick_value_from_range(self.snr, clock=clock)
+        orig_dbfs = max_dbfs(audio)
+        overlay_gain = orig_dbfs - max_dbfs(overlay_data) - snr_db
+        audio += overlay_data * gain_db_to_ratio(overlay_gain)
+        sample.audio = normalize_audio(audio, dbfs=orig_dbfs)
+
+    def _overlay_from_queue(self, overlay_data, n_layers):
         for _ in range(n_layers):
             overlay_offset = 0
-            while overlay_offset < len(audio):
+            while overlay_offset < len(overlay_data):
                 if self.current_sample is None:
                     next_overlay_sample = self.queue.get()
                     next_overlay_sample = unpack_maybe(next_overlay_sample)
                     next_overlay_sample.change_audio_type(new_audio_type=AUDIO_TYPE_NP)
                     self.current_sample = next_overlay_sample.audio
-                n_required = len(audio) - overlay_offset
+                n_required = len(overlay_data) - overlay_offset
                 n_current = len(self.current_sample)
                 if n_required >= n_current:  # take it completely
                     overlay_data[
@@ -349,11 +794,28 @@ class Overlay(SampleAugmentation):
                     ] += self.current_sample[0:n_required]
                     overlay_offset += n_required
                     self.current_sample = self.current_sample[n_required:]
-        snr_db = pick_value_from_range(self.snr, clock=clock)
-        orig_dbfs = max_dbfs(audio)
-        overlay_gain = orig_dbfs - max_dbfs(overlay_data) - snr_db
-        audio += overlay_data * gain_db_to_ratio(overlay_gain)
-        sample.audio = normalize_audio(audio, dbfs=orig_dbfs)
+
+    def _overlay_from_bank(self, overlay_data, n_layers):
+        noise = self.noise.array
+        for _ in range(n_layers):
+            # Random position within a random noise sample - continuing with the following ones
+            sample_index = random.randrange(len(self.noise_offsets))
+            sample_end = (
+                self.noise_offsets[sample_index + 1]
+                if sample_index + 1 < len(self.noise_offsets)
+                else len(noise)
+            )
+            position = random.randrange(
+                int(self.noise_offsets[sample_index]), int(sample_end)
+            )
+            overlay_offset = 0
+            while overlay_offset < len(overlay_data):
+                n = min(len(overlay_data) - overlay_offset, len(noise) - position)
+                overlay_data[overlay_offset : overlay_offset + n] += noise[
+                    position : position + n
+                ]
+                overlay_offset += n
+                position = 0
 
     def stop(self):
         if self.enqueue_process is not None:
@@ -366,6 +828,8 @@ class Overlay(SampleAugmentation):
 class Codec(SampleAugmentation):
     """See "Codec augmentation" in training documentation"""
 
+    cacheable = True
+
     def __init__(self, p=1.0, bitrate=3200):
         super(Codec, self).__init__(p)
         self.bitrate = int_range(bitrate)
@@ -373,8 +837,17 @@ class Codec(SampleAugmentation):
     def __repr__(self):
         return f"Codec(p={self.probability!r}, bitrate={self.bitrate!r})"
 
+    def parameter_ranges(self):
+        return (self.bitrate,)
+
+    def pick_parameters(self, clock=0.0):
+        return (pick_value_from_range(self.bitrate, clock=clock),)
+
     def apply(self, sample, clock=0.0):
-        bitrate = pick_value_from_range(self.bitrate, clock=clock)
+        self.apply_parameters(sample, self.pick_parameters(clock=clock))
+
+    def apply_parameters(self, sample, parameters):
+        (bitrate,) = parameters
         sample.change_audio_type(
             new_audio_type=AUDIO_TYPE_PCM
         )  # decoding to ensure it has to get encoded again
@@ -383,9 +856,29 @@ class Codec(SampleAugmentation):
         )  # will get decoded again downstream
 
 
+@jit(nopython=True, nogil=True)
+def _comb_filters(audio, n_delays, decay):
+    """
+    Sum of audio and its feedback comb filtered layers y[n] = x[n] + decay * y[n - n_delay] for all n_delays.
+    Compiled as one pass per layer, as one vectorized slice operation per delay window
+    is prohibitively slow for long audio or short delays.
+    """
+    result = audio.copy()
+    layer = np.empty_like(audio)
+    for n_delay in n_delays:
+        for i in range(min(n_delay, len(audio))):
+            layer[i] = audio[i]
+        for i in range(n_delay, len(audio)):
+            layer[i] = audio[i] + decay * layer[i - n_delay]
+        result += layer
+    return result
+
+
 class Reverb(SampleAugmentation):
     """See "Reverb augmentation" in training documentation"""
 
+    cacheable = True
+
     def __init__(self, p=1.0, delay=20.0, decay=10.0):
         super(Reverb, self).__init__(p)
         self.delay = float_range(delay)
@@ -394,29 +887,43 @@ class Reverb(SampleAugmentation):
     def __repr__(self):
         return f"Reverb(p={self.probability!r}, delay={self.delay!r}, decay={self.decay!r})"
 
+    def start(self, buffering=BUFFER_SIZE):
+        # Compiles the filter before augmentation workers get forked from this process
+        _comb_filters(np.zeros(1), np.ones(1, dtype=np.int64), 0.0)
+
+    def parameter_ranges(self):
+        return self.delay, self.decay
+
+    def pick_parameters(self, clock=0.0):
+        return (
+            pick_value_from_range(self.delay, clock=clock),
+            pick_value_from_range(self.decay, clock=clock),
+        )
+
     def apply(self, sample, clock=0.0):
+        self.apply_parameters(sample, self.pick_parameters(clock=clock))
+
+    def apply_parameters(self, sample, parameters):
+        delay, decay = parameters
         sample.change_audio_type(new_audio_type=AUDIO_TYPE_NP)
         audio = np.array(sample.audio, dtype=np.float64)
         orig_dbfs = max_dbfs(audio)
-        delay = pick_value_from_range(self.delay, clock=clock)
-        decay = pick_value_from_range(self.decay, clock=clock)
         decay = gain_db_to_ratio(-decay)
-        result = np.copy(audio)
-        primes = [17, 19, 23, 29, 31]
-        for delay_prime in primes:  # primes to minimize comb filter interference
-            layer = np.copy(audio)
-            n_delay = math.floor(
-                delay * (delay_prime / primes[0]) * sample.audio_format.rate / 1000.0
-            )
-            n_delay = max(
-                16, n_delay
-            )  # 16 samples minimum to avoid performance trap and risk of division by zero
-            for w_index in range(0, math.floor(len(audio) / n_delay)):
-                w1 = w_index * n_delay
-                w2 = (w_index + 1) * n_delay
-                width = min(len(audio) - w2, n_delay)  # last window could be smaller
-                layer[w2 : w2 + width] += decay * layer[w1 : w1 + width]
-            result += layer
+        primes = [17, 19, 23, 29, 31]  # primes to minimize comb filter interference
+        n_delays = np.array(
+            [
+                # 16 samples minimum to avoid performance trap and risk of division by zero
+                max(
+                    16,
+                    math.floor(
+                        delay * (p / primes[0]) * sample.audio_format.rate / 1000.0
+                    ),
+                )
+                for p in primes
+            ],
+            dtype=np.int64,
+        )
+        result = _comb_filters(audio.reshape(-1), n_delays, decay).reshape(audio.shape)
         audio = normalize_audio(result, dbfs=orig_dbfs)
         sample.audio = np.array(audio, dtype=np.float32)
 
@@ -424,6 +931,8 @@ class Reverb(SampleAugmentation):
 class Resample(SampleAugmentation):
     """See "Resample augmentation" in training documentation"""
 
+    cacheable = True
+
     def __init__(self, p=1.0, rate=8000):
         super(Resample, self).__init__(p)
         self.rate = int_range(rate)
@@ -431,16 +940,25 @@ class Resample(SampleAugmentation):
     def __repr__(self):
         return f"Resample(p={self.probability!r}, rate={self.rate!r})"
 
+    def start(self, buffering=BUFFER_SIZE):
+        # Compiles the resampler before augmentation workers get forked from this process
+        resample(np.zeros(1), 2, 1)
+
+    def parameter_ranges(self):
+        return (self.rate,)
+
+    def pick_parameters(self, clock=0.0):
+        return (pick_value_from_range(self.rate, clock=clock),)
+
     def apply(self, sample, clock=0.0):
+        self.apply_parameters(sample, self.pick_parameters(clock=clock))
+
+    def apply_parameters(self, sample, parameters):
+        (rate,) = parameters
         sample.change_audio_type(new_audio_type=AUDIO_TYPE_NP)
-        rate = pick_value_from_range(self.rate, clock=clock)
         orig_len = len(sample.audio)
-        resampled = resampy.resample(
-            sample.audio, sample.audio_format.rate, rate, axis=0, filter="kaiser_fast"
-        )
-        sample.audio = resampy.resample(
-            resampled, rate, sample.audio_format.rate, axis=0, filter="kaiser_fast"
-        )[:orig_len]
+        resampled = resample(sample.audio, sample.audio_format.rate, rate)
+        sample.audio = resample(resampled, rate, sample.audio_format.rate)[:orig_len]
 
 
 class NormalizeSampleRate(SampleAugmentation):
@@ -451,18 +969,16 @@ class NormalizeSampleRate(SampleAugmentation):
     def __repr__(self):
         return f"NormalizeSampleRate(rate={self.rate!r})"
 
+    def start(self, buffering=BUFFER_SIZE):
+        # Compiles the resampler before augmentation workers get forked from this process
+        resample(np.zeros(1), 2, 1)
+
     def apply(self, sample, clock=0.0):
         if sample.audio_format.rate == self.rate:
             return
 
         sample.change_audio_type(new_audio_type=AUDIO_TYPE_NP)
-        sample.audio = resampy.resample(
-            sample.audio,
-            sample.audio_format.rate,
-            self.rate,
-            axis=0,
-            filter="kaiser_fast",
-        )
+        sample.audio = resample(sample.audio, sample.audio_format.rate, self.rate)
         sample.audio_format = sample.audio_format._replace(rate=self.rate)
 
 
@@ -558,6 +1074,8 @@ class Tempo(GraphAugmentation):
 class Warp(GraphAugmentation):
     """See "Warp augmentation" in training documentation"""
 
+    batchable = True
+
     def __init__(self, p=1.0, num_t=1, num_f=1, warp_t=0.1, warp_f=0.0):
         super(Warp, self).__init__(p, domain="spectrogram")
         self.num_t = int_range(num_t)
@@ -604,10 +1122,57 @@ class Warp(GraphAugmentation):
         )
         return tf.reshape(spectrogram_aug, shape=(1, -1, size_f))
 
+    def apply_to_batch(self, tensor, lengths, clocks, seed):
+        import tensorflow as tf  # pylint: disable=import-outside-toplevel
+
+        batch_shape = tf.shape(tensor)
+        batch_size, size_t, size_f = batch_shape[0], batch_shape[1], batch_shape[2]
+        # Numbers of control points have to be shared by all rows
+        clock = tf.reduce_mean(clocks)
+        num_t = tf_pick_value_from_range(self.num_t, clock=clock)
+        num_f = tf_pick_value_from_range(self.num_f, clock=clock)
+
+        def get_flows(n, sizes, warp, salt):
+            warp = tf_pick_values_from_range(warp, clocks, seed + [0, salt])
+            warp = (
+                warp
+                * tf.cast(sizes, dtype=tf.float32)
+                / tf.cast(2 * (n + 1), dtype=tf.float32)
+            )
+            f = tf.random.stateless_normal(
+                [batch_size, num_t, num_f], seed + [0, salt + 1], dtype=tf.float32
+            )
+            return tf.pad(
+                f * warp[:, None, None], tf.constant([[0, 0], [1, 1], [1, 1]])
+            )  # zero flow at all edges
+
+        flows = tf.stack(
+            [
+                get_flows(num_t, lengths, self.warp_t, 0),
+                get_flows(num_f, tf.fill([batch_size], size_f), self.warp_f, 2),
+            ],
+            axis=3,
+        )
+        flows = tf.image.resize_bicubic(flows, [size_t, size_f])
+        # Stretches the flows of every row over its own length (instead of the padded one)
+        positions = (
+            tf.range(size_t, dtype=tf.int64)[None, :]
+            * tf.cast(size_t, tf.int64)
+            // tf.cast(tf.math.maximum(1, lengths), tf.int64)[:, None]
+        )
+        positions = tf.cast(
+            tf.math.minimum(positions, tf.cast(size_t - 1, tf.int64)), tf.int32
+        )
+        flows = tf.gather(flows, positions, axis=1, batch_dims=1)
+        augmented = tf.contrib.image.dense_image_warp(tf.expand_dims(tensor, -1), flows)
+        return tf.reshape(augmented, batch_shape)
+
 
 class FrequencyMask(GraphAugmentation):
     """See "Frequency mask augmentation" in training documentation"""
 
+    batchable = True
+
     def __init__(self, p=1.0, n=3, size=2):
         super(FrequencyMask, self).__init__(p, domain="spectrogram")
         self.n = int_range(n)  # pylint: disable=invalid-name
@@ -648,10 +1213,27 @@ class FrequencyMask(GraphAugmentation):
 
         return tf.while_loop(lambda i, spectrogram_aug: i < n, body, (0, tensor))[1]
 
+    def apply_to_batch(self, tensor, lengths, clocks, seed):
+        import tensorflow as tf  # pylint: disable=import-outside-toplevel
+
+        freq_max = tf.shape(tensor)[2]
+        starts, sizes = _tf_random_intervals(
+            self.n,
+            lambda mask_clocks, size_seed: tf_pick_values_from_range(
+                self.size, mask_clocks, size_seed
+            ),
+            clocks,
+            tf.fill(tf.shape(lengths), freq_max),
+            seed,
+        )
+        return tensor * _tf_interval_mask(starts, sizes, freq_max)[:, None, :]
+
 
 class TimeMask(GraphAugmentation):
     """See "Time mask augmentation" in training documentation"""
 
+    batchable = True
+
     def __init__(self, p=1.0, domain="spectrogram", n=3, size=10.0):
         super(TimeMask, self).__init__(p, domain=domain)
         self.n = int_range(n)  # pylint: disable=invalid-name
@@ -703,10 +1285,30 @@ class TimeMask(GraphAugmentation):
 
         return tf.while_loop(lambda i, augmented: i < n, body, (0, tensor))[1]
 
+    def apply_to_batch(self, tensor, lengths, clocks, seed):
+        import tensorflow as tf  # pylint: disable=import-outside-toplevel
+
+        starts, sizes = _tf_random_intervals(
+            self.n,
+            lambda mask_clocks, size_seed: tf.cast(
+                tf_pick_values_from_range(self.size, mask_clocks, size_seed)
+                * self.units_per_ms(),
+                dtype=tf.int32,
+            ),
+            clocks,
+            lengths,
+            seed,
+        )
+        return (
+            tensor * _tf_interval_mask(starts, sizes, tf.shape(tensor)[1])[:, :, None]
+        )
+
 
 class Dropout(GraphAugmentation):
     """See "Dropout augmentation" in training documentation"""
 
+    batchable = True
+
     def __init__(self, p=1.0, domain="spectrogram", rate=0.05):
         super(Dropout, self).__init__(p, domain=domain)
         self.rate = float_range(rate)
@@ -728,10 +1330,21 @@ class Dropout(GraphAugmentation):
         )
         return tensor * tf.math.sign(tf.math.floor(factors + rate))
 
+    def apply_to_batch(self, tensor, lengths, clocks, seed):
+        import tensorflow as tf  # pylint: disable=import-outside-toplevel
+
+        rate = tf.math.maximum(0.0, tf_pick_values_from_range(self.rate, clocks, seed))
+        factors = tf.random.stateless_uniform(
+            tf.shape(tensor), seed + [0, 1], minval=0.0, maxval=1.0, dtype=tf.float32
+        )
+        return tensor * tf.math.sign(tf.math.floor(factors + rate[:, None, None]))
+
 
 class Add(GraphAugmentation):
     """See "Add augmentation" in training documentation"""
 
+    batchable = True
+
     def __init__(self, p=1.0, domain="features", stddev=5):
         super(Add, self).__init__(p, domain=domain)
         self.stddev = float_range(stddev)
@@ -748,10 +1361,22 @@ class Add(GraphAugmentation):
             tf.shape(tensor), seed, mean=0.0, stddev=stddev
         )
 
+    def apply_to_batch(self, tensor, lengths, clocks, seed):
+        import tensorflow as tf  # pylint: disable=import-outside-toplevel
+
+        stddev = tf_pick_values_from_range(self.stddev, clocks, seed)
+        return (
+            tensor
+            + tf.random.stateless_normal(tf.shape(tensor), seed + [0, 1])
+            * stddev[:, None, None]
+        )
+
 
 class Multiply(GraphAugmentation):
     """See "Multiply augmentation" in training documentation"""
 
+    batchable = True
+
     def __init__(self, p=1.0, domain="features", stddev=5):
         super(Multiply, self).__init__(p, domain=domain)
         self.stddev = float_range(stddev)
@@ -767,3 +1392,13 @@ class Multiply(GraphAugmentation):
         return tensor * tf.random.stateless_normal(
             tf.shape(tensor), seed, mean=1.0, stddev=stddev
         )
+
+    def apply_to_batch(self, tensor, lengths, clocks, seed):
+        import tensorflow as tf  # pylint: disable=import-outside-toplevel
+
+        stddev = tf_pick_values_from_range(self.stddev, clocks, seed)
+        return tensor * (
+            1.0
+            + tf.random.stateless_normal(tf.shape(tensor), seed + [0, 1])
+            * stddev[:, None, None]
+        )
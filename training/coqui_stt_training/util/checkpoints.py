@@ -1,3 +1,5 @@
+import json
+import os
 import sys
 
 import tensorflow.compat.v1 as tfv1
@@ -5,6 +7,7 @@ import tensorflow.compat.v1 as tfv1
 import tensorflow as tf
 
 from .config import Config, log_error, log_info, log_warn
+from .io import open_remote, path_exists_remote, rename_remote
 
 
 def _load_checkpoint_impl(
@@ -231,3 +234,42 @@ def load_graph_for_evaluation(session, silent: bool = False):
     else:
         methods = [Config.load_evaluate]
     _load_or_init_impl(session, methods, allow_drop_layers=False, silent=silent)
+
+
+DATA_POSITION_FILENAME = "data_position.json"
+DATA_POSITIONS_TO_KEEP = 100
+
+
+def save_data_position(global_step, epoch, sample_index, seed, clock):
+    """
+    Records the position in the training data at which the checkpoint of global_step was saved,
+    so that training can later continue from there (see load_data_position and --resume_data_position).
+    Positions of the most recent DATA_POSITIONS_TO_KEEP checkpoints are kept, as the checkpoint that gets loaded
+    is not necessarily the most recent one (e.g. --load_train best).
+    """
+    position_path = os.path.join(Config.save_checkpoint_dir, DATA_POSITION_FILENAME)
+    positions = _read_data_positions(position_path)
+    positions[str(int(global_step))] = dict(
+        epoch=int(epoch), sample_index=int(sample_index), seed=int(seed), clock=clock
+    )
+    steps = sorted(positions, key=int)[-DATA_POSITIONS_TO_KEEP:]
+    tmp_path = position_path + ".tmp"
+    with open_remote(tmp_path, "w", encoding="utf-8") as position_file:
+        json.dump({step: positions[step] for step in steps}, position_file, indent=1)
+    rename_remote(tmp_path, position_path)
+
+
+def load_data_position(global_step):
+    """
+    Returns the position in the training data at which the checkpoint of global_step was saved
+    as dict with keys "epoch", "sample_index", "seed" and "clock" - or None, if it was not recorded.
+    """
+    position_path = os.path.join(Config.load_checkpoint_dir, DATA_POSITION_FILENAME)
+    return _read_data_positions(position_path).get(str(int(global_step)))
+
+
+def _read_data_positions(position_path):
+    if not path_exists_remote(position_path):
+        return {}
+    with open_remote(position_path, encoding="utf-8") as position_file:
+        return json.load(position_file)
@@ -16,6 +16,7 @@ from .augmentations import NormalizeSampleRate, parse_augmentations
 from .auto_input import create_alphabet_from_sources, create_datasets_from_auto_input
 from .gpu import get_available_gpus
 from .helpers import parse_file_size
+from .sample_collections import SDB_ACCESS_TYPES, is_webdataset_source
 from .io import is_remote_path, open_remote, path_exists_remote
 
 
@@ -70,6 +71,12 @@ class BaseSttConfig(Coqpit):
 
         # Read-buffer
         self.read_buffer = parse_file_size(self.read_buffer)
+        self.feeding_shm_slot_size = parse_file_size(self.feeding_shm_slot_size)
+        self.augmentation_cache_ram = parse_file_size(self.augmentation_cache_ram)
+        self.augmentation_cache_disk = parse_file_size(self.augmentation_cache_disk)
+
+        if self.sdb_access not in SDB_ACCESS_TYPES:
+            raise RuntimeError(f"--sdb_access must be one of {tuple(SDB_ACCESS_TYPES)}")
 
         # Set default dropout rates
         if self.dropout_rate2 < 0:
@@ -147,6 +154,17 @@ class BaseSttConfig(Coqpit):
             self.test_files = [str(gen_test)]
             self.alphabet_config_path = str(gen_alphabet)
 
+        # Bucketing and sample shuffling need random access to the samples of all their sources
+        ordered_sources = (self.train_files if self.shuffle_samples else []) + (
+            self.train_files + self.dev_files if self.bucket_size > 0 else []
+        )
+        for source in ordered_sources:
+            if is_webdataset_source(source):
+                raise RuntimeError(
+                    "--bucket_size and --shuffle_samples require sources with random access "
+                    "(SDBs and CSVs), but {} is a WebDataset source.".format(source)
+                )
+
         if self.bytes_output_mode and self.alphabet_config_path:
             raise RuntimeError(
                 "You cannot set --alphabet_config_path *and* --bytes_output_mode"
@@ -265,8 +283,8 @@ class BaseSttConfig(Coqpit):
         # For an explanation of the meaning of the geometric constants
         # please refer to doc/Geometry.md
 
-        # Number of MFCC features
-        self.n_input = 26  # TODO: Determine this programmatically from the sample rate
+        # Number of MFCC features and their windows
+        self.init_feature_geometry()
 
         # The number of frames in the context
         self.n_context = (
@@ -290,6 +308,28 @@ class BaseSttConfig(Coqpit):
         # +1 for CTC blank label
         self.n_hidden_6 = self.alphabet.GetSize() + 1
 
+        if self.one_shot_infer and not path_exists_remote(self.one_shot_infer):
+            raise RuntimeError(
+                "Path specified in --one_shot_infer is not a valid file."
+            )
+
+        if self.train_cudnn and self.load_cudnn:
+            raise RuntimeError(
+                "Trying to use --train_cudnn, but --load_cudnn "
+                "was also specified. The --load_cudnn flag is only "
+                "needed when converting a CuDNN RNN checkpoint to "
+                "a CPU-capable graph. If your system is capable of "
+                "using CuDNN RNN, you can just specify the CuDNN RNN "
+                "checkpoint normally with --save_checkpoint_dir."
+            )
+
+    def init_feature_geometry(self):
+        """
+        Sets the number of MFCC features and the sizes of their audio windows and steps in samples -
+        also used by tools that compute features outside of training
+        """
+        self.n_input = 26  # TODO: Determine this programmatically from the sample rate
+
         # Size of audio window in samples
         if (self.feature_win_len * self.audio_sample_rate) % 1000 != 0:
             raise RuntimeError(
@@ -324,21 +364,6 @@ class BaseSttConfig(Coqpit):
             self.feature_win_step / 1000
         )
 
-        if self.one_shot_infer and not path_exists_remote(self.one_shot_infer):
-            raise RuntimeError(
-                "Path specified in --one_shot_infer is not a valid file."
-            )
-
-        if self.train_cudnn and self.load_cudnn:
-            raise RuntimeError(
-                "Trying to use --train_cudnn, but --load_cudnn "
-                "was also specified. The --load_cudnn flag is only "
-                "needed when converting a CuDNN RNN checkpoint to "
-                "a CPU-capable graph. If your system is capable of "
-                "using CuDNN RNN, you can just specify the CuDNN RNN "
-                "checkpoint normally with --save_checkpoint_dir."
-            )
-
     # sphinx-doc: training_ref_flags_start
     train_files: List[str] = field(
         default_factory=list,
@@ -384,18 +409,90 @@ class BaseSttConfig(Coqpit):
             help="buffer-size for reading samples from datasets (supports file-size suffixes KB, MB, GB, TB)"
         ),
     )
+    sdb_access: str = field(
+        default="buffered",
+        metadata=dict(
+            help='how to read SDB files - "buffered" for reading through a buffered file (supports remote files), "mmap" for memory-mapping local SDB files so that their pages and offset index get shared between all data loading processes, "pread" for thread-safe positional reads from local SDB files'
+        ),
+    )
+    csv_index_cache: bool = field(
+        default=False,
+        metadata=dict(
+            help="keep the parsed sample lists of local CSV files in binary sidecar index files (<csv file>.idx) next to them, so that later runs memory-map the index instead of parsing the CSV files again. An index gets rebuilt whenever its CSV file's size or modification time changes."
+        ),
+    )
+    csv_order_by_duration: bool = field(
+        default=False,
+        metadata=dict(
+            help="order samples of CSV files by their actual audio durations instead of by their wav_filesize column. Durations get probed in parallel from the audio file headers and are kept in a persistent duration cache (see --duration_cache), so only new or changed audio files get probed again."
+        ),
+    )
+    duration_cache: str = field(
+        default="",
+        metadata=dict(
+            help='path to the duration cache file used by --csv_order_by_duration. If empty, a file "<csv file>.durations" next to each (local) CSV file is used.'
+        ),
+    )
+    webdataset_count_index: str = field(
+        default="",
+        metadata=dict(
+            help="path to a JSON file with the sample counts of WebDataset tar shards, which lets WebDataset sources report their lengths. Shards that are missing from the file get counted once and added to it. If empty, WebDataset sources have no length."
+        ),
+    )
     feature_cache: str = field(
         default="",
         metadata=dict(
             help="cache MFCC features to disk to speed up future training runs on the same data. This flag specifies the path where cached features extracted from --train_files will be saved. If empty, or if online augmentation flags are enabled, caching will be disabled."
         ),
     )
+    feature_store: str = field(
+        default="",
+        metadata=dict(
+            help="directory of a persistent MFCC feature store, shared by all data sets, runs and tools (training, evaluation, LM optimization) that use it. Features are stored per sample, addressed by a hash of its audio content and the feature parameters (feature_win_len, feature_win_step, n_input, audio_sample_rate), so samples with stored features skip audio decoding and feature computation. Only used for data sets without augmentations (sample rate normalization aside) - so typically not for training. If empty, no store is used."
+        ),
+    )
+    cache_dev_batches: bool = field(
+        default=False,
+        metadata=dict(
+            help="keep the finished (padded) batches of the dev and metrics sets after their first run, so that later epochs only replay them instead of reading, decoding and computing features again. Batches are written to files in --dev_batch_cache_dir."
+        ),
+    )
+    dev_batch_cache_dir: str = field(
+        default="",
+        metadata=dict(
+            help="local directory to write the batches of --cache_dev_batches to. Cache files are recreated on every training run. If empty, a dev_batch_cache directory in --summary_dir (or, if that is remote, in the temporary directory) is used."
+        ),
+    )
     cache_for_epochs: int = field(
         default=0,
         metadata=dict(
             help='after how many epochs the feature cache is invalidated again - 0 for "never"'
         ),
     )
+    feeding_workers: int = field(
+        default=0,
+        metadata=dict(
+            help="number of worker processes for loading and augmenting samples - 0 for one per CPU"
+        ),
+    )
+    feeding_chunk_size: int = field(
+        default=1,
+        metadata=dict(
+            help="number of samples handed to a feeding worker at once - larger chunks reduce inter-process overhead for many short samples"
+        ),
+    )
+    feeding_shm_slot_size: str = field(
+        default="0",
+        metadata=dict(
+            help="if not 0, feeding workers pass decoded samples back through a ring of shared memory blocks of this size instead of pickling them - e.g. 2MB fits 30 seconds of 16 kHz audio; larger samples still get pickled. Requires Python 3.8 or later - ignored otherwise. Supports suffixes like K, M and G."
+        ),
+    )
+    cache_transcripts: bool = field(
+        default=True,
+        metadata=dict(
+            help="keep the alphabet-encoded transcripts of every data set in memory for as long as the data set exists, so that they are encoded (and validated) only once instead of once per sample and epoch. Transcripts of CSV sources get encoded and validated up front, before their first samples are fed - those of SDB and WebDataset sources only when their samples are fed."
+        ),
+    )
     shuffle_batches: bool = field(
         default=False,
         metadata=dict(
@@ -412,6 +509,24 @@ class BaseSttConfig(Coqpit):
             help="how many batches to keep in shuffle buffer when shuffling batches."
         ),
     )
+    shuffle_samples: bool = field(
+        default=False,
+        metadata=dict(
+            help="shuffle training samples (before loading them) with a permutation seeded by random_seed and the epoch, starting after N epochs, where N is set by the shuffle_start flag. Requires sources with random access (SDBs and CSVs). Ignored if bucket_size is set."
+        ),
+    )
+    shuffle_window: int = field(
+        default=0,
+        metadata=dict(
+            help="if > 0, shuffle_samples only shuffles samples within windows of this many samples of similar duration, keeping the overall order from short to long. Uses the sample durations of SDB (format version 2) and duration-ordered CSV sources (see --csv_order_by_duration) - a single source without durations is windowed by its sample order."
+        ),
+    )
+    bucket_size: int = field(
+        default=0,
+        metadata=dict(
+            help="form training and dev batches from samples of similar durations to reduce padding: all samples get sorted by duration and cut into buckets of this many batches; samples are shuffled within their buckets and the resulting batches are shuffled (anew every epoch). 0 disables bucketing. Uses the sample durations of SDB (format version 2) and duration-ordered CSV sources (see --csv_order_by_duration) - a single source without durations is bucketed by its sample order. Requires sources with random access (SDBs and CSVs)."
+        ),
+    )
 
     feature_win_len: int = field(
         default=32,
@@ -439,6 +554,44 @@ class BaseSttConfig(Coqpit):
         ),
     )
 
+    batch_augmentations: bool = field(
+        default=False,
+        metadata=dict(
+            help="apply the frequency_mask, time_mask, dropout, add, multiply and warp augmentations of the spectrogram and features domains to whole padded batches (with independent values per sample) instead of to every sample separately. Reduces feeding overhead for larger batch sizes. These augmentations are then applied after all per-sample ones of their domain."
+        ),
+    )
+
+    augmentation_stats: bool = field(
+        default=False,
+        metadata=dict(
+            help="record how often every augmentation of --augment (and sample rate normalization) gets invoked and actually applied and how much wall time it takes (summed up over all feeding workers and threads). At the end of every training epoch the counters get written to TensorBoard (--summary_dir) and appended to augmentation_stats.json in --summary_dir."
+        ),
+    )
+    augmentation_cache_ram: str = field(
+        default="0",
+        metadata=dict(
+            help="if not 0, results of the expensive and deterministic training sample augmentations (codec, reverb and resample) get cached in RAM (tmpfs) up to this size and are reused in later epochs for the same input audio and augmentation parameters - least recently used entries get evicted. Capped at the free space of /dev/shm. Supports suffixes like K, M and G."
+        ),
+    )
+    augmentation_cache_disk: str = field(
+        default="0",
+        metadata=dict(
+            help="if not 0, like --augmentation_cache_ram, but as a second, larger cache tier on disk (see --augmentation_cache_dir) of up to this size. Supports suffixes like K, M and G."
+        ),
+    )
+    augmentation_cache_dir: str = field(
+        default="",
+        metadata=dict(
+            help="directory of the disk tier of the augmentation cache (see --augmentation_cache_disk), whose entries are kept and reused by later training runs. If empty, a temporary directory is used."
+        ),
+    )
+    augmentation_cache_buckets: int = field(
+        default=0,
+        metadata=dict(
+            help="if > 0, the parameters of cached augmentations (see --augmentation_cache_ram) get quantized to this many steps across their value ranges, so that results repeat across epochs even for augmentation parameters with a radius (e.g. reverb[delay=20.0~10.0]) - at the cost of parameter variety. 0 keeps parameters as they are drawn."
+        ),
+    )
+
     # Global Constants
     epochs: int = field(
         default=75,
@@ -497,6 +650,12 @@ class BaseSttConfig(Coqpit):
     test_batch_size: int = field(
         default=1, metadata=dict(help="number of elements in a test batch")
     )
+    max_batch_frames: int = field(
+        default=0,
+        metadata=dict(
+            help="if greater than 0, batches of all sets are not formed from a fixed number of samples (--train_batch_size, --dev_batch_size and --test_batch_size are ignored), but pack as many consecutive samples as fit into this budget of (padded) feature frames - number of samples times feature frames of the longest sample. This keeps memory use per batch bounded while short samples get batched in larger numbers."
+        ),
+    )
 
     export_batch_size: int = field(
         default=1,
@@ -582,6 +741,12 @@ class BaseSttConfig(Coqpit):
         default=5,
         metadata=dict(help="number of checkpoint files to keep - default value is 5"),
     )
+    resume_data_position: bool = field(
+        default=False,
+        metadata=dict(
+            help="continue training at the epoch and training sample at which the loaded checkpoint was saved (as recorded in data_position.json next to the checkpoints), instead of starting over with epoch 0 - with --feature_cache, interrupted epochs get restarted from their first sample, as a partially iterated epoch would leave an incomplete feature cache behind"
+        ),
+    )
     load_train: str = field(
         default="auto",
         metadata=dict(
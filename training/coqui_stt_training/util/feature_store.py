@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import io
+import json
+import os
+import uuid
+
+import numpy as np
+
+from .audio import sample_content
+from .config import Config
+from .helpers import GIGABYTE
+
+FEATURE_STORE_VERSION = 2
+FEATURE_DTYPE = np.float32
+FEATURE_SUFFIX = ".npy"
+PACK_DIR = "packs"
+PACK_DATA_SUFFIX = ".data"
+PACK_INDEX_SUFFIX = ".index.npz"
+PACK_SIZE = 1 * GIGABYTE
+
+
+def feature_params():
+    """Parameters that determine the features computed from a sample (besides its audio content)"""
+    return dict(
+        version=FEATURE_STORE_VERSION,
+        feature_win_len=Config.feature_win_len,
+        feature_win_step=Config.feature_win_step,
+        n_input=Config.n_input,
+        audio_sample_rate=Config.audio_sample_rate,
+    )
+
+
+class FeaturePack:
+    """
+    Read-only pack of feature store entries (see FeaturePackWriter): a data file with the features of all entries
+    (as consecutive rows) and an index file with their sorted keys, start rows and numbers of frames.
+    """
+
+    def __init__(self, index_path):
+        with np.load(index_path) as index:
+            self.keys = index["keys"]
+            self.starts = index["starts"]
+            self.frames = index["frames"]
+            self.dtype = np.dtype(str(index["dtype"]))
+            self.n_input = int(index["n_input"])
+        self.data_path = index_path[: -len(PACK_INDEX_SUFFIX)] + PACK_DATA_SUFFIX
+        self.data = None
+
+    def __contains__(self, key):
+        return self.find(key) is not None
+
+    def find(self, key):
+        """Index of the entry with key - or None, if the pack does not contain it"""
+        key = key.encode()
+        i = int(np.searchsorted(self.keys, key))
+        return i if i < len(self.keys) and self.keys[i] == key else None
+
+    def get(self, key):
+        i = self.find(key)
+        if i is None:
+            return None
+        start, frames = int(self.starts[i]), int(self.frames[i])
+        if frames == 0:
+            return np.zeros((0, self.n_input), dtype=self.dtype)
+        if self.data is None:
+            self.data = np.memmap(self.data_path, dtype=self.dtype, mode="r")
+            self.data = self.data.reshape(-1, self.n_input)
+        return self.data[start : start + frames]
+
+
+class FeaturePackWriter:
+    """
+    Writes entries of a FeatureStore into packs of up to pack_size bytes instead of one file per entry -
+    for adding large numbers of entries at once (see bin/feature_extraction_tool.py).
+    A pack becomes visible to stores that get opened after it got completed.
+    """
+
+    def __init__(self, store, pack_size=PACK_SIZE):
+        self.store = store
+        self.pack_size = pack_size
+        self.pack_path = None
+        self.data_file = None
+        self.added = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def add(self, key, features):
+        """Adds features of shape [frames, n_input] under key - keys that were already added get skipped"""
+        if key in self.added:
+            return
+        features = np.ascontiguousarray(features, dtype=self.store.dtype)
+        if self.data_file is None:
+            pack_dir = os.path.join(self.store.path, PACK_DIR)
+            os.makedirs(pack_dir, exist_ok=True)
+            self.pack_path = os.path.join(pack_dir, uuid.uuid4().hex)
+            self.data_file = open(self.pack_path + PACK_DATA_SUFFIX, "wb")
+            self.keys, self.starts, self.frames = [], [], []
+            self.n_input = features.shape[1]
+            self.rows = 0
+        if features.shape[1] != self.n_input:
+            raise ValueError(
+                "Features of entry {} have {} instead of {} columns".format(
+                    key, features.shape[1], self.n_input
+                )
+            )
+        self.data_file.write(features.tobytes())
+        self.added.add(key)
+        self.keys.append(key)
+        self.starts.append(self.rows)
+        self.frames.append(len(features))
+        self.rows += len(features)
+        if self.data_file.tell() >= self.pack_size:
+            self.close()
+
+    def close(self):
+        """Completes the current pack - its index gets written (atomically) last"""
+        if self.data_file is None:
+            return
+        self.data_file.close()
+        self.data_file = None
+        order = np.argsort(self.keys)
+        index_path = self.pack_path + PACK_INDEX_SUFFIX
+        tmp_path = "{}.{}.tmp".format(index_path, uuid.uuid4().hex)
+        with open(tmp_path, "wb") as tmp_file:
+            np.savez(
+                tmp_file,
+                keys=np.array(self.keys, dtype="S")[order],
+                starts=np.array(self.starts, dtype=np.int64)[order],
+                frames=np.array(self.frames, dtype=np.int64)[order],
+                dtype=np.array(np.dtype(self.store.dtype).name),
+                n_input=np.array(self.n_input),
+            )
+        os.replace(tmp_path, index_path)
+
+
+class FeatureStore:
+    """
+    Persistent on-disk store of (un-augmented) MFCC features.
+    Entries are addressed by a hash of the sample's audio content and the feature parameters (see feature_params),
+    so they can be shared by all data sets, runs and tools that compute features the same way,
+    regardless of the file or collection a sample was loaded from.
+    Entries are either packed (see FeaturePackWriter) or single .npy files under a two-level directory fan-out.
+    Both get memory-mapped on read. Entries and packs are written atomically,
+    so any number of processes can read from and write to a store at the same time.
+    """
+
+    def __init__(self, path, params=None, dtype=FEATURE_DTYPE):
+        """
+        Parameters
+        ----------
+        path : str
+            Directory of the store - gets created if missing
+        params : dict or None
+            Feature parameters the entries are computed with - defaults to feature_params()
+        dtype : numpy.dtype
+            Data type of entries written by this instance (e.g. np.float16 for halving the store's size).
+            Entries of any floating point type can be read.
+        """
+        self.path = path
+        self.dtype = dtype
+        self.params = feature_params() if params is None else params
+        self.params_digest = hashlib.blake2b(
+            json.dumps(self.params, sort_keys=True).encode(), digest_size=16
+        ).digest()
+        os.makedirs(path, exist_ok=True)
+        pack_dir = os.path.join(path, PACK_DIR)
+        self.packs = (
+            [
+                FeaturePack(os.path.join(pack_dir, name))
+                for name in sorted(os.listdir(pack_dir))
+                if name.endswith(PACK_INDEX_SUFFIX)
+            ]
+            if os.path.isdir(pack_dir)
+            else []
+        )
+
+    def key(self, sample):
+        """Store key of a util.audio.Sample - requires reading, but not decoding its audio"""
+        content_hash = hashlib.blake2b(self.params_digest, digest_size=20)
+        content_hash.update(sample.audio_type.encode())
+        if not isinstance(sample.audio, io.BytesIO):
+            # Raw audio carries no header
+            content_hash.update(str(tuple(sample.audio_format)).encode())
+        content_hash.update(sample_content(sample))
+        return content_hash.hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.path, key[:2], key[2:4], key + FEATURE_SUFFIX)
+
+    def __contains__(self, key):
+        return any(key in pack for pack in self.packs) or os.path.isfile(
+            self.entry_path(key)
+        )
+
+    def get(self, key):
+        """Memory-mapped features of shape [frames, n_input] stored under key - or None, if there are none"""
+        for pack in self.packs:
+            features = pack.get(key)
+            if features is not None:
+                return features
+        try:
+            return np.load(self.entry_path(key), mmap_mode="r")
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, features):
+        """Stores features of shape [frames, n_input] under key"""
+        entry_path = self.entry_path(key)
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+        tmp_path = "{}.{}.tmp".format(entry_path, uuid.uuid4().hex)
+        with open(tmp_path, "wb") as tmp_file:
+            np.save(tmp_file, np.asarray(features, dtype=self.dtype))
+        os.replace(tmp_path, entry_path)
+
+    def pack_writer(self, pack_size=PACK_SIZE):
+        """FeaturePackWriter for adding many entries to the store at once"""
+        return FeaturePackWriter(self, pack_size=pack_size)
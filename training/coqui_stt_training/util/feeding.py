@@ -1,8 +1,10 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, division, print_function
 
+import glob
+import os
 from collections import Counter
-from functools import partial
+from functools import lru_cache, partial
 
 import numpy as np
 from tensorflow.python.ops import gen_audio_ops as contrib_audio
@@ -10,14 +12,28 @@ from tensorflow.python.ops import gen_audio_ops as contrib_audio
 import tensorflow as tf
 
 from .audio import DEFAULT_FORMAT, pcm_to_np, read_frames_from_file, vad_split
-from .augmentations import apply_graph_augmentations, apply_sample_augmentations
-from .config import Config
-from .helpers import MEGABYTE
-from .sample_collections import samples_from_sources
+from .augmentation_cache import AugmentationCache
+from .augmentations import (
+    NormalizeSampleRate,
+    apply_graph_augmentations,
+    apply_graph_batch_augmentations,
+    apply_sample_augmentations,
+    is_batch_augmentation,
+)
+from .config import Config, log_debug
+from .feature_store import FeatureStore
+from .helpers import BATCH_KEY_RANGE, MEGABYTE, pack_batches
+from .sample_collections import (
+    BucketedSamples,
+    ShuffledSamples,
+    samples_from_source,
+    samples_from_sources,
+    skip_samples,
+)
 from .text import text_to_char_array
 
 
-def audio_to_features(
+def audio_to_spectrogram(
     audio,
     sample_rate,
     transcript=None,
@@ -25,6 +41,7 @@ def audio_to_features(
     train_phase=False,
     augmentations=None,
     sample_id=None,
+    augmentation_stats=None,
 ):
     if train_phase:
         # We need the lambdas to make TensorFlow happy.
@@ -45,7 +62,12 @@ def audio_to_features(
 
     if train_phase and augmentations:
         audio = apply_graph_augmentations(
-            "signal", audio, augmentations, transcript=transcript, clock=clock
+            "signal",
+            audio,
+            augmentations,
+            transcript=transcript,
+            clock=clock,
+            augmentation_stats=augmentation_stats,
         )
 
     spectrogram = contrib_audio.audio_spectrogram(
@@ -62,8 +84,33 @@ def audio_to_features(
             augmentations,
             transcript=transcript,
             clock=clock,
+            augmentation_stats=augmentation_stats,
         )
 
+    return spectrogram
+
+
+def audio_to_features(
+    audio,
+    sample_rate,
+    transcript=None,
+    clock=0.0,
+    train_phase=False,
+    augmentations=None,
+    sample_id=None,
+    augmentation_stats=None,
+):
+    spectrogram = audio_to_spectrogram(
+        audio,
+        sample_rate,
+        transcript=transcript,
+        clock=clock,
+        train_phase=train_phase,
+        augmentations=augmentations,
+        sample_id=sample_id,
+        augmentation_stats=augmentation_stats,
+    )
+
     features = contrib_audio.mfcc(
         spectrogram=spectrogram,
         sample_rate=sample_rate,
@@ -74,12 +121,67 @@ def audio_to_features(
 
     if train_phase and augmentations:
         features = apply_graph_augmentations(
-            "features", features, augmentations, transcript=transcript, clock=clock
+            "features",
+            features,
+            augmentations,
+            transcript=transcript,
+            clock=clock,
+            augmentation_stats=augmentation_stats,
         )
 
     return features, tf.shape(input=features)[0]
 
 
+def spectrograms_to_features(
+    spectrograms, lengths, clocks, augmentations=None, augmentation_stats=None
+):
+    """
+    Batch-level counterpart of audio_to_features for batch augmentation mode (see --batch_augmentations):
+    Applies batch augmentations (see util.augmentations.is_batch_augmentation) to a padded batch of
+    spectrograms, computes its MFCC features and applies the batch augmentations of the features domain.
+
+    Parameters
+    ----------
+    spectrograms : Tensor of type float32
+        Padded batch of spectrograms of shape [batch_size, time, bins] (see entry_to_spectrogram)
+    lengths : Tensor of type int32
+        Number of spectrogram (and feature) frames of every sample
+    clocks : Tensor of type float64
+        Clock value of every sample
+    augmentations : list of augmentation class instances from util.augmentations.*.
+    augmentation_stats : util.augmentations.AugmentationStats or None
+
+    Returns
+    -------
+    Padded batch of features of shape [batch_size, time, Config.n_input] (with zero padding) and lengths
+    """
+    spectrograms = apply_graph_batch_augmentations(
+        "spectrogram",
+        spectrograms,
+        lengths,
+        clocks,
+        augmentations,
+        augmentation_stats=augmentation_stats,
+    )
+    # The MFCC op treats the rows of the batch like channels of one spectrogram
+    features = contrib_audio.mfcc(
+        spectrogram=spectrograms,
+        sample_rate=Config.audio_sample_rate,
+        dct_coefficient_count=Config.n_input,
+        upper_frequency_limit=Config.audio_sample_rate / 2,
+    )
+    features = apply_graph_batch_augmentations(
+        "features",
+        features,
+        lengths,
+        clocks,
+        augmentations,
+        augmentation_stats=augmentation_stats,
+    )
+    padding_mask = tf.sequence_mask(lengths, tf.shape(features)[1], dtype=tf.float32)
+    return features * padding_mask[:, :, None], lengths
+
+
 def audiofile_to_features(
     wav_filename, clock=0.0, train_phase=False, augmentations=None
 ):
@@ -111,6 +213,7 @@ def entry_to_features(
     clock,
     train_phase=False,
     augmentations=None,
+    augmentation_stats=None,
 ):
     # https://bugs.python.org/issue32117
     sparse_transcript = tf.SparseTensor(*transcript)
@@ -122,21 +225,131 @@ def entry_to_features(
         train_phase=train_phase,
         augmentations=augmentations,
         sample_id=sample_id,
+        augmentation_stats=augmentation_stats,
     )
     return sample_id, features, features_len, sparse_transcript
 
 
+def entry_to_spectrogram(
+    sample_id,
+    audio,
+    sample_rate,
+    transcript,
+    clock,
+    augmentations=None,
+    augmentation_stats=None,
+):
+    """
+    Like entry_to_features for training in batch augmentation mode (see --batch_augmentations),
+    but only up to the spectrogram - with a (spectrogram, clock) pair in place of the features.
+    Features get computed per batch by spectrograms_to_features.
+    """
+    sparse_transcript = tf.SparseTensor(*transcript)
+    spectrogram = audio_to_spectrogram(
+        audio,
+        sample_rate,
+        transcript=sparse_transcript,
+        clock=clock,
+        train_phase=True,
+        augmentations=augmentations,
+        sample_id=sample_id,
+        augmentation_stats=augmentation_stats,
+    )
+    spectrogram = spectrogram[0]
+    return sample_id, (spectrogram, clock), tf.shape(spectrogram)[0], sparse_transcript
+
+
+def store_features(feature_store, feature_key, features):
+    feature_store.put(feature_key.decode(), features)
+    return features
+
+
+def stored_entry_to_features(
+    sample_id,
+    audio,
+    sample_rate,
+    transcript,
+    clock,
+    features,
+    feature_key,
+    train_phase=False,
+    feature_store=None,
+):
+    """
+    Like entry_to_features, but with the features of the entry coming from a util.feature_store.FeatureStore.
+    Entries without stored features (empty features) get their features computed and stored.
+    """
+    sparse_transcript = tf.SparseTensor(*transcript)
+
+    def compute_and_store():
+        computed, _ = audio_to_features(
+            audio,
+            sample_rate,
+            transcript=sparse_transcript,
+            clock=clock,
+            train_phase=train_phase,
+            sample_id=sample_id,
+        )
+        return tf.numpy_function(
+            partial(store_features, feature_store),
+            [feature_key, computed],
+            tf.float32,
+            stateful=True,
+        )
+
+    features = tf.cond(tf.shape(features)[0] > 0, lambda: features, compute_and_store)
+    features = tf.reshape(features, [-1, Config.n_input])
+    return sample_id, features, tf.shape(input=features)[0], sparse_transcript
+
+
+@lru_cache(maxsize=None)
+def sparse_indices(length):
+    """Read-only sparse indices [[0, 0], [0, 1], ..., [0, length - 1]] - shared by all sequences of a length"""
+    indices = np.zeros((length, 2), dtype=np.int64)
+    indices[:, 1] = np.arange(length)
+    indices.flags.writeable = False
+    return indices
+
+
 def to_sparse_tuple(sequence):
     r"""Creates a sparse representention of ``sequence``.
     Returns a tuple with (indices, values, shape)
     """
-    indices = np.asarray(
-        list(zip([0] * len(sequence), range(len(sequence)))), dtype=np.int64
-    )
+    indices = sparse_indices(len(sequence))
     shape = np.asarray([1, len(sequence)], dtype=np.int64)
     return indices, sequence, shape
 
 
+def encode_transcript(transcript, context="", cache=None):
+    """
+    Encodes a transcript with Config.alphabet into a sparse tuple (see to_sparse_tuple).
+    If a cache dict (mapping transcripts to encoded int32 bytes) is provided, every distinct transcript
+    gets encoded and validated only once per cache - create_dataset keeps one per data set (see --cache_transcripts).
+    """
+    encoded = None if cache is None else cache.get(transcript)
+    if encoded is None:
+        encoded = np.asarray(
+            text_to_char_array(transcript, Config.alphabet, context=context),
+            dtype=np.int32,
+        ).tobytes()
+        if cache is not None:
+            cache[transcript] = encoded
+    return to_sparse_tuple(np.frombuffer(encoded, dtype=np.int32))
+
+
+def encode_transcripts(samples, cache):
+    """
+    Encodes (and thereby validates) all transcripts of a sample collection up front into cache, if the collection
+    can list them without loading audio (see util.sample_collections.CSV.transcripts). This is only the case
+    for CSV sources - transcripts of SDB and WebDataset sources are still encoded and validated as their samples
+    get fed (once per distinct transcript, thanks to the cache).
+    """
+    for col in getattr(samples, "cols", [samples]):
+        if hasattr(col, "transcripts"):
+            for sample_id, transcript in col.transcripts():
+                encode_transcript(transcript, context=sample_id, cache=cache)
+
+
 def create_dataset(
     sources,
     batch_size,
@@ -149,16 +362,104 @@ def create_dataset(
     process_ahead=None,
     buffering=1 * MEGABYTE,
     epoch_ph=None,
+    bucket_size=0,
+    max_frames=0,
+    data_position=None,
+    shuffle_samples=False,
+    shuffle_window=0,
+    batch_cache=None,
+    batch_augmentations=False,
+    augmentation_stats=None,
 ):
     epoch_counter = Counter()  # survives restarts of the dataset and its generator
+    # Shared with the training loop: an optional "resume" position (epoch, sample_index and seed) to continue
+    # an interrupted epoch from, and the epoch, seed, start index and length of the current epoch
+    data_position = {} if data_position is None else data_position
+    # Features of un-augmented samples (sample rate normalization aside) can be reused from the store
+    feature_store = (
+        FeatureStore(Config.feature_store)
+        if Config.feature_store
+        and not (
+            train_phase
+            and any(
+                not isinstance(augmentation, NormalizeSampleRate)
+                for augmentation in augmentations or []
+            )
+        )
+        else None
+    )
+    no_features = np.zeros((0, Config.n_input), dtype=np.float32)
+    # Encoded transcripts of this data set - kept across epochs and released together with the data set
+    transcript_cache = {} if Config.cache_transcripts else None
+    # Results of expensive sample augmentations are reused across epochs (and runs, for a persistent disk tier)
+    augmentation_cache = (
+        AugmentationCache(
+            ram_budget=Config.augmentation_cache_ram,
+            disk_budget=Config.augmentation_cache_disk,
+            disk_path=Config.augmentation_cache_dir or None,
+            buckets=Config.augmentation_cache_buckets,
+        )
+        if train_phase
+        and (Config.augmentation_cache_ram > 0 or Config.augmentation_cache_disk > 0)
+        and any(
+            getattr(augmentation, "cacheable", False)
+            for augmentation in augmentations or []
+        )
+        else None
+    )
+    # Batch augmentations get applied to padded batches of spectrograms, which are turned into features afterwards
+    batch_augmentations = (
+        batch_augmentations
+        and train_phase
+        and feature_store is None
+        and any(
+            is_batch_augmentation(augmentation) for augmentation in augmentations or []
+        )
+    )
 
-    def generate_values():
+    def generate_entries():
         epoch = epoch_counter["epoch"]
+        seed = Config.random_seed + epoch
+        start_index = 0
+        resume = data_position.pop("resume", None)
+        if train_phase and resume:
+            epoch, seed, start_index = (
+                resume["epoch"],
+                resume["seed"],
+                resume["sample_index"],
+            )
         if train_phase:
-            epoch_counter["epoch"] += 1
-        samples = samples_from_sources(
-            sources, buffering=buffering, labeled=True, reverse=reverse
+            epoch_counter["epoch"] = epoch + 1
+        source_args = dict(
+            buffering=buffering,
+            labeled=True,
+            reverse=reverse,
+            sdb_access=Config.sdb_access,
+            csv_index_cache=Config.csv_index_cache,
+            csv_order_by_duration=Config.csv_order_by_duration,
+            duration_cache=Config.duration_cache or None,
+            webdataset_count_index=Config.webdataset_count_index or None,
         )
+        if bucket_size > 0:
+            samples = BucketedSamples(
+                [samples_from_source(source, **source_args) for source in sources],
+                batch_size,
+                bucket_size,
+                seed=seed,
+                reverse=reverse,
+            )
+        elif shuffle_samples and epoch >= Config.shuffle_start:
+            samples = ShuffledSamples(
+                [samples_from_source(source, **source_args) for source in sources],
+                seed=seed,
+                window=shuffle_window,
+                reverse=reverse,
+            )
+        else:
+            samples = samples_from_sources(sources, **source_args)
+        if epoch_counter["runs"] == 0 and transcript_cache is not None:
+            encode_transcripts(samples, transcript_cache)
+        epoch_counter["runs"] += 1
         try:
             num_samples = len(samples)
         except TypeError:
@@ -168,27 +469,84 @@ def create_dataset(
         if limit > 0:
             num_samples = min(limit, num_samples)
 
+        start_index = min(start_index, num_samples)
+        data_position.update(
+            epoch=epoch, seed=seed, start_index=start_index, num_samples=num_samples
+        )
+        samples = skip_samples(samples, start_index)
+        feeding_stats = {}
         samples = apply_sample_augmentations(
             samples,
             augmentations,
             buffering=buffering,
             process_ahead=2 * batch_size if process_ahead is None else process_ahead,
-            clock=epoch / epochs,
+            clock=(epoch + (start_index / num_samples if num_samples else 0)) / epochs,
             final_clock=(epoch + 1) / epochs,
+            feature_store=feature_store,
+            processes=Config.feeding_workers or None,
+            chunksize=Config.feeding_chunk_size,
+            stats=feeding_stats,
+            shm_slot_size=Config.feeding_shm_slot_size,
+            augmentation_stats=augmentation_stats,
+            augmentation_cache=augmentation_cache,
         )
-        for sample_index, sample in enumerate(samples):
+        for sample_index, sample in enumerate(samples, start=start_index):
             if sample_index >= num_samples:
                 break
+            if feature_store is not None:
+                sample, feature_key, stored = sample
+                features = feature_store.get(feature_key) if stored else no_features
+                if features is not None:
+                    # Converts float16 entries (see bin/feature_extraction_tool.py) - float32 ones are not copied
+                    features = np.asarray(features, dtype=np.float32)
+                if features is None:
+                    raise RuntimeError(
+                        "Feature store entry {} of sample {} vanished".format(
+                            feature_key, sample.sample_id
+                        )
+                    )
             clock = (
                 (epoch * num_samples + sample_index) / (epochs * num_samples)
                 if train_phase and num_samples and epochs > 0
                 else 0.0
             )
-            transcript = text_to_char_array(
-                sample.transcript, Config.alphabet, context=sample.sample_id
+            transcript = encode_transcript(
+                sample.transcript, context=sample.sample_id, cache=transcript_cache
+            )
+            entry = (
+                sample.sample_id,
+                sample.audio,
+                sample.audio_format.rate,
+                transcript,
+                clock,
+            )
+            if feature_store is not None and len(features) > 0:
+                frames = len(features)
+            else:
+                frames = int(sample.duration * 1000 / Config.feature_win_step)
+            if feature_store is not None:
+                entry += (features, feature_key)
+            yield frames, entry
+        samples.close()  # ends the worker pool - which reports its feeding counters
+        if feeding_stats:
+            log_debug(
+                "Fed {consumed} samples - queue depth up to {max_queue_depth}, "
+                "feeder blocked for {feeder_idle:.1f}s, "
+                "consumer waited for {consumer_idle:.1f}s".format(**feeding_stats)
+            )
+        if augmentation_cache is not None:
+            log_debug(
+                "Augmentation cache: {hits} hits, {misses} misses".format(
+                    **augmentation_cache.stats()
+                )
             )
-            transcript = to_sparse_tuple(transcript)
-            yield sample.sample_id, sample.audio, sample.audio_format.rate, transcript, clock
+
+    def generate_values():
+        if max_frames > 0:
+            yield from pack_batches(generate_entries(), max_frames)
+        else:
+            for _, entry in generate_entries():
+                yield entry
 
     # Batching a dataset of 2D SparseTensors creates 3D batches, which fail
     # when passed to tf.nn.ctc_loss, so we reshape them to remove the extra
@@ -197,32 +555,106 @@ def create_dataset(
         shape = sparse.dense_shape
         return tf.sparse.reshape(sparse, [shape[0], shape[2]])
 
-    def batch_fn(sample_ids, features, features_len, transcripts):
+    def batch_fn(sample_ids, features, features_len, transcripts, size=batch_size):
         features = tf.data.Dataset.zip((features, features_len))
-        features = features.padded_batch(
-            batch_size, padded_shapes=([None, Config.n_input], [])
-        )
-        transcripts = transcripts.batch(batch_size).map(sparse_reshape)
-        sample_ids = sample_ids.batch(batch_size)
+        if batch_augmentations:
+            # Features are pairs of spectrograms and clocks (see entry_to_spectrogram)
+            features = features.padded_batch(
+                size, padded_shapes=(([None, None], []), [])
+            ).map(
+                lambda spectrograms_and_clocks, lengths: spectrograms_to_features(
+                    spectrograms_and_clocks[0],
+                    lengths,
+                    spectrograms_and_clocks[1],
+                    augmentations=augmentations,
+                    augmentation_stats=augmentation_stats,
+                ),
+                num_parallel_calls=tf.data.experimental.AUTOTUNE,
+            )
+        else:
+            features = features.padded_batch(
+                size, padded_shapes=([None, Config.n_input], [])
+            )
+        transcripts = transcripts.batch(size).map(sparse_reshape)
+        sample_ids = sample_ids.batch(size)
         return tf.data.Dataset.zip((sample_ids, features, transcripts))
 
-    process_fn = partial(
-        entry_to_features, train_phase=train_phase, augmentations=augmentations
-    )
+    def frame_batch_fn(_, window):
+        # A window holds exactly the entries of one packed batch
+        return batch_fn(
+            window.map(lambda *entry: entry[0]),
+            window.map(lambda *entry: entry[1]),
+            window.map(lambda *entry: entry[2]),
+            window.map(lambda *entry: entry[3]),
+            size=BATCH_KEY_RANGE,
+        )
 
-    dataset = tf.data.Dataset.from_generator(
-        generate_values,
-        output_types=(
-            tf.string,
-            tf.float32,
-            tf.int32,
-            (tf.int64, tf.int32, tf.int64),
-            tf.float64,
-        ),
-    ).map(process_fn, num_parallel_calls=tf.data.experimental.AUTOTUNE)
+    if feature_store is not None:
+        process_fn = partial(
+            stored_entry_to_features,
+            train_phase=train_phase,
+            feature_store=feature_store,
+        )
+    elif batch_augmentations:
+        process_fn = partial(
+            entry_to_spectrogram,
+            augmentation_stats=augmentation_stats,
+            augmentations=[
+                augmentation
+                for augmentation in augmentations
+                if not is_batch_augmentation(augmentation)
+            ],
+        )
+    else:
+        process_fn = partial(
+            entry_to_features,
+            train_phase=train_phase,
+            augmentations=augmentations,
+            augmentation_stats=augmentation_stats,
+        )
+
+    output_types = (
+        tf.string,
+        tf.float32,
+        tf.int32,
+        (tf.int64, tf.int32, tf.int64),
+        tf.float64,
+    )
+    if feature_store is not None:
+        output_types += (tf.float32, tf.string)
+    if max_frames > 0:
+        dataset = tf.data.Dataset.from_generator(
+            generate_values, output_types=output_types + (tf.int64,)
+        ).map(
+            lambda *entry: process_fn(*entry[:-1]) + (entry[-1],),
+            num_parallel_calls=tf.data.experimental.AUTOTUNE,
+        )
+    else:
+        dataset = tf.data.Dataset.from_generator(
+            generate_values, output_types=output_types
+        ).map(process_fn, num_parallel_calls=tf.data.experimental.AUTOTUNE)
     if cache_path:
         dataset = dataset.cache(cache_path)
-    dataset = dataset.window(batch_size, drop_remainder=train_phase).flat_map(batch_fn)
+    if max_frames > 0:
+        dataset = dataset.apply(
+            tf.data.experimental.group_by_window(
+                key_func=lambda *entry: entry[-1],
+                reduce_func=frame_batch_fn,
+                window_size_func=lambda batch_key: batch_key % BATCH_KEY_RANGE,
+            )
+        )
+    else:
+        dataset = dataset.window(batch_size, drop_remainder=train_phase).flat_map(
+            batch_fn
+        )
+
+    if batch_cache:
+        # Finished batches get replayed from files (path prefix) after their first epoch. An in-memory cache would
+        # not do: it gets rebuilt whenever the iterator gets (re-)initialized - so at the start of every epoch.
+        # Files of earlier runs could stem from different data - as opposed to cache_path they are not reused
+        for cache_file in glob.glob(glob.escape(batch_cache) + "*"):
+            os.remove(cache_file)
+        dataset = dataset.cache(batch_cache)
 
     if Config.shuffle_batches and epoch_ph is not None:
         with tf.control_dependencies([tf.print("epoch:", epoch_ph)]):
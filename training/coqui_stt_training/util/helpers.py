@@ -2,10 +2,13 @@ import heapq
 import os
 import random
 import sys
+import threading
 import time
+import weakref
 from collections import namedtuple
 from multiprocessing import Pool
 
+import numpy as np
 import semver
 
 KILO = 1024
@@ -124,7 +127,9 @@ class LenMap:
 class LimitingPool:
     """Limits unbound ahead-processing of multiprocessing.Pool's imap method
     before items get consumed by the iteration caller.
-    This prevents OOM issues in situations where items represent larger memory allocations."""
+    This prevents OOM issues in situations where items represent larger memory allocations.
+    Backpressure is blocking: the pool's task feeder waits on a semaphore that gets released
+    by every consumed result, so refilling never lags behind consumption."""
 
     def __init__(
         self,
@@ -132,11 +137,20 @@ class LimitingPool:
         initializer=None,
         initargs=None,
         process_ahead=None,
-        sleeping_for=0.1,
+        chunksize=1,
     ):
+        self.chunksize = max(1, chunksize)
         self.process_ahead = os.cpu_count() if process_ahead is None else process_ahead
-        self.sleeping_for = sleeping_for
+        # Chunks only get dispatched once complete - so a chunk has to fit into the limit
+        self.process_ahead = max(self.process_ahead, self.chunksize)
+        self.slots = threading.Semaphore(self.process_ahead)
+        self.lock = threading.Lock()
+        self.closed = False
         self.processed = 0
+        self.max_processed = 0
+        self.consumed = 0
+        self.feeder_idle = 0.0
+        self.consumer_idle = 0.0
         self.pool = Pool(
             processes=processes, initializer=initializer, initargs=initargs
         )
@@ -145,24 +159,229 @@ class LimitingPool:
         return self
 
     def _limit(self, it):
-        for obj in it:
-            while self.processed >= self.process_ahead:
-                time.sleep(self.sleeping_for)
-            self.processed += 1
+        it = iter(it)
+        while True:
+            # Items only get pulled once there is room for them
+            if not self.slots.acquire(blocking=False):
+                start = time.perf_counter()
+                self.slots.acquire()
+                with self.lock:
+                    self.feeder_idle += time.perf_counter() - start
+            if self.closed:
+                return
+            try:
+                obj = next(it)
+            except StopIteration:
+                return
+            with self.lock:
+                self.processed += 1
+                self.max_processed = max(self.max_processed, self.processed)
             yield obj
 
     def imap(self, fun, it):
-        for obj in self.pool.imap(fun, self._limit(it)):
-            self.processed -= 1
+        results = self.pool.imap(fun, self._limit(it), chunksize=self.chunksize)
+        while True:
+            start = time.perf_counter()
+            try:
+                obj = next(results)
+            except StopIteration:
+                return
+            with self.lock:
+                self.consumer_idle += time.perf_counter() - start
+                self.processed -= 1
+                self.consumed += 1
+            self.slots.release()
             yield obj
 
+    def stats(self):
+        """
+        Returns
+        -------
+        dict with the current and maximum number of items that were handed to the pool but not consumed yet
+        (queue_depth, max_queue_depth), the number of consumed items (consumed) and the seconds the feeder was
+        blocked by the limit (feeder_idle) and the consumer waited for results (consumer_idle)
+        """
+        with self.lock:
+            return dict(
+                queue_depth=self.processed,
+                max_queue_depth=self.max_processed,
+                consumed=self.consumed,
+                feeder_idle=self.feeder_idle,
+                consumer_idle=self.consumer_idle,
+            )
+
     def terminate(self):
         self.pool.terminate()
 
     def __exit__(self, exc_type, exc_value, traceback):
+        # Unblocks a waiting feeder, if iteration ended early
+        self.closed = True
+        self.slots.release()
         self.pool.close()
 
 
+def shared_memory_supported():
+    """If multiprocessing.shared_memory (and thereby SharedMemoryRing) is available - requires Python 3.8+"""
+    return sys.version_info >= (3, 8)
+
+
+class SharedMemoryRing:
+    """
+    Ring of equally sized shared memory blocks for passing NumPy arrays from pool workers to the parent process
+    without pickling them. The parent creates (and finally unlinks) the blocks, workers attach to them on first use
+    after receiving the ring (pickled as block names only). Item i of a stream goes through slot i % slots,
+    so a slot must not be written again before the parent got its previous array (see get).
+    Requires Python 3.8+ (see shared_memory_supported).
+    """
+
+    def __init__(self, slots, slot_size):
+        from multiprocessing import shared_memory
+
+        self.slot_size = slot_size
+        self.blocks = [
+            shared_memory.SharedMemory(create=True, size=slot_size)
+            for _ in range(slots)
+        ]
+        self.names = [block.name for block in self.blocks]
+        self.owner = True
+
+    def __getstate__(self):
+        return dict(names=self.names, slot_size=self.slot_size)
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.blocks = [None] * len(self.names)
+        self.owner = False
+
+    def _block(self, slot):
+        block = self.blocks[slot]
+        if block is None:
+            from multiprocessing import shared_memory
+
+            block = self.blocks[slot] = shared_memory.SharedMemory(
+                name=self.names[slot]
+            )
+        return block
+
+    def put(self, index, array):
+        """
+        Writes array to the slot of stream item index.
+
+        Returns
+        -------
+        descriptor (slot, shape, dtype) to pass to get - or None, if the array does not fit into a slot
+        """
+        if array.nbytes > self.slot_size:
+            return None
+        slot = index % len(self.names)
+        target = np.ndarray(
+            array.shape, dtype=array.dtype, buffer=self._block(slot).buf
+        )
+        target[...] = array
+        del target  # releases the buffer export
+        return slot, array.shape, array.dtype.str
+
+    def get(self, descriptor):
+        """
+        Copy of the array described by a descriptor returned by put.
+        The copy is deliberate: the slot gets written again as soon as the consumer asks for a later item,
+        while consumers (e.g. shuffling buffers) may keep arrays for longer. Copying 15 s of 16 kHz audio
+        (about 1 MB) takes about 40 microseconds - a third of just pickling and unpickling it, without any pipe transfer.
+        """
+        slot, shape, dtype = descriptor
+        source = np.ndarray(shape, dtype=dtype, buffer=self._block(slot).buf)
+        array = source.copy()
+        del source  # releases the buffer export
+        return array
+
+    def close(self):
+        for block in self.blocks:
+            if block is not None:
+                block.close()
+                if self.owner:
+                    block.unlink()
+        self.blocks = [None] * len(self.names)
+
+
+def _release_shared_memory(block):
+    block.unlink()
+    try:
+        block.close()
+    except BufferError:
+        pass  # views still exist - the mapping goes with them
+
+
+class SharedArray:
+    """
+    Read-only NumPy array in shared memory that pool workers can use without it being pickled or copied.
+    Pickling only transfers the block name, shape and dtype - workers attach to the block on unpickling.
+    The block gets unlinked once the creating instance gets garbage collected (or the process exits).
+    Before Python 3.8 (see shared_memory_supported) the array is kept in process memory instead -
+    forked workers still share its pages, but pickling copies it.
+    """
+
+    def __init__(self, arrays):
+        """
+        Parameters
+        ----------
+        arrays : list of numpy.ndarray
+            Arrays of the same dtype and trailing dimensions - the shared array is their concatenation
+            along the first axis (without any intermediate copy)
+        """
+        arrays = [np.asarray(array) for array in arrays]
+        self.shape = (sum(len(array) for array in arrays),) + arrays[0].shape[1:]
+        self.dtype = arrays[0].dtype.str
+        if not shared_memory_supported():
+            self.block = None
+            self.local_array = np.concatenate(arrays)
+            return
+        from multiprocessing import shared_memory
+
+        self.local_array = None
+        self.block = shared_memory.SharedMemory(
+            create=True,
+            size=max(1, int(np.prod(self.shape)) * arrays[0].dtype.itemsize),
+        )
+        self.name = self.block.name
+        target = np.ndarray(self.shape, dtype=self.dtype, buffer=self.block.buf)
+        offset = 0
+        for array in arrays:
+            target[offset : offset + len(array)] = array
+            offset += len(array)
+        del target  # releases the buffer export
+        weakref.finalize(self, _release_shared_memory, self.block)
+
+    def __getstate__(self):
+        if self.block is None:
+            return dict(
+                local_array=self.local_array, shape=self.shape, dtype=self.dtype
+            )
+        return dict(name=self.name, shape=self.shape, dtype=self.dtype)
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if "local_array" in state:
+            self.block = None
+            return
+        from multiprocessing import shared_memory
+
+        self.local_array = None
+        self.block = shared_memory.SharedMemory(name=self.name)
+
+    @property
+    def array(self):
+        """Read-only view of the array - should not be kept around longer than needed"""
+        if self.block is None:
+            view = self.local_array.view()
+        else:
+            view = np.ndarray(self.shape, dtype=self.dtype, buffer=self.block.buf)
+        view.flags.writeable = False
+        return view
+
+    def __len__(self):
+        return self.shape[0]
+
+
 def get_value_range(value, target_type):
     """
     This function converts all possible supplied values for augmentation
@@ -242,3 +461,53 @@ def tf_pick_value_from_range(value_range, clock=None, double_precision=False):
     if isinstance(value_range.start, int):
         return tf.cast(tf.math.round(value), tf.int64 if double_precision else tf.int32)
     return tf.cast(value, tf.float64 if double_precision else tf.float32)
+
+
+def tf_pick_values_from_range(value_range, clocks, seed):
+    """
+    Like tf_pick_value_from_range, but picks an independent value for every element of a clocks tensor
+    (e.g. one per row of a batch). All values are drawn from the same stateless seed (a tensor of shape [2]).
+    """
+    import tensorflow as tf  # pylint: disable=import-outside-toplevel
+
+    clocks = tf.clip_by_value(tf.cast(clocks, tf.float64), 0.0, 1.0)
+    values = value_range.start + clocks * (value_range.end - value_range.start)
+    values += tf.random.stateless_uniform(
+        tf.shape(clocks),
+        minval=-value_range.r,
+        maxval=value_range.r,
+        seed=seed,
+        dtype=tf.float64,
+    )
+    if isinstance(value_range.start, int):
+        return tf.cast(tf.math.round(values), tf.int32)
+    return tf.cast(values, tf.float32)
+
+
+# Batch keys of frame-budget batching encode batch index and batch size as index * range + size
+BATCH_KEY_RANGE = 1 << 20
+
+
+def pack_batches(entries, max_frames):
+    """
+    Packs consecutive (frames, entry) pairs into batches whose padded size (number of entries times frames of
+    their longest entry) does not exceed max_frames. Entries that exceed it on their own get a batch of their own.
+
+    Returns
+    -------
+    generator of the entries, each with its batch key (see BATCH_KEY_RANGE) appended
+    """
+    batch = []
+    batch_index = 0
+    batch_frames = 0
+    for frames, entry in entries:
+        if batch and (len(batch) + 1) * max(batch_frames, frames) > max_frames:
+            batch_key = batch_index * BATCH_KEY_RANGE + len(batch)
+            yield from (entry + (batch_key,) for entry in batch)
+            batch = []
+            batch_index += 1
+            batch_frames = 0
+        batch.append(entry)
+        batch_frames = max(batch_frames, frames)
+    batch_key = batch_index * BATCH_KEY_RANGE + len(batch)
+    yield from (entry + (batch_key,) for entry in batch)
@@ -63,6 +63,18 @@ def open_remote(
     )
 
 
+def rename_remote(src, dst):
+    """
+    Wrapper that renames local and remote files like `gs://...`, replacing dst if it exists.
+    Local renames are atomic - remote ones (e.g. on GCS) are not necessarily.
+    """
+    from tensorflow.io import gfile
+
+    if is_remote_path(src) or is_remote_path(dst):
+        return gfile.rename(src, dst, overwrite=True)
+    return os.replace(src, dst)
+
+
 def isdir_remote(path):
     """
     Wrapper to check if remote and local paths are directories
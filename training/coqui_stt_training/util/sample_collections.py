@@ -1,45 +1,103 @@
 # -*- coding: utf-8 -*-
+import bisect
+import collections
 import csv
+import heapq
 import io
+import itertools
 import json
+import mmap
 import os
+import queue
+import struct
 import tarfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
+from operator import itemgetter
 from pathlib import Path
 
+import numpy as np
+
 from .audio import (
+    AUDIO_TYPE_OGG_VORBIS,
     AUDIO_TYPE_OPUS,
     AUDIO_TYPE_PCM,
     SERIALIZABLE_AUDIO_TYPES,
     Sample,
     get_loadable_audio_type_from_extension,
+    read_duration,
     write_wav,
 )
-from .helpers import GIGABYTE, KILOBYTE, MEGABYTE, Interleaved, LenMap
-from .io import is_remote_path, open_remote
+from .helpers import GIGABYTE, KILOBYTE, MEGABYTE, Interleaved, LenMap, LimitingPool
+from .io import is_remote_path, open_remote, path_exists_remote
 
 
 BIG_ENDIAN = "big"
 INT_SIZE = 4
 BIGINT_SIZE = 2 * INT_SIZE
 MAGIC = b"SAMPLEDB"
+OFFSET_DTYPE = np.dtype(">u8")  # big-endian uint64 - matches BIGINT_SIZE/BIG_ENDIAN
+# Fixed-width per-sample metadata records of SDB format version 2 (appended behind the offset index)
+SAMPLE_META_DTYPE = np.dtype(
+    [
+        ("duration", ">f8"),
+        ("rate", ">u4"),
+        ("channels", ">u2"),
+        ("width", ">u2"),
+        ("transcript_len", ">u4"),
+        ("size", ">u8"),
+    ]
+)
+SAMPLE_META_STRUCT = struct.Struct(">dIHHIQ")  # same layout as SAMPLE_META_DTYPE
 
 BUFFER_SIZE = 1 * MEGABYTE
 REVERSE_BUFFER_SIZE = 16 * KILOBYTE
 CACHE_SIZE = 1 * GIGABYTE
+COALESCE_GAP = 16 * KILOBYTE
+COALESCE_SIZE = 4 * MEGABYTE
+SHARD_SIZE = 10000
+SHARD_PREFETCH = 4
+SHARD_READ_CHUNK_SIZE = 64
+SHARD_READ_QUEUE_SIZE = 4
 
 SCHEMA_KEY = "schema"
+VERSION_KEY = "version"
+SDB_VERSION = 2
+SHARDS_KEY = "shards"
+SHARD_PATH_KEY = "path"
+SHARD_SAMPLES_KEY = "samples"
+SHARD_MIN_DURATION_KEY = "min-duration"
+SHARD_MAX_DURATION_KEY = "max-duration"
 CONTENT_KEY = "content"
 MIME_TYPE_KEY = "mime-type"
 MIME_TYPE_TEXT = "text/plain"
 CONTENT_TYPE_SPEECH = "speech"
 CONTENT_TYPE_TRANSCRIPT = "transcript"
 
+CSV_INDEX_MAGIC = b"CSVINDEX"
+CSV_INDEX_VERSION = 1
+CSV_INDEX_SUFFIX = ".idx"
+CSV_INDEX_KEY = "csv"
+DURATION_DTYPE = np.dtype(">f8")
+DURATION_CACHE_SUFFIX = ".durations"
+DURATION_PROBE_CHUNK_SIZE = 256
+
+SDB_ACCESS_BUFFERED = "buffered"
+SDB_ACCESS_MMAP = "mmap"
+SDB_ACCESS_PREAD = "pread"
+SDB_ACCESS_TYPES = [SDB_ACCESS_BUFFERED, SDB_ACCESS_MMAP, SDB_ACCESS_PREAD]
+
+# Memory-mapped SDBs of the current process (see SDB.__reduce__)
+MAPPED_SDBS = {}
+
 
 class LabeledSample(Sample):
     """In-memory labeled audio sample representing an utterance.
     Derived from util.audio.Sample and used by sample collection readers and writers."""
 
+    __slots__ = ("transcript",)
+
     def __init__(
         self, audio_type, raw_data, transcript, audio_format=None, sample_id=None
     ):
@@ -121,6 +179,60 @@ def load_sample(filename, label=None):
     return PackedSample(filename, audio_type, label)
 
 
+def serialize_sample(sample, audio_type, bitrate=None, labeled=True):
+    """
+    Serializes a sample into an SDB row.
+
+    Parameters
+    ----------
+    sample : util.sample_collections.LabeledSample or util.audio.Sample
+        Sample to serialize - gets converted to audio_type in-place
+    audio_type : str
+        See util.audio.Sample.__init__ .
+    bitrate : int
+        Bitrate for sample-compression in case of lossy audio_type (e.g. AUDIO_TYPE_OPUS)
+    labeled : bool
+        If the row should contain the sample's transcript
+
+    Returns
+    -------
+    tuple of the serialized row and its packed metadata record (see SAMPLE_META_DTYPE)
+    """
+
+    def to_bytes(n):
+        return n.to_bytes(INT_SIZE, BIG_ENDIAN)
+
+    sample.change_audio_type(audio_type, bitrate=bitrate)
+    opus = sample.audio.getbuffer()
+    opus_len = to_bytes(len(opus))
+    transcript = b""
+    if labeled:
+        transcript = sample.transcript.encode()
+        transcript_len = to_bytes(len(transcript))
+        entry_len = to_bytes(
+            len(opus_len) + len(opus) + len(transcript_len) + len(transcript)
+        )
+        entry = b"".join([entry_len, opus_len, opus, transcript_len, transcript])
+    else:
+        entry_len = to_bytes(len(opus_len) + len(opus))
+        entry = b"".join([entry_len, opus_len, opus])
+    sample_meta = SAMPLE_META_STRUCT.pack(
+        read_duration(audio_type, sample.audio),
+        sample.audio_format.rate,
+        sample.audio_format.channels,
+        sample.audio_format.width,
+        len(transcript),
+        len(opus),
+    )
+    return entry, sample_meta
+
+
+def _serialize_packed_sample(sample, audio_type, bitrate=None, labeled=True):
+    return serialize_sample(
+        unpack_maybe(sample), audio_type, bitrate=bitrate, labeled=labeled
+    )
+
+
 class DirectSDBWriter:
     """Sample collection writer for creating a Sample DB (SDB) file"""
 
@@ -159,6 +271,7 @@ class DirectSDBWriter:
         self.bitrate = bitrate
         self.sdb_file = open_remote(sdb_filename, "wb", buffering=buffering)
         self.offsets = []
+        self.sample_meta = bytearray()
         self.num_samples = 0
 
         self.sdb_file.write(MAGIC)
@@ -168,7 +281,7 @@ class DirectSDBWriter:
             schema_entries.append(
                 {CONTENT_KEY: CONTENT_TYPE_TRANSCRIPT, MIME_TYPE_KEY: MIME_TYPE_TEXT}
             )
-        meta_data = {SCHEMA_KEY: schema_entries}
+        meta_data = {SCHEMA_KEY: schema_entries, VERSION_KEY: SDB_VERSION}
         meta_data = json.dumps(meta_data).encode()
         self.write_big_int(len(meta_data))
         self.sdb_file.write(meta_data)
@@ -186,27 +299,48 @@ class DirectSDBWriter:
         return self
 
     def add(self, sample):
-        def to_bytes(n):
-            return n.to_bytes(INT_SIZE, BIG_ENDIAN)
+        entry, sample_meta = serialize_sample(
+            sample, self.audio_type, bitrate=self.bitrate, labeled=self.labeled
+        )
+        sample.sample_id = self.write_entry(entry, sample_meta)
+        return sample.sample_id
 
-        sample.change_audio_type(self.audio_type, bitrate=self.bitrate)
-        opus = sample.audio.getbuffer()
-        opus_len = to_bytes(len(opus))
-        if self.labeled:
-            transcript = sample.transcript.encode()
-            transcript_len = to_bytes(len(transcript))
-            entry_len = to_bytes(
-                len(opus_len) + len(opus) + len(transcript_len) + len(transcript)
+    def add_all(self, samples, processes=None, process_ahead=None):
+        """
+        Adds samples by encoding and serializing them on a pool of worker processes.
+        Serialized samples are written in submission order as soon as they are ready.
+
+        Parameters
+        ----------
+        samples : iterable of util.sample_collections.LabeledSample, util.audio.Sample
+            or util.sample_collections.PackedSample instances
+            Samples to add - packed samples get unpacked by the workers
+        processes : int
+            Number of worker processes - defaults to the number of CPUs
+        process_ahead : int
+            Maximum number of samples that are in flight (queued, encoded or waiting to be written)
+
+        Returns
+        -------
+        Generator of the sample IDs of the written samples - samples only get written while it is consumed
+        """
+        with LimitingPool(processes=processes, process_ahead=process_ahead) as pool:
+            serialize = partial(
+                _serialize_packed_sample,
+                audio_type=self.audio_type,
+                bitrate=self.bitrate,
+                labeled=self.labeled,
             )
-            buffer = b"".join([entry_len, opus_len, opus, transcript_len, transcript])
-        else:
-            entry_len = to_bytes(len(opus_len) + len(opus))
-            buffer = b"".join([entry_len, opus_len, opus])
+            for entry, sample_meta in pool.imap(serialize, samples):
+                yield self.write_entry(entry, sample_meta)
+
+    def write_entry(self, entry, sample_meta):
         self.offsets.append(self.sdb_file.tell())
-        self.sdb_file.write(buffer)
-        sample.sample_id = "{}:{}".format(self.id_prefix, self.num_samples)
+        self.sdb_file.write(entry)
+        self.sample_meta.extend(sample_meta)
+        sample_id = "{}:{}".format(self.id_prefix, self.num_samples)
         self.num_samples += 1
-        return sample.sample_id
+        return sample_id
 
     def close(self):
         if self.sdb_file is None:
@@ -223,6 +357,11 @@ class DirectSDBWriter:
         offset_end = self.sdb_file.tell()
         self.sdb_file.seek(offset_index)
         self.write_big_int(offset_end - offset_index - BIGINT_SIZE)
+
+        self.sdb_file.seek(offset_end)
+        self.write_big_int(BIGINT_SIZE + len(self.sample_meta))
+        self.write_big_int(self.num_samples)
+        self.sdb_file.write(self.sample_meta)
         self.sdb_file.close()
         self.sdb_file = None
 
@@ -233,8 +372,57 @@ class DirectSDBWriter:
         self.close()
 
 
+class PackedSDBSample:
+    """
+    A reference to a row of a memory-mapped SDB that gets carried around instead of the sample itself.
+    Pickling it (e.g. for passing it to a pool worker) only transfers the SDB's filename and the row index.
+    The worker then reads the sample from its own (usually fork-inherited) mapping of the SDB file,
+    so all processes share the same page-cache pages and nobody has to re-read the offset index.
+    Sample ID and transcript are available without unpacking (and decoding the audio).
+    """
+
+    def __init__(self, sdb, index):
+        self.sdb = sdb
+        self.index = index
+
+    @property
+    def sample_id(self):
+        return self.sdb.sample_id(self.index)
+
+    @property
+    def transcript(self):
+        if self.sdb.transcript_index is None:
+            return None
+        [transcript] = self.sdb.read_row(self.index, self.sdb.transcript_index)
+        return str(transcript, "utf-8")
+
+    def unpack(self):
+        return self.sdb.load_sample(self.index)
+
+
+def _open_mapped_sdb(sdb_filename, id_prefix, labeled, reverse):
+    key = (sdb_filename, id_prefix, labeled, reverse)
+    if key in MAPPED_SDBS:
+        return MAPPED_SDBS[key]
+    return SDB(
+        sdb_filename,
+        id_prefix=id_prefix,
+        labeled=labeled,
+        reverse=reverse,
+        access=SDB_ACCESS_MMAP,
+    )
+
+
 class SDB:  # pylint: disable=too-many-instance-attributes
-    """Sample collection reader for reading a Sample DB (SDB) file"""
+    """
+    Sample collection reader for reading a Sample DB (SDB) file
+
+    Attributes
+    ----------
+    sample_meta : numpy.ndarray or None
+        Per-sample metadata records (see SAMPLE_META_DTYPE) in sample order - None for SDB files of format version 1.
+        Allows for inspecting sample durations, audio formats and sizes without reading any sample data.
+    """
 
     def __init__(
         self,
@@ -243,6 +431,7 @@ class SDB:  # pylint: disable=too-many-instance-attributes
         id_prefix=None,
         labeled=True,
         reverse=False,
+        access=SDB_ACCESS_BUFFERED,
     ):
         """
         Parameters
@@ -258,9 +447,34 @@ class SDB:  # pylint: disable=too-many-instance-attributes
             If False: Ignores transcripts (if available) and reads (unlabeled) util.audio.Sample instances.
             If None: Automatically determines if SDB schema has transcripts
             (reading util.sample_collections.LabeledSample instances) or not (reading util.audio.Sample instances).
+        reverse : bool
+            If the order of the samples should be reversed
+        access : str
+            How to access the SDB file:
+                - SDB_ACCESS_BUFFERED: Reads through a (buffered) file object. Supports remote files.
+                - SDB_ACCESS_MMAP: Memory-maps the (local) SDB file. The offset index is kept as a NumPy view
+                    onto the mapping, rows are returned as memoryview slices of it and item access returns
+                    util.sample_collections.PackedSDBSample instances that get unpacked by their consumers.
+                - SDB_ACCESS_PREAD: Reads rows of the (local) SDB file by positional reads (os.pread).
+                    Does not share a file position, so one instance can be read from several threads at once.
         """
+        if access not in SDB_ACCESS_TYPES:
+            raise ValueError('SDB access type "{}" not supported'.format(access))
+        if access == SDB_ACCESS_PREAD and not hasattr(os, "pread"):
+            raise ValueError(
+                'SDB access type "{}" not supported on this platform'.format(access)
+            )
+        if access != SDB_ACCESS_BUFFERED and is_remote_path(sdb_filename):
+            raise ValueError(
+                'SDB access type "{}" requires a local file'.format(access)
+            )
         self.sdb_filename = sdb_filename
         self.id_prefix = sdb_filename if id_prefix is None else id_prefix
+        self.labeled = labeled
+        self.reverse = reverse
+        self.access = access
+        self.mmap = None
+        self.view = None
         self.sdb_file = open_remote(
             sdb_filename, "rb", buffering=REVERSE_BUFFER_SIZE if reverse else buffering
         )
@@ -272,6 +486,7 @@ class SDB:  # pylint: disable=too-many-instance-attributes
         if SCHEMA_KEY not in self.meta:
             raise RuntimeError("Missing schema")
         self.schema = self.meta[SCHEMA_KEY]
+        self.version = self.meta.get(VERSION_KEY, 1)
 
         speech_columns = self.find_columns(
             content=CONTENT_TYPE_SPEECH, mime_type=SERIALIZABLE_AUDIO_TYPES
@@ -293,12 +508,51 @@ class SDB:  # pylint: disable=too-many-instance-attributes
                     raise RuntimeError("No transcript data (missing in schema)")
 
         sample_chunk_len = self.read_big_int()
+        self.data_end = self.sdb_file.tell() + sample_chunk_len
         self.sdb_file.seek(sample_chunk_len + BIGINT_SIZE, 1)
         num_samples = self.read_big_int()
-        for _ in range(num_samples):
-            self.offsets.append(self.read_big_int())
-        if reverse:
-            self.offsets.reverse()
+        sample_meta_position = self.sdb_file.tell() + num_samples * BIGINT_SIZE
+        self.sample_meta = None
+        if access == SDB_ACCESS_MMAP:
+            self.mmap = mmap.mmap(self.sdb_file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.view = memoryview(self.mmap)
+            self.offsets = np.frombuffer(
+                self.mmap,
+                dtype=OFFSET_DTYPE,
+                count=num_samples,
+                offset=self.sdb_file.tell(),
+            )
+            if self.version >= 2:
+                self.sample_meta = np.frombuffer(
+                    self.mmap,
+                    dtype=SAMPLE_META_DTYPE,
+                    count=num_samples,
+                    offset=sample_meta_position + 2 * BIGINT_SIZE,
+                )
+            if reverse:
+                self.offsets = self.offsets[::-1]
+                if self.sample_meta is not None:
+                    self.sample_meta = self.sample_meta[::-1]
+            # The mapping stays valid without the file object
+            self.sdb_file.close()
+            self.sdb_file = None
+            MAPPED_SDBS[self.mapping_key()] = self
+        else:
+            for _ in range(num_samples):
+                self.offsets.append(self.read_big_int())
+            if self.version >= 2:
+                self.sdb_file.seek(sample_meta_position + 2 * BIGINT_SIZE)
+                self.sample_meta = np.frombuffer(
+                    self.sdb_file.read(num_samples * SAMPLE_META_DTYPE.itemsize),
+                    dtype=SAMPLE_META_DTYPE,
+                )
+            if reverse:
+                self.offsets.reverse()
+                if self.sample_meta is not None:
+                    self.sample_meta = self.sample_meta[::-1]
+
+    def mapping_key(self):
+        return self.sdb_filename, self.id_prefix, self.labeled, self.reverse
 
     def read_int(self):
         return int.from_bytes(self.sdb_file.read(INT_SIZE), BIG_ENDIAN)
@@ -328,16 +582,35 @@ class SDB:  # pylint: disable=too-many-instance-attributes
                 matches.append(index)
         return matches
 
-    def read_row(self, row_index, *columns):
-        columns = list(columns)
-        column_data = [None] * len(columns)
-        found = 0
+    def check_row_index(self, row_index):
         if not 0 <= row_index < len(self.offsets):
             raise ValueError(
                 "Wrong sample index: {} - has to be between 0 and {}".format(
                     row_index, len(self.offsets) - 1
                 )
             )
+
+    def row_end(self, row_index):
+        """Returns the file position behind the given row.
+        Relies on rows being stored in index order, as done by DirectSDBWriter."""
+        next_index = row_index - 1 if self.reverse else row_index + 1
+        if 0 <= next_index < len(self.offsets):
+            return int(self.offsets[next_index])
+        return self.data_end
+
+    def read_row(self, row_index, *columns):
+        columns = list(columns)
+        column_data = [None] * len(columns)
+        found = 0
+        self.check_row_index(row_index)
+        if self.view is not None:
+            return self.parse_row(self.view, int(self.offsets[row_index]), columns)
+        if self.access == SDB_ACCESS_PREAD:
+            row_start = int(self.offsets[row_index])
+            row_data = os.pread(
+                self.sdb_file.fileno(), self.row_end(row_index) - row_start, row_start
+            )
+            return self.parse_row(memoryview(row_data), 0, columns)
         self.sdb_file.seek(self.offsets[row_index] + INT_SIZE)
         for index in range(len(self.schema)):
             chunk_len = self.read_int()
@@ -350,19 +623,109 @@ class SDB:  # pylint: disable=too-many-instance-attributes
                 self.sdb_file.seek(chunk_len, 1)
         return tuple(column_data)
 
-    def __getitem__(self, i):
-        sample_id = "{}:{}".format(self.id_prefix, i)
+    def read_rows(self, row_indices, *columns):
+        """
+        Reads the given columns of several rows at once.
+        Requested rows are sorted by their file positions and neighbouring rows are read in one go.
+
+        Parameters
+        ----------
+        row_indices : list of int
+            Indices of the rows to read (in any order, repetitions allowed)
+        columns : int
+            Indices of the columns to read
+
+        Returns
+        -------
+        list of tuples of column data - one tuple per requested row in the order of row_indices
+        """
+        columns = list(columns)
+        rows = [None] * len(row_indices)
+        extents = []
+        for request_index, row_index in enumerate(row_indices):
+            self.check_row_index(row_index)
+            extents.append(
+                (int(self.offsets[row_index]), self.row_end(row_index), request_index)
+            )
+        extents.sort()
+        group = []
+        for extent in extents:
+            if group and (
+                extent[0] - group[-1][1] > COALESCE_GAP
+                or extent[1] - group[0][0] > COALESCE_SIZE
+            ):
+                self.read_row_group(group, columns, rows)
+                group = []
+            group.append(extent)
+        if group:
+            self.read_row_group(group, columns, rows)
+        return rows
+
+    def read_row_group(self, extents, columns, rows):
+        group_start = extents[0][0]
+        group_end = max(extent[1] for extent in extents)
+        if self.view is not None:
+            group_view, group_start = self.view, 0
+        elif self.access == SDB_ACCESS_PREAD:
+            group_view = memoryview(
+                os.pread(self.sdb_file.fileno(), group_end - group_start, group_start)
+            )
+        else:
+            self.sdb_file.seek(group_start)
+            group_view = memoryview(self.sdb_file.read(group_end - group_start))
+        for row_start, _, request_index in extents:
+            rows[request_index] = self.parse_row(
+                group_view, row_start - group_start, columns
+            )
+
+    def parse_row(self, view, position, columns):
+        column_data = [None] * len(columns)
+        found = 0
+        position += INT_SIZE
+        for index in range(len(self.schema)):
+            chunk_len = int.from_bytes(view[position : position + INT_SIZE], BIG_ENDIAN)
+            position += INT_SIZE
+            if index in columns:
+                column_data[columns.index(index)] = view[
+                    position : position + chunk_len
+                ]
+                found += 1
+                if found == len(columns):
+                    break
+            position += chunk_len
+        return tuple(column_data)
+
+    def row_columns(self):
         if self.transcript_index is None:
-            [audio_data] = self.read_row(i, self.speech_index)
+            return [self.speech_index]
+        return [self.speech_index, self.transcript_index]
+
+    def sample_id(self, i):
+        return "{}:{}".format(self.id_prefix, i)
+
+    def sample_from_row(self, i, row):
+        sample_id = self.sample_id(i)
+        if self.transcript_index is None:
+            [audio_data] = row
             return Sample(self.audio_type, audio_data, sample_id=sample_id)
-        audio_data, transcript = self.read_row(
-            i, self.speech_index, self.transcript_index
-        )
-        transcript = transcript.decode()
+        audio_data, transcript = row
+        transcript = str(transcript, "utf-8")
         return LabeledSample(
             self.audio_type, audio_data, transcript, sample_id=sample_id
         )
 
+    def load_sample(self, i):
+        return self.sample_from_row(i, self.read_row(i, *self.row_columns()))
+
+    def load_samples(self, indices):
+        rows = self.read_rows(indices, *self.row_columns())
+        return [self.sample_from_row(i, row) for i, row in zip(indices, rows)]
+
+    def __getitem__(self, i):
+        if self.mmap is not None:
+            return PackedSDBSample(self, i)
+        return self.load_sample(i)
+
     def __iter__(self):
         for i in range(len(self.offsets)):
             yield self[i]
@@ -370,14 +733,288 @@ class SDB:  # pylint: disable=too-many-instance-attributes
     def __len__(self):
         return len(self.offsets)
 
+    def __reduce__(self):
+        if self.mmap is None:
+            raise TypeError("Only memory-mapped SDBs can be pickled")
+        return _open_mapped_sdb, self.mapping_key()
+
     def close(self):
         if self.sdb_file is not None:
             self.sdb_file.close()
+            self.sdb_file = None
+        if self.mmap is not None:
+            if MAPPED_SDBS.get(self.mapping_key()) is self:
+                del MAPPED_SDBS[self.mapping_key()]
+            self.offsets = []
+            self.view.release()
+            self.view = None
+            try:
+                self.mmap.close()
+            except BufferError:
+                # Rows are still referenced - mapping gets released together with them
+                pass
+            self.mmap = None
 
     def __del__(self):
         self.close()
 
 
+class ShardedSDBWriter(DirectSDBWriter):
+    """
+    Sample collection writer for creating a sharded Sample DB - a series of SDB files (shards)
+    plus a JSON manifest that lists them with their sample counts and duration ranges.
+    Shards are named after the manifest file and placed next to it.
+    """
+
+    def __init__(  # pylint: disable=super-init-not-called
+        self,
+        manifest_filename,
+        shard_size=SHARD_SIZE,
+        buffering=BUFFER_SIZE,
+        audio_type=AUDIO_TYPE_OPUS,
+        bitrate=None,
+        id_prefix=None,
+        labeled=True,
+    ):
+        """
+        Parameters
+        ----------
+        manifest_filename : str
+            Path to the manifest file to write (typically with extension .sdbs)
+        shard_size : int
+            Number of samples per shard
+        buffering : int
+            See util.sample_collections.DirectSDBWriter.__init__ .
+        audio_type : str
+            See util.audio.Sample.__init__ .
+        bitrate : int
+            See util.sample_collections.DirectSDBWriter.__init__ .
+        id_prefix : str
+            Prefix for IDs of written samples - defaults to manifest_filename
+        labeled : bool or None
+            See util.sample_collections.DirectSDBWriter.__init__ .
+        """
+        if audio_type not in SERIALIZABLE_AUDIO_TYPES:
+            raise ValueError('Audio type "{}" not supported'.format(audio_type))
+        if shard_size < 1:
+            raise ValueError("Shard size has to be positive")
+        self.manifest_filename = manifest_filename
+        self.id_prefix = manifest_filename if id_prefix is None else id_prefix
+        self.shard_size = shard_size
+        self.buffering = buffering
+        self.audio_type = audio_type
+        self.bitrate = bitrate
+        self.labeled = labeled
+        self.shards = []
+        self.shard_writer = None
+        self.num_samples = 0
+
+    def write_entry(self, entry, sample_meta):
+        if self.shard_writer is None:
+            shard_filename = "{}.{:05d}.sdb".format(
+                os.path.splitext(os.path.basename(self.manifest_filename))[0],
+                len(self.shards),
+            )
+            self.shard_writer = DirectSDBWriter(
+                os.path.join(os.path.dirname(self.manifest_filename), shard_filename),
+                buffering=self.buffering,
+                audio_type=self.audio_type,
+                bitrate=self.bitrate,
+                labeled=self.labeled,
+            )
+            self.shards.append(
+                {
+                    SHARD_PATH_KEY: shard_filename,
+                    SHARD_SAMPLES_KEY: 0,
+                    SHARD_MIN_DURATION_KEY: None,
+                    SHARD_MAX_DURATION_KEY: None,
+                }
+            )
+        self.shard_writer.write_entry(entry, sample_meta)
+        duration = SAMPLE_META_STRUCT.unpack(sample_meta)[0]
+        shard = self.shards[-1]
+        shard[SHARD_SAMPLES_KEY] += 1
+        if shard[SHARD_MIN_DURATION_KEY] is None:
+            shard[SHARD_MIN_DURATION_KEY] = duration
+            shard[SHARD_MAX_DURATION_KEY] = duration
+        else:
+            shard[SHARD_MIN_DURATION_KEY] = min(shard[SHARD_MIN_DURATION_KEY], duration)
+            shard[SHARD_MAX_DURATION_KEY] = max(shard[SHARD_MAX_DURATION_KEY], duration)
+        if shard[SHARD_SAMPLES_KEY] >= self.shard_size:
+            self.shard_writer.close()
+            self.shard_writer = None
+        sample_id = "{}:{}".format(self.id_prefix, self.num_samples)
+        self.num_samples += 1
+        return sample_id
+
+    def close(self):
+        if self.shards is None:
+            return
+        if self.shard_writer is not None:
+            self.shard_writer.close()
+            self.shard_writer = None
+        with open_remote(
+            self.manifest_filename, "w", encoding="utf-8"
+        ) as manifest_file:
+            json.dump({SHARDS_KEY: self.shards}, manifest_file, indent=2)
+        self.shards = None
+
+    def __len__(self):
+        return self.num_samples
+
+
+class ShardedSDB:
+    """
+    Sample collection reader for reading a sharded Sample DB (see util.sample_collections.ShardedSDBWriter).
+    Provides a global length and sample index over all shards.
+    Iteration reads several upcoming shards concurrently (each one by its own thread).
+    """
+
+    def __init__(
+        self,
+        manifest_filename,
+        buffering=BUFFER_SIZE,
+        labeled=True,
+        reverse=False,
+        access=SDB_ACCESS_BUFFERED,
+        prefetch=SHARD_PREFETCH,
+    ):
+        """
+        Parameters
+        ----------
+        manifest_filename : str
+            Path to the manifest file of the sharded SDB
+        buffering : int
+            See util.sample_collections.SDB.__init__ .
+        labeled : bool or None
+            See util.sample_collections.SDB.__init__ .
+        reverse : bool
+            If the order of the samples should be reversed
+        access : str
+            See util.sample_collections.SDB.__init__ .
+        prefetch : int
+            Number of shards that are read concurrently during iteration
+        """
+        with open_remote(manifest_filename, "r", encoding="utf-8") as manifest_file:
+            manifest = json.load(manifest_file)
+        if SHARDS_KEY not in manifest:
+            raise RuntimeError("No sharded Sample Database manifest")
+        self.manifest_filename = manifest_filename
+        self.buffering = buffering
+        self.labeled = labeled
+        self.reverse = reverse
+        self.access = access
+        self.prefetch = max(1, prefetch)
+        self.shards = manifest[SHARDS_KEY]
+        if reverse:
+            self.shards.reverse()
+        self.shard_ends = list(
+            itertools.accumulate(shard[SHARD_SAMPLES_KEY] for shard in self.shards)
+        )
+        self.opened_shards = {}
+        self.lock = threading.Lock()
+
+    def open_shard(self, shard_index):
+        with self.lock:
+            if shard_index not in self.opened_shards:
+                self.opened_shards[shard_index] = SDB(
+                    os.path.join(
+                        os.path.dirname(self.manifest_filename),
+                        self.shards[shard_index][SHARD_PATH_KEY],
+                    ),
+                    buffering=self.buffering,
+                    labeled=self.labeled,
+                    reverse=self.reverse,
+                    access=self.access,
+                )
+            return self.opened_shards[shard_index]
+
+    def locate(self, i):
+        """Returns shard index and index within that shard for global sample index i"""
+        if not 0 <= i < len(self):
+            raise ValueError(
+                "Wrong sample index: {} - has to be between 0 and {}".format(
+                    i, len(self) - 1
+                )
+            )
+        shard_index = bisect.bisect_right(self.shard_ends, i)
+        shard_start = self.shard_ends[shard_index - 1] if shard_index > 0 else 0
+        return shard_index, i - shard_start
+
+    def __getitem__(self, i):
+        shard_index, index = self.locate(i)
+        return self.open_shard(shard_index)[index]
+
+    def read_shard(self, shard_index, output, stop):
+        try:
+            shard = self.open_shard(shard_index)
+            for start in range(0, len(shard), SHARD_READ_CHUNK_SIZE):
+                indices = range(start, min(len(shard), start + SHARD_READ_CHUNK_SIZE))
+                if shard.mmap is None:
+                    chunk = shard.load_samples(list(indices))
+                else:
+                    chunk = [shard[index] for index in indices]
+                if not put_unless_stopped(output, chunk, stop):
+                    return
+        except Exception as ex:  # pylint: disable=broad-except
+            put_unless_stopped(output, ex, stop)
+        else:
+            put_unless_stopped(output, None, stop)
+        finally:
+            with self.lock:
+                read_shard = self.opened_shards.pop(shard_index, None)
+            # Packed samples of memory-mapped shards still require their mapping
+            if read_shard is not None and read_shard.mmap is None:
+                read_shard.close()
+
+    def __iter__(self):
+        stop = threading.Event()
+        pending = collections.deque()
+        shard_indices = iter(range(len(self.shards)))
+        with ThreadPoolExecutor(max_workers=self.prefetch) as executor:
+            try:
+                while True:
+                    while len(pending) < self.prefetch:
+                        shard_index = next(shard_indices, None)
+                        if shard_index is None:
+                            break
+                        output = queue.Queue(SHARD_READ_QUEUE_SIZE)
+                        executor.submit(self.read_shard, shard_index, output, stop)
+                        pending.append(output)
+                    if not pending:
+                        return
+                    output = pending.popleft()
+                    while True:
+                        chunk = output.get()
+                        if chunk is None:
+                            break
+                        if isinstance(chunk, Exception):
+                            raise chunk
+                        yield from chunk
+            finally:
+                stop.set()
+
+    def __len__(self):
+        return self.shard_ends[-1] if self.shard_ends else 0
+
+    def close(self):
+        with self.lock:
+            for shard in self.opened_shards.values():
+                shard.close()
+            self.opened_shards = {}
+
+
+def put_unless_stopped(output, item, stop):
+    """Puts item into a bounded queue unless (or until) the stop event gets set"""
+    while not stop.is_set():
+        try:
+            output.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
 class CSVWriter:  # pylint: disable=too-many-instance-attributes
     """Sample collection writer for writing a CSV data-set and all its referenced WAV samples"""
 
@@ -517,11 +1154,361 @@ class TarWriter:  # pylint: disable=too-many-instance-attributes
         self.close()
 
 
+class CSVIndex:
+    """Memory-mapped binary sidecar index of a CSV sample collection (see CSV.__init__).
+    Holds the file sizes, both sorted sample orders and (optionally) the sorted sample durations as NumPy arrays
+    and the (resolved) audio paths and transcripts as offset-indexed UTF-8 blobs.
+    Samples are ordered by their durations, if the index has them, or by their file sizes otherwise."""
+
+    def __init__(self, index_filename, reverse=False):
+        """
+        Parameters
+        ----------
+        index_filename : str
+            Path to the index file
+        reverse : bool
+            If the order of the samples should be reversed
+        """
+        with open(index_filename, "rb") as index_file:
+            self.mmap = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if self.mmap[: len(CSV_INDEX_MAGIC)] != CSV_INDEX_MAGIC:
+                raise RuntimeError("No CSV index file: {}".format(index_filename))
+            position = len(CSV_INDEX_MAGIC)
+            header_len = int.from_bytes(
+                self.mmap[position : position + BIGINT_SIZE], BIG_ENDIAN
+            )
+            position += BIGINT_SIZE
+            self.header = json.loads(
+                self.mmap[position : position + header_len].decode()
+            )
+            if self.header.get(VERSION_KEY) != CSV_INDEX_VERSION:
+                raise RuntimeError(
+                    "Unsupported CSV index version: {}".format(index_filename)
+                )
+            position += header_len
+            num_samples = self.header["count"]
+            self.has_transcripts = self.header["transcripts"]
+
+            def next_array(count, dtype=OFFSET_DTYPE):
+                nonlocal position
+                array = np.frombuffer(
+                    self.mmap, dtype=dtype, count=count, offset=position
+                )
+                position += count * dtype.itemsize
+                return array
+
+            self.sizes = next_array(num_samples)
+            self.order = next_array(num_samples)
+            self.reverse_order = next_array(num_samples)
+            if reverse:
+                self.order, self.reverse_order = self.reverse_order, self.order
+            self.path_offsets = next_array(num_samples + 1)
+            self.transcript_offsets = (
+                next_array(num_samples + 1) if self.has_transcripts else None
+            )
+            # Ascending - reversing it equals the durations in reverse order, as ties have equal durations
+            self.durations = (
+                next_array(num_samples, dtype=DURATION_DTYPE)
+                if self.header["durations"]
+                else None
+            )
+            if reverse and self.durations is not None:
+                self.durations = self.durations[::-1]
+            # Blob offsets are relative to the start of their blob
+            self.paths_start = position
+            self.transcripts_start = position + int(self.path_offsets[-1])
+        except Exception:
+            self.close()
+            raise
+
+    def key(self):
+        return self.header[CSV_INDEX_KEY]
+
+    def __getitem__(self, i):
+        j = int(self.order[i])
+        path = self._read_string(self.paths_start, self.path_offsets, j)
+        size = int(self.sizes[j])
+        if self.has_transcripts:
+            transcript = self._read_string(
+                self.transcripts_start, self.transcript_offsets, j
+            )
+            return path, size, transcript
+        return path, size
+
+    def _read_string(self, start, offsets, j):
+        return self.mmap[start + int(offsets[j]) : start + int(offsets[j + 1])].decode()
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def close(self):
+        # Releases the NumPy views before the mapping itself
+        self.sizes = self.order = self.reverse_order = None
+        self.path_offsets = self.transcript_offsets = self.durations = None
+        try:
+            self.mmap.close()
+        except BufferError:
+            pass  # views still referenced elsewhere - mapping gets closed on garbage collection
+
+
+def csv_index_key(csv_filename):
+    stat = os.stat(csv_filename)
+    return [os.path.abspath(csv_filename), stat.st_size, stat.st_mtime_ns]
+
+
+def read_csv_rows(csv_filename):
+    """
+    Parses a Coqui STT CSV file.
+
+    Parameters
+    ----------
+    csv_filename : str
+        Path to the CSV file
+
+    Returns
+    -------
+    tuple of a bool that tells if the CSV file has a transcript column
+        and a list of (audio path, file size, transcript or None) tuples in CSV order
+    """
+    rows = []
+    with open_remote(csv_filename, "r", encoding="utf8") as csv_file:
+        reader = csv.DictReader(csv_file)
+        has_transcripts = "transcript" in reader.fieldnames
+        for row in reader:
+            wav_filename = Path(row["wav_filename"])
+            if not wav_filename.is_absolute() and not is_remote_path(
+                row["wav_filename"]
+            ):
+                wav_filename = Path(csv_filename).parent / wav_filename
+                wav_filename = str(wav_filename)
+            else:
+                # Pathlib otherwise removes a / from filenames like hdfs://
+                wav_filename = row["wav_filename"]
+            wav_filesize = int(row["wav_filesize"]) if "wav_filesize" in row else 0
+            transcript = row["transcript"] if has_transcripts else None
+            rows.append((wav_filename, wav_filesize, transcript))
+    return has_transcripts, rows
+
+
+def write_csv_index(index_filename, key, has_transcripts, rows, durations=None):
+    """
+    Writes the binary sidecar index of a CSV file (see CSVIndex).
+    The index is written to a temporary file first and then atomically moved into place,
+    so that concurrently starting processes never see a partial index.
+
+    Parameters
+    ----------
+    index_filename : str
+        Path to the index file
+    key : list
+        Identity of the indexed CSV file - see csv_index_key
+    has_transcripts : bool
+        If the rows contain transcripts
+    rows : list of tuple
+        Parsed CSV rows - see read_csv_rows
+    durations : list of float or None
+        Audio durations of the rows - if provided, samples get ordered by them instead of by their file sizes
+    """
+    sizes = np.array([row[1] for row in rows], dtype=np.int64)
+    keys = sizes if durations is None else np.array(durations, dtype=np.float64)
+    # Stable sorts - same order as list.sort(key=..., reverse=...) in both directions
+    order = np.argsort(keys, kind="stable")
+    reverse_order = np.argsort(-keys, kind="stable")
+
+    def blob(strings):
+        offsets = np.zeros(len(rows) + 1, dtype=OFFSET_DTYPE)
+        encoded = [s.encode() for s in strings]
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        return offsets, b"".join(encoded)
+
+    path_offsets, paths = blob(row[0] for row in rows)
+    header = json.dumps(
+        {
+            VERSION_KEY: CSV_INDEX_VERSION,
+            CSV_INDEX_KEY: key,
+            "count": len(rows),
+            "transcripts": has_transcripts,
+            "durations": durations is not None,
+        }
+    ).encode()
+    tmp_filename = "{}.{}.tmp".format(index_filename, os.getpid())
+    try:
+        with open(tmp_filename, "wb") as index_file:
+            index_file.write(CSV_INDEX_MAGIC)
+            index_file.write(len(header).to_bytes(BIGINT_SIZE, BIG_ENDIAN))
+            index_file.write(header)
+            for array in [sizes, order, reverse_order, path_offsets]:
+                index_file.write(array.astype(OFFSET_DTYPE).tobytes())
+            if has_transcripts:
+                transcript_offsets, transcripts = blob(row[2] for row in rows)
+                index_file.write(transcript_offsets.tobytes())
+            if durations is not None:
+                index_file.write(keys[order].astype(DURATION_DTYPE).tobytes())
+            index_file.write(paths)
+            if has_transcripts:
+                index_file.write(transcripts)
+        os.replace(tmp_filename, index_filename)
+    finally:
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+
+
+def open_csv_index(csv_filename, reverse=False, durations=False):
+    """
+    Opens the binary sidecar index of a local CSV file, if it exists and still matches the CSV file's size and
+    modification time.
+
+    Parameters
+    ----------
+    csv_filename : str
+        Path to the CSV file
+    reverse : bool
+        If the order of the samples should be reversed
+    durations : bool
+        If the index is required to order samples by their durations (instead of by their file sizes)
+
+    Returns
+    -------
+    CSVIndex or None, if there is no valid index
+    """
+    index_filename = csv_filename + CSV_INDEX_SUFFIX
+    if not os.path.isfile(index_filename):
+        return None
+    try:
+        index = CSVIndex(index_filename, reverse=reverse)
+    except (RuntimeError, ValueError, KeyError):
+        return None
+    if index.key() != csv_index_key(csv_filename) or durations != (
+        index.durations is not None
+    ):
+        index.close()
+        return None
+    return index
+
+
+class DurationCache:
+    """Persistent cache of audio file durations, keyed by file path, size and modification time.
+    Entries are kept in a CSV file (columns path, size, mtime, duration) that only ever gets appended to.
+    Later entries of a path replace earlier ones."""
+
+    def __init__(self, cache_filename):
+        """
+        Parameters
+        ----------
+        cache_filename : str or None
+            Path to the cache file - if None, durations are only cached in memory
+        """
+        self.cache_filename = cache_filename
+        self.entries = {}
+        self.new_entries = []
+        if cache_filename is not None and os.path.isfile(cache_filename):
+            with open(cache_filename, "r", encoding="utf8", newline="") as cache_file:
+                for path, size, mtime, duration in csv.reader(cache_file):
+                    self.entries[path] = (int(size), int(mtime), float(duration))
+
+    def get(self, path):
+        return self.entries.get(path)
+
+    def put(self, path, entry):
+        if self.entries.get(path) != entry:
+            self.entries[path] = entry
+            self.new_entries.append((path, *entry))
+
+    def save(self):
+        if self.cache_filename is None or len(self.new_entries) == 0:
+            return
+        # A single write per save keeps appends of concurrent processes from interleaving mid-line
+        content = io.StringIO()
+        csv.writer(content).writerows(self.new_entries)
+        with open(self.cache_filename, "a", encoding="utf8", newline="") as cache_file:
+            cache_file.write(content.getvalue())
+        self.new_entries = []
+
+
+def probe_duration(filename):
+    """
+    Reads the duration of an audio file from its header (or from its container metadata).
+
+    Parameters
+    ----------
+    filename : str
+        Path to the audio file
+
+    Returns
+    -------
+    float - audio duration in seconds
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    audio_type = get_loadable_audio_type_from_extension(ext)
+    if audio_type is None:
+        raise ValueError('Unknown audio type extension "{}"'.format(ext))
+    if audio_type != AUDIO_TYPE_OGG_VORBIS and not is_remote_path(filename):
+        return read_duration(audio_type, filename)
+    with open_remote(filename, "rb") as audio_file:
+        return read_duration(audio_type, io.BytesIO(audio_file.read()))
+
+
+def _probe_durations(paths_and_entries):
+    entries = []
+    for path, entry in paths_and_entries:
+        if is_remote_path(path):
+            size, mtime = -1, -1  # no cheap stat for remote files - cached by path only
+        else:
+            stat = os.stat(path)
+            size, mtime = stat.st_size, stat.st_mtime_ns
+        if entry is None or entry[:2] != (size, mtime):
+            entry = (size, mtime, probe_duration(path))
+        entries.append(entry)
+    return entries
+
+
+def probe_durations(paths, cache_filename=None, processes=None):
+    """
+    Determines the audio durations of a list of audio files in parallel.
+    Files whose size and modification time match their duration cache entry are not probed again.
+
+    Parameters
+    ----------
+    paths : list of str
+        Paths to the audio files
+    cache_filename : str or None
+        Path to the duration cache file - see DurationCache
+    processes : int or None
+        Number of probing processes (defaults to the number of CPUs)
+
+    Returns
+    -------
+    list of float - audio durations in seconds
+    """
+    cache = DurationCache(cache_filename)
+    chunks = (
+        [(path, cache.get(path)) for path in paths[i : i + DURATION_PROBE_CHUNK_SIZE]]
+        for i in range(0, len(paths), DURATION_PROBE_CHUNK_SIZE)
+    )
+    durations = []
+    with LimitingPool(processes=processes) as pool:
+        for entries in pool.imap(_probe_durations, chunks):
+            for entry in entries:
+                cache.put(paths[len(durations)], entry)
+                durations.append(entry[2])
+    cache.save()
+    return durations
+
+
 class CSV:
     """Sample collection reader for reading a Coqui STT CSV file
-    Automatically orders samples by CSV column wav_filesize (if available)."""
+    Automatically orders samples by CSV column wav_filesize (if available) or by their probed audio durations."""
 
-    def __init__(self, csv_filename, labeled=None, reverse=False):
+    def __init__(
+        self,
+        csv_filename,
+        labeled=None,
+        reverse=False,
+        index_cache=False,
+        order_by_duration=False,
+        duration_cache=None,
+    ):
         """
         Parameters
         ----------
@@ -534,33 +1521,64 @@ class CSV:
             (reading util.sample_collections.LabeledSample instances) or not (reading util.audio.Sample instances).
         reverse : bool
             If the order of the samples should be reversed
+        index_cache : bool
+            If the parsed and sorted CSV rows should be kept in a binary sidecar index file "<csv_filename>.idx".
+            Later instances just memory-map it (instead of parsing the CSV file again) as long as the CSV file's
+            size and modification time stay the same. Ignored for remote CSV files.
+        order_by_duration : bool
+            If samples should be ordered by their actual audio durations instead of by CSV column wav_filesize.
+            Durations get probed from the audio file headers in parallel and are provided as attribute durations.
+        duration_cache : str or None
+            Path to the duration cache file used by order_by_duration - see DurationCache.
+            If None: "<csv_filename>.durations" for local CSV files and no persistent cache for remote ones.
         """
-        rows = []
-        with open_remote(csv_filename, "r", encoding="utf8") as csv_file:
-            reader = csv.DictReader(csv_file)
-            if "transcript" in reader.fieldnames:
-                if labeled is None:
-                    labeled = True
-            elif labeled:
-                raise RuntimeError("No transcript data (missing CSV column)")
-            for row in reader:
-                wav_filename = Path(row["wav_filename"])
-                if not wav_filename.is_absolute() and not is_remote_path(
-                    row["wav_filename"]
-                ):
-                    wav_filename = Path(csv_filename).parent / wav_filename
-                    wav_filename = str(wav_filename)
-                else:
-                    # Pathlib otherwise removes a / from filenames like hdfs://
-                    wav_filename = row["wav_filename"]
-                wav_filesize = int(row["wav_filesize"]) if "wav_filesize" in row else 0
-                if labeled:
-                    rows.append((wav_filename, wav_filesize, row["transcript"]))
-                else:
-                    rows.append((wav_filename, wav_filesize))
+        index = None
+        durations = None
+        index_cache = index_cache and not is_remote_path(csv_filename)
+        if index_cache:
+            index = open_csv_index(
+                csv_filename, reverse=reverse, durations=order_by_duration
+            )
+        if index is None:
+            has_transcripts, rows = read_csv_rows(csv_filename)
+            if order_by_duration:
+                if duration_cache is None and not is_remote_path(csv_filename):
+                    duration_cache = csv_filename + DURATION_CACHE_SUFFIX
+                durations = probe_durations(
+                    [row[0] for row in rows], cache_filename=duration_cache
+                )
+            if index_cache:
+                try:
+                    index_filename = csv_filename + CSV_INDEX_SUFFIX
+                    write_csv_index(
+                        index_filename,
+                        csv_index_key(csv_filename),
+                        has_transcripts,
+                        rows,
+                        durations=durations,
+                    )
+                    index = CSVIndex(index_filename, reverse=reverse)
+                except OSError:
+                    pass  # e.g. read-only dataset directory - keep the parsed rows
+        if index is not None:
+            has_transcripts = index.has_transcripts
+        if has_transcripts:
+            if labeled is None:
+                labeled = True
+        elif labeled:
+            raise RuntimeError("No transcript data (missing CSV column)")
         self.labeled = labeled
-        self.samples = rows
-        self.samples.sort(key=lambda s: s[1], reverse=reverse)
+        if index is not None:
+            self.samples = index
+            self.durations = index.durations
+        elif durations is not None:
+            order = sorted(range(len(rows)), key=durations.__getitem__, reverse=reverse)
+            self.samples = [rows[i] for i in order]
+            self.durations = [durations[i] for i in order]
+        else:
+            rows.sort(key=lambda s: s[1], reverse=reverse)
+            self.samples = rows
+            self.durations = None
 
     def __getitem__(self, i):
         sample_spec = self.samples[i]
@@ -568,82 +1586,224 @@ class CSV:
             sample_spec[0], label=sample_spec[2] if self.labeled else None
         )
 
+    def transcripts(self):
+        """Yields (audio path, transcript) pairs of all samples (in sample order) - without loading any audio"""
+        if not self.labeled:
+            raise RuntimeError("CSV file is read unlabeled")
+        for sample_spec in self.samples:
+            yield sample_spec[0], sample_spec[2]
+
     def __len__(self):
         return len(self.samples)
 
 
+class PackedWebDatasetSample:
+    """Raw WebDataset sample (file extensions mapped to file contents) as read from a tar shard.
+    Audio type detection and sample construction are deferred to unpack(),
+    so that they happen on the (parallel) workers that unpack samples.
+    Sample ID and transcript are available without unpacking."""
+
+    def __init__(self, raw_sample, labeled=None):
+        self.raw_sample = raw_sample
+        self.labeled = labeled
+
+    @property
+    def sample_id(self):
+        return self.raw_sample["__key__"]
+
+    @property
+    def transcript(self):
+        if self.labeled is False or "txt" not in self.raw_sample:
+            return None
+        return self.raw_sample["txt"].decode("utf8")
+
+    def unpack(self):
+        detected_audio_type = None
+        raw_audio_data = None
+        transcript = self.transcript
+
+        for key, value in self.raw_sample.items():
+            audio_type = get_loadable_audio_type_from_extension(f".{key}")
+            if audio_type:
+                detected_audio_type = audio_type
+                raw_audio_data = value
+
+        sample_id = self.sample_id
+        if not detected_audio_type:
+            raise ValueError(f"Sample {sample_id} has no audio")
+
+        labeled = self.labeled
+        if labeled is None and transcript:
+            labeled = True
+
+        if labeled:
+            return LabeledSample(
+                detected_audio_type, raw_audio_data, transcript, sample_id=sample_id
+            )
+        return Sample(detected_audio_type, raw_audio_data, sample_id=sample_id)
+
+
+def count_webdataset_samples(url):
+    """Counts the samples of a single WebDataset tar shard by reading through it"""
+    import webdataset as wds
+
+    return sum(1 for _ in wds.WebDataset(url, shardshuffle=False))
+
+
+def read_webdataset_counts(count_index, urls):
+    """
+    Looks up the sample counts of WebDataset tar shards in a count index file.
+    Shards that are not listed yet get counted (concurrently) and added to the index file.
+
+    Parameters
+    ----------
+    count_index : str
+        Path to the count index - a JSON file that maps shard URLs to their sample counts
+    urls : list of str
+        Shard URLs
+
+    Returns
+    -------
+    list of int - sample counts of the shards
+    """
+    counts = {}
+    if path_exists_remote(count_index):
+        with open_remote(count_index, "r", encoding="utf-8") as count_file:
+            counts = json.load(count_file)
+    missing = [url for url in dict.fromkeys(urls) if url not in counts]
+    if missing:
+        with ThreadPoolExecutor(max_workers=SHARD_PREFETCH) as executor:
+            counts.update(zip(missing, executor.map(count_webdataset_samples, missing)))
+        with open_remote(count_index, "w", encoding="utf-8") as count_file:
+            json.dump(counts, count_file, indent=2)
+    return [counts[url] for url in urls]
+
+
 class WebDatasetSource:
-    """Sample collection reader for reading a WebDataset source"""
+    """Sample collection reader for reading WebDataset tar shards.
+    Iteration reads several shards concurrently (each one by its own thread) and interleaves their samples.
+    Samples are returned as util.sample_collections.PackedWebDatasetSample instances."""
 
-    def __init__(self, url, labeled=None):
+    def __init__(
+        self,
+        url,
+        labeled=None,
+        prefetch=SHARD_PREFETCH,
+        count_index=None,
+        worker_index=0,
+        num_workers=1,
+    ):
         """
         Parameters
         ----------
         url : str
-            WebDataset URL
+            WebDataset URL - supports brace expansion for shard lists like "shard-{000..099}.tar"
         labeled : bool or None
             If True: Reads LabeledSample instances. Fails, if CSV file has no transcript column.
             If False: Ignores transcripts (if available) and reads (unlabeled) util.audio.Sample instances.
             If None: Automatically determines if CSV file has a transcript column
             (reading util.sample_collections.LabeledSample instances) or not (reading util.audio.Sample instances).
-        reverse : bool
-            If the order of the samples should be reversed
+        prefetch : int
+            Number of shards that are read concurrently during iteration
+        count_index : str or None
+            Path to a count index file (see read_webdataset_counts) - provides the source's length.
+            If None, the source does not support len().
+        worker_index : int
+            Index of the worker (e.g. a data-parallel training process) that reads from this source
+        num_workers : int
+            Number of workers that read from the source - every worker reads its own disjoint share of the shards
+            (every num_workers-th shard, starting at worker_index)
         """
-        import webdataset as wds
+        import braceexpand
 
-        ds = wds.WebDataset(url)
-        self._dataset = ds
+        if not 0 <= worker_index < num_workers:
+            raise ValueError(
+                "Worker index {} out of range for {} workers".format(
+                    worker_index, num_workers
+                )
+            )
+        self.urls = list(braceexpand.braceexpand(url))[worker_index::num_workers]
         self.labeled = labeled
+        self.prefetch = max(1, prefetch)
+        self.counts = (
+            None
+            if count_index is None
+            else read_webdataset_counts(count_index, self.urls)
+        )
 
-    def __iter__(self):
-        class WrappedIterator:
-            def __init__(nself, wds_iter):
-                nself._iter = wds_iter
-
-            def __iter__(nself):
-                return nself
-
-            def __next__(nself):
-                sample = next(nself._iter)
-
-                detected_audio_type = None
-                raw_audio_data = None
-                transcript = None
-
-                for key, value in sample.items():
-                    if key == "txt":
-                        transcript = value.decode("utf8")
-
-                    audio_type = get_loadable_audio_type_from_extension(f".{key}")
-                    if audio_type:
-                        detected_audio_type = audio_type
-                        raw_audio_data = value
+    def read_shard(self, url, output, stop):
+        import webdataset as wds
 
-                if not detected_audio_type:
-                    raise ValueError(f"Sample {sample['__key__']} has no audio")
+        try:
+            chunk = []
+            for raw_sample in wds.WebDataset(url, shardshuffle=False):
+                chunk.append(PackedWebDatasetSample(raw_sample, labeled=self.labeled))
+                if len(chunk) == SHARD_READ_CHUNK_SIZE:
+                    if not put_unless_stopped(output, chunk, stop):
+                        return
+                    chunk = []
+            if chunk and not put_unless_stopped(output, chunk, stop):
+                return
+        except Exception as ex:  # pylint: disable=broad-except
+            put_unless_stopped(output, ex, stop)
+        else:
+            put_unless_stopped(output, None, stop)
 
-                if self.labeled is None and transcript:
-                    self.labeled = True
+    def __iter__(self):
+        stop = threading.Event()
+        active = collections.deque()
+        urls = iter(self.urls)
+        with ThreadPoolExecutor(max_workers=self.prefetch) as executor:
+            try:
+                while True:
+                    while len(active) < self.prefetch:
+                        url = next(urls, None)
+                        if url is None:
+                            break
+                        output = queue.Queue(SHARD_READ_QUEUE_SIZE)
+                        executor.submit(self.read_shard, url, output, stop)
+                        active.append(output)
+                    if not active:
+                        return
+                    # Round-robin over the shards that are currently read
+                    output = active.popleft()
+                    chunk = output.get()
+                    if chunk is None:
+                        continue
+                    if isinstance(chunk, Exception):
+                        raise chunk
+                    active.append(output)
+                    yield from chunk
+            finally:
+                stop.set()
 
-                if self.labeled:
-                    processed_sample = LabeledSample(
-                        detected_audio_type,
-                        raw_audio_data,
-                        transcript,
-                        sample_id=sample["__key__"],
-                    )
-                else:
-                    processed_sample = Sample(
-                        detected_audio_type, raw_audio_data, sample_id=sample["__key__"]
-                    )
+    def __len__(self):
+        if self.counts is None:
+            raise TypeError("WebDataset source without count index has no length")
+        return sum(self.counts)
 
-                return processed_sample
 
-        return WrappedIterator(iter(self._dataset))
+def is_webdataset_source(sample_source):
+    """If samples_from_source reads a sample source as WebDataset - which only supports sequential access"""
+    return (
+        any(
+            sample_source.startswith(p)
+            for p in ("http://", "https://", "s3://", "pipe:")
+        )
+        or os.path.splitext(sample_source)[1].lower() == ".tar"
+    )
 
 
 def samples_from_source(
-    sample_source, buffering=BUFFER_SIZE, labeled=None, reverse=False
+    sample_source,
+    buffering=BUFFER_SIZE,
+    labeled=None,
+    reverse=False,
+    sdb_access=SDB_ACCESS_BUFFERED,
+    csv_index_cache=False,
+    csv_order_by_duration=False,
+    duration_cache=None,
+    webdataset_count_index=None,
 ):
     """
     Loads samples from a sample source file.
@@ -651,7 +1811,7 @@ def samples_from_source(
     Parameters
     ----------
     sample_source : str
-        Path to the sample source file (SDB or CSV)
+        Path to the sample source file (SDB, sharded SDB manifest (.sdbs), CSV or WebDataset URL)
     buffering : int
         Read-buffer size to use while reading files
     labeled : bool or None
@@ -661,29 +1821,64 @@ def samples_from_source(
         (reading util.sample_collections.LabeledSample instances) or not (reading util.audio.Sample instances).
     reverse : bool
         If the order of the samples should be reversed
+    sdb_access : str
+        How to access SDB files - see util.sample_collections.SDB.__init__
+    csv_index_cache : bool
+        If CSV files should be read through binary sidecar indices - see util.sample_collections.CSV.__init__
+    csv_order_by_duration : bool
+        If CSV samples should be ordered by their probed audio durations - see util.sample_collections.CSV.__init__
+    duration_cache : str or None
+        Path to the duration cache file for csv_order_by_duration - see util.sample_collections.CSV.__init__
+    webdataset_count_index : str or None
+        Path to the sample count index of WebDataset sources - see util.sample_collections.WebDatasetSource.__init__
 
     Returns
     -------
     iterable of util.sample_collections.LabeledSample or util.audio.Sample instances
     """
     ext = os.path.splitext(sample_source)[1].lower()
-    if (
-        any(
-            sample_source.startswith(p)
-            for p in ("http://", "https://", "s3://", "pipe:")
+    if is_webdataset_source(sample_source):
+        return WebDatasetSource(
+            sample_source, labeled=labeled, count_index=webdataset_count_index
         )
-        or ext == ".tar"
-    ):
-        return WebDatasetSource(sample_source, labeled=labeled)
     if ext == ".sdb":
-        return SDB(sample_source, buffering=buffering, labeled=labeled, reverse=reverse)
+        return SDB(
+            sample_source,
+            buffering=buffering,
+            labeled=labeled,
+            reverse=reverse,
+            access=sdb_access,
+        )
+    if ext == ".sdbs":
+        return ShardedSDB(
+            sample_source,
+            buffering=buffering,
+            labeled=labeled,
+            reverse=reverse,
+            access=sdb_access,
+        )
     if ext == ".csv":
-        return CSV(sample_source, labeled=labeled, reverse=reverse)
+        return CSV(
+            sample_source,
+            labeled=labeled,
+            reverse=reverse,
+            index_cache=csv_index_cache,
+            order_by_duration=csv_order_by_duration,
+            duration_cache=duration_cache,
+        )
     raise ValueError('Unknown file type: "{}"'.format(ext))
 
 
 def samples_from_sources(
-    sample_sources, buffering=BUFFER_SIZE, labeled=None, reverse=False
+    sample_sources,
+    buffering=BUFFER_SIZE,
+    labeled=None,
+    reverse=False,
+    sdb_access=SDB_ACCESS_BUFFERED,
+    csv_index_cache=False,
+    csv_order_by_duration=False,
+    duration_cache=None,
+    webdataset_count_index=None,
 ):
     """
     Loads and combines samples from a list of source files. Sources are combined in an interleaving way to
@@ -692,12 +1887,13 @@ def samples_from_sources(
     Note that when using distributed training, it is much faster to call this function with single pre-
     sorted sample source, because this allows for parallelization of the file I/O. (If this function is
     called with multiple sources, the samples have to be unpacked on a single parent process to allow
-    for reading their durations.)
+    for reading their durations - unless all sources know their sample durations upfront, like SDBs of format
+    version 2 through their metadata index or CSVs with csv_order_by_duration.)
 
     Parameters
     ----------
     sample_sources : list of str
-        Paths to sample source files (SDBs or CSVs)
+        Paths to sample source files (SDBs, sharded SDB manifests (.sdbs) or CSVs)
     buffering : int
         Read-buffer size to use while reading files
     labeled : bool or None
@@ -707,6 +1903,16 @@ def samples_from_sources(
         util.audio.Sample instances from sources with no transcripts.
     reverse : bool
         If the order of the samples should be reversed
+    sdb_access : str
+        How to access SDB files - see util.sample_collections.SDB.__init__
+    csv_index_cache : bool
+        If CSV files should be read through binary sidecar indices - see util.sample_collections.CSV.__init__
+    csv_order_by_duration : bool
+        If CSV samples should be ordered by their probed audio durations - see util.sample_collections.CSV.__init__
+    duration_cache : str or None
+        Path to the duration cache file for csv_order_by_duration - see util.sample_collections.CSV.__init__
+    webdataset_count_index : str or None
+        Path to the sample count index of WebDataset sources - see util.sample_collections.WebDatasetSource.__init__
 
     Returns
     -------
@@ -719,19 +1925,248 @@ def samples_from_sources(
         raise ValueError("No files")
     if len(sample_sources) == 1:
         return samples_from_source(
-            sample_sources[0], buffering=buffering, labeled=labeled, reverse=reverse
+            sample_sources[0],
+            buffering=buffering,
+            labeled=labeled,
+            reverse=reverse,
+            sdb_access=sdb_access,
+            csv_index_cache=csv_index_cache,
+            csv_order_by_duration=csv_order_by_duration,
+            duration_cache=duration_cache,
+            webdataset_count_index=webdataset_count_index,
         )
 
-    # If we wish to interleave based on duration, we have to unpack the audio. Note that this unpacking should
-    # be done lazily onn the fly so that it respects the LimitingPool logic used in the feeding code.
     cols = [
-        LenMap(
-            unpack_maybe,
-            samples_from_source(
-                source, buffering=buffering, labeled=labeled, reverse=reverse
-            ),
+        samples_from_source(
+            source,
+            buffering=buffering,
+            labeled=labeled,
+            reverse=reverse,
+            sdb_access=sdb_access,
+            csv_index_cache=csv_index_cache,
+            csv_order_by_duration=csv_order_by_duration,
+            duration_cache=duration_cache,
+            webdataset_count_index=webdataset_count_index,
         )
         for source in sample_sources
     ]
 
+    durations = [sample_durations(col) for col in cols]
+    if all(col_durations is not None for col_durations in durations):
+        # Interleaving by known durations keeps samples packed (if they are)
+        return TimedInterleaved(cols, durations, reverse=reverse)
+
+    # If we wish to interleave based on duration, we have to unpack the audio. Note that this unpacking should
+    # be done lazily onn the fly so that it respects the LimitingPool logic used in the feeding code.
+    cols = [LenMap(unpack_maybe, col) for col in cols]
+
     return Interleaved(*cols, key=lambda s: s.duration, reverse=reverse)
+
+
+def sample_durations(col):
+    """Durations of a sample collection's samples in collection order, if known without unpacking them, else None"""
+    sample_meta = getattr(col, "sample_meta", None)
+    if sample_meta is not None:
+        return sample_meta["duration"]
+    return getattr(col, "durations", None)
+
+
+class TimedInterleaved:
+    """
+    Collection that interleaves sample collections with known sample durations (see sample_durations)
+    from shortest to longest (or longest to shortest, if reverse). The order is derived from the durations only,
+    so samples can be skipped without loading them (see iter_from).
+    """
+
+    def __init__(self, cols, durations, reverse=False):
+        self.cols = cols
+        self.col_durations = durations
+        self.reverse = reverse
+
+    def iter_from(self, start):
+        timed_indices = [
+            zip(map(float, col_durations), itertools.repeat(col_index), range(len(col)))
+            for col_index, (col, col_durations) in enumerate(
+                zip(self.cols, self.col_durations)
+            )
+        ]
+        merged = heapq.merge(*timed_indices, key=itemgetter(0), reverse=self.reverse)
+        for _, col_index, sample_index in itertools.islice(merged, start, None):
+            yield self.cols[col_index][sample_index]
+
+    def __iter__(self):
+        return self.iter_from(0)
+
+    def __len__(self):
+        return sum(map(len, self.cols))
+
+
+class SkippedSamples:
+    """Collection of all but the first count samples of another sample collection - see skip_samples"""
+
+    def __init__(self, samples, count):
+        self.samples = samples
+        self.count = count
+
+    def __iter__(self):
+        if isinstance(self.samples, (SDB, ShardedSDB, CSV, OrderedSamples)):
+            # Random access - skipped samples are not even touched
+            for i in range(self.count, len(self.samples)):
+                yield self.samples[i]
+        elif hasattr(self.samples, "iter_from"):
+            yield from self.samples.iter_from(self.count)
+        else:
+            yield from itertools.islice(self.samples, self.count, None)
+
+    def __len__(self):
+        return max(0, len(self.samples) - self.count)
+
+
+def skip_samples(samples, count):
+    """
+    Skips the first count samples of a sample collection, e.g. for continuing an interrupted epoch.
+    Collections with random access (SDBs, sharded SDBs, CSVs and OrderedSamples) and
+    duration-interleaved collections skip through their indices without reading any skipped sample.
+    WebDataset sources skip through their shards without unpacking the skipped samples.
+    Only collections that have to be interleaved by unpacked durations have to load the skipped samples.
+
+    Parameters
+    ----------
+    samples : sample collection
+        Typically produced by util.sample_collections.samples_from_sources or BucketedSamples
+    count : int
+        Number of samples to skip
+
+    Returns
+    -------
+    sample collection that supports len, if the original collection does
+    """
+    if count <= 0:
+        return samples
+    return SkippedSamples(samples, count)
+
+
+class OrderedSamples:
+    """
+    Base class of sample collections that present the samples of one or more collections in an order of their own.
+    Subclasses set self.order to an array of indices into the concatenation of all collections.
+    """
+
+    def __init__(self, cols):
+        self.cols = cols
+        for col in cols:
+            if not hasattr(col, "__getitem__"):
+                raise ValueError(
+                    "Sample collection {} does not support random access "
+                    "(only SDB and CSV sources do)".format(col)
+                )
+        self.col_indices = np.concatenate(
+            [np.full(len(col), i, dtype=np.int32) for i, col in enumerate(cols)]
+        )
+        self.sample_indices = np.concatenate(
+            [np.arange(len(col), dtype=np.int64) for col in cols]
+        )
+        self.order = np.arange(len(self.col_indices))
+
+    def duration_order(self, purpose, reverse=False):
+        """Indices of all samples sorted by duration (longest first, if reverse) - see sample_durations"""
+        durations = [sample_durations(col) for col in self.cols]
+        if len(self.cols) == 1 and durations[0] is None:
+            # The collection's own order - already reversed by its source, if requested
+            return np.arange(len(self.cols[0]))
+        if any(col_durations is None for col_durations in durations):
+            raise RuntimeError(
+                "{} multiple sample sources requires known sample durations "
+                "(SDBs of format version 2 or CSVs ordered by duration)".format(purpose)
+            )
+        order = np.argsort(
+            np.concatenate([np.asarray(d, dtype=np.float64) for d in durations]),
+            kind="stable",
+        )
+        return order[::-1].copy() if reverse else order
+
+    def __getitem__(self, i):
+        j = self.order[i]
+        return self.cols[self.col_indices[j]][int(self.sample_indices[j])]
+
+    def __iter__(self):
+        for i in range(len(self.order)):
+            yield self[i]
+
+    def __len__(self):
+        return len(self.order)
+
+
+class BucketedSamples(OrderedSamples):
+    """
+    Sample collection that orders the samples of one or more collections into batches of similar durations.
+    All samples get sorted by duration and cut into buckets of bucket_size consecutive batches.
+    Samples get shuffled within their buckets, grouped into batches and all (complete) batches get shuffled.
+    So each batch only contains samples of similar durations (little padding), while batch order stays random.
+    Only the very last batch can be incomplete.
+    """
+
+    def __init__(self, cols, batch_size, bucket_size, seed=0, reverse=False):
+        """
+        Parameters
+        ----------
+        cols : list of sample collections
+            Collections supporting len() and item access. If they don't know their sample durations
+            (see sample_durations), there has to be a single collection, whose own order is used as length order.
+        batch_size : int
+            Number of samples per batch
+        bucket_size : int
+            Number of batches per bucket - the higher, the more random but less uniform the batches
+        seed : int
+            Random seed for shuffling - typically changed per epoch
+        reverse : bool
+            If batches should not get shuffled, but ordered from longest to shortest
+            (e.g. for checking memory requirements up front)
+        """
+        super().__init__(cols)
+        order = self.duration_order("Bucketing", reverse=reverse)
+        rng = np.random.RandomState(seed)
+        bucket_len = max(1, bucket_size) * batch_size
+        for start in range(0, len(order), bucket_len):
+            rng.shuffle(order[start : start + bucket_len])
+        num_batches = len(order) // batch_size
+        batches = order[: num_batches * batch_size].reshape(num_batches, batch_size)
+        if not reverse:
+            rng.shuffle(batches)
+        self.order = np.concatenate(
+            [batches.reshape(-1), order[num_batches * batch_size :]]
+        )
+
+
+class ShuffledSamples(OrderedSamples):
+    """
+    Sample collection that presents the samples of one or more collections in a random order.
+    Only sample indices get shuffled, so this happens before any sample is loaded and costs
+    a few bytes per sample. The order is reproducible from the seed.
+    """
+
+    def __init__(self, cols, seed=0, window=0, reverse=False):
+        """
+        Parameters
+        ----------
+        cols : list of sample collections
+            Collections supporting len() and item access
+        seed : int
+            Random seed for shuffling - typically changed per epoch
+        window : int
+            If 0, all samples get shuffled. Otherwise samples get sorted by duration and only shuffled within
+            consecutive windows of this many samples, which keeps the overall order from short to long.
+            Requires known sample durations (see sample_durations), if there is more than one collection.
+        reverse : bool
+            If windows should go from long to short samples (only used if window > 0)
+        """
+        super().__init__(cols)
+        rng = np.random.RandomState(seed)
+        if window > 0:
+            self.order = self.duration_order(
+                "Duration-windowed shuffling of", reverse=reverse
+            )
+            for start in range(0, len(self.order), window):
+                rng.shuffle(self.order[start : start + window])
+        else:
+            rng.shuffle(self.order)